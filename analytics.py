@@ -0,0 +1,179 @@
+# analytics.py
+# Phát hiện sinh viên có nguy cơ bị cấm thi trên toàn trường bằng phép toán vector (NumPy).
+# Nạp một lượt, mã hóa số nguyên, chỉ những gì cần cho phép tính (mỗi giá trị qua sqlite3 tốn ~1 µs):
+#   - sinh viên -> lớp (mẫu số theo tuần = số buổi đã đóng của các môn trong lớp);
+#   - tổng lượt theo (sinh viên, lớp-môn) từ attendance_student_summary, chỉ các cặp có vắng/muộn
+#     (cặp toàn có mặt có tỷ lệ 0, không ảnh hưởng kết quả);
+#   - lượt vắng của buổi ĐÃ ĐÓNG trong TREND_WEEKS tuần gần nhất (sinh viên, tuần), qua index riêng
+#     phần idx_attendance_not_present — không đọc các dòng có mặt.
+# Tỷ lệ vắng/muộn, xu hướng theo cửa sổ trượt và vượt ngưỡng đều tính trên mảng, không lặp theo sinh viên.
+# NumPy là phụ thuộc tùy chọn (pip install numpy): thiếu thì available() = False và giao diện báo cần cài.
+import time
+from datetime import date, timedelta
+from itertools import chain
+
+import database as db
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Cùng ngưỡng mặc định/khóa app_settings với cảnh báo tức thời (database.ALERT_DEFAULTS)
+ABSENCE_LIMIT = db.ALERT_DEFAULTS["absence_limit"]    # vắng (kể cả có phép) quá 20% số buổi của một môn -> không đủ ĐK dự thi
+WARN_RATIO = db.ALERT_DEFAULTS["absence_warn_ratio"]  # đã dùng 75% hạn mức vắng -> cảnh báo
+LATE_LIMIT = 0.30     # đi muộn quá 30% số buổi của một môn -> cảnh báo
+TREND_WEEKS = 6       # số tuần gần nhất để tính xu hướng
+ROLLING_WEEKS = 3     # độ rộng cửa sổ trượt trong khoảng đó
+TREND_ALERT = 0.15    # tỷ lệ vắng cửa sổ cuối cao hơn cửa sổ đầu >= 15 điểm % -> "tăng nhanh"
+LEVELS = ("Không đủ ĐK dự thi", "Cảnh báo", "Vắng tăng nhanh")
+
+def available(): return np is not None
+
+def _columns(conn, query, params, ncols):
+    """Chạy truy vấn trả về `ncols` cột số nguyên, đổ thẳng vào mảng (không dựng list các tuple)."""
+    flat = np.fromiter(chain.from_iterable(conn.execute(query, params)), dtype=np.int32)
+    return flat.reshape(-1, ncols).T
+
+def load(today=None, weeks=TREND_WEEKS):
+    """Nạp dữ liệu dạng cột. Trả về dict mảng NumPy:
+
+    student_class[student_id] — lớp của sinh viên (0 = chưa xếp lớp);
+    pair_student, pair_cs, pair_total, pair_absent, pair_late — các (sinh viên, lớp-môn) có vắng hoặc muộn;
+    ev_student, ev_week — mỗi lượt vắng (kể cả có phép) trong cửa sổ xu hướng (tuần 0 = cũ nhất);
+    class_week_sessions[class_id, tuần] — số buổi đã đóng của các môn trong lớp, theo tuần.
+    """
+    if np is None: raise RuntimeError("Cần cài NumPy để phân tích toàn trường: pip install numpy")
+    today = date.fromisoformat(today or db.get_vn_time()[:10])
+    start = today - timedelta(days=7 * weeks - 1)
+    window = (start.isoformat(), start.isoformat(), today.isoformat())
+    week_of = "CAST((julianday(s.date) - julianday(?)) / 7 AS INTEGER)"
+    with db.get_connection() as conn:
+        sid, cid = _columns(conn, "SELECT id, COALESCE(class_id, 0) FROM students", (), 2)
+        pair_student, pair_cs, pair_total, pair_absent, pair_late = _columns(conn, """
+            SELECT student_id, class_subject_id, present_count + absent_count + excused_count + late_count,
+                   absent_count + excused_count, late_count
+            FROM attendance_student_summary
+            WHERE absent_count + excused_count + late_count > 0
+        """, (), 5)
+        cls, week, n = _columns(conn, f"""
+            SELECT cs.class_id, {week_of}, COUNT(*)
+            FROM attendance_sessions s JOIN class_subjects cs ON cs.id = s.class_subject_id
+            WHERE s.status = 'CLOSED' AND s.date BETWEEN ? AND ?
+            GROUP BY 1, 2
+        """, window, 3)
+        ev_student, ev_week = _columns(conn, f"""
+            SELECT a.student_id, {week_of}
+            FROM attendance_sessions s
+            JOIN Attendance a ON a.session_id = s.id AND a.status <> 'PRESENT' AND a.status <> 'LATE'
+            WHERE s.status = 'CLOSED' AND s.date BETWEEN ? AND ?
+        """, window, 2)
+    student_class = np.zeros(int(sid.max(initial=0)) + 1, dtype=np.int32)
+    student_class[sid] = cid
+    class_week_sessions = np.zeros((int(max(cid.max(initial=0), cls.max(initial=0))) + 1, weeks), dtype=np.int32)
+    class_week_sessions[cls, week] = n
+    return {"student_class": student_class, "pair_student": pair_student, "pair_cs": pair_cs, "pair_total": pair_total,
+            "pair_absent": pair_absent, "pair_late": pair_late, "ev_student": ev_student, "ev_week": ev_week,
+            "class_week_sessions": class_week_sessions, "weeks": weeks, "start": window[0], "today": window[2],
+            "students": int(sid.size)}
+
+def _rate(num, den):
+    return np.divide(num, den, out=np.zeros(np.shape(num), dtype=np.float64), where=den > 0)
+
+def analyze(data, absence_limit=ABSENCE_LIMIT, warn_ratio=WARN_RATIO, late_limit=LATE_LIMIT,
+            rolling=ROLLING_WEEKS, trend_alert=TREND_ALERT):
+    """Tính trên mảng của load(); trả về dict mảng đánh chỉ số theo student_id.
+
+    worst_rate / worst_cs: môn vắng nhiều nhất; breaches: số môn vượt hạn mức vắng; warnings: số môn sắp
+    vượt hoặc đi muộn quá late_limit; weekly_rate[sv, tuần]; recent_rate: tỷ lệ vắng `rolling` tuần cuối;
+    trend: recent_rate trừ cửa sổ đầu; level: -1 (bình thường) hoặc chỉ số trong LEVELS.
+    """
+    ps, pcs, weeks = data["pair_student"], data["pair_cs"], data["weeks"]
+    n = data["student_class"].size
+    rate, late_rate = _rate(data["pair_absent"], data["pair_total"]), _rate(data["pair_late"], data["pair_total"])
+    breach = rate > absence_limit
+    warn = ~breach & ((rate > absence_limit * warn_ratio) | (late_rate > late_limit))
+
+    # Môn tệ nhất của mỗi sinh viên: sắp theo (sinh viên, tỷ lệ) rồi lấy phần tử cuối mỗi nhóm
+    order = np.lexsort((rate, ps))
+    last = order[np.flatnonzero(np.r_[ps[order][1:] != ps[order][:-1], True])] if ps.size else order
+    worst_rate, worst_cs = np.zeros(n), np.zeros(n, dtype=np.int32)
+    worst_rate[ps[last]], worst_cs[ps[last]] = rate[last], pcs[last]
+    breaches = np.bincount(ps, weights=breach, minlength=n).astype(np.int32)
+    warnings = np.bincount(ps, weights=warn, minlength=n).astype(np.int32)
+
+    # Ma trận [sv, tuần]: lượt vắng, và số buổi phải học = số buổi đã đóng của lớp trong tuần
+    absent = np.bincount(data["ev_student"] * weeks + data["ev_week"], minlength=n * weeks).reshape(n, weeks)
+    total = data["class_week_sessions"][data["student_class"]]
+    weekly_rate = _rate(absent, total)
+
+    # Cửa sổ trượt `rolling` tuần qua tổng tích lũy; xu hướng = cửa sổ cuối - cửa sổ đầu
+    rolling = max(1, min(rolling, weeks))
+    csum_a = np.concatenate([np.zeros((n, 1)), np.cumsum(absent, axis=1)], axis=1)
+    csum_t = np.concatenate([np.zeros((n, 1)), np.cumsum(total, axis=1)], axis=1)
+    rolling_rate = _rate(csum_a[:, rolling:] - csum_a[:, :-rolling], csum_t[:, rolling:] - csum_t[:, :-rolling])
+    trend = rolling_rate[:, -1] - rolling_rate[:, 0]
+
+    level = np.full(n, -1, dtype=np.int8)
+    level[trend >= trend_alert] = 2
+    level[warnings > 0] = 1
+    level[breaches > 0] = 0
+    return {"worst_rate": worst_rate, "worst_cs": worst_cs, "breaches": breaches, "warnings": warnings,
+            "weekly_rate": weekly_rate, "recent_rate": rolling_rate[:, -1], "trend": trend, "level": level,
+            "pair_breach": breach, "pair_rate": rate}
+
+def _lookup(conn, query, ids, chunk=500):
+    rows = {}
+    for i in range(0, len(ids), chunk):
+        part = ids[i:i + chunk]
+        for r in conn.execute(query.format(",".join("?" * len(part))), part): rows[r[0]] = tuple(r)[1:]
+    return rows
+
+def _limits():
+    """Ngưỡng lấy từ app_settings nếu quản trị viên đã đặt (khóa absence_limit, absence_warn_ratio)."""
+    return (float(db.get_setting("absence_limit", ABSENCE_LIMIT)), float(db.get_setting("absence_warn_ratio", WARN_RATIO)))
+
+def at_risk_students(today=None, limit=None):
+    """Danh sách sinh viên cần chú ý toàn trường, nặng nhất trước (tối đa `limit` dòng; chỉ các dòng này mới tra tên).
+
+    Mỗi dòng: student_id, student_code, full_name, class_code, level (chuỗi), worst_rate, worst_subject,
+    breaches, subjects (các môn vượt hạn mức), recent_rate, trend (điểm %). Kèm `stats` về thời gian/quy mô.
+    """
+    t0 = time.perf_counter()
+    data = load(today)
+    t1 = time.perf_counter()
+    absence_limit, warn_ratio = _limits()
+    r = analyze(data, absence_limit, warn_ratio)
+    flagged = np.flatnonzero(r["level"] >= 0)
+    # Nặng nhất trước: mức (0 trước), số môn vượt, tỷ lệ vắng môn tệ nhất
+    flagged = flagged[np.lexsort((-r["worst_rate"][flagged], -r["breaches"][flagged], r["level"][flagged]))]
+    if limit is not None: flagged = flagged[:limit]
+    t2 = time.perf_counter()
+
+    ids = flagged.tolist()
+    breach_pairs = np.flatnonzero(r["pair_breach"] & np.isin(data["pair_student"], flagged))
+    cs_ids = sorted(set(r["worst_cs"][flagged].tolist()) | set(data["pair_cs"][breach_pairs].tolist()))
+    with db.get_connection() as conn:
+        people = _lookup(conn, """SELECT st.id, st.student_code, u.full_name, c.class_code FROM students st
+                                  JOIN users u ON u.id = st.user_id LEFT JOIN classes c ON c.id = st.class_id
+                                  WHERE st.id IN ({})""", ids)
+        subjects = _lookup(conn, """SELECT cs.id, sub.subject_code FROM class_subjects cs
+                                    JOIN subjects sub ON sub.id = cs.subject_id WHERE cs.id IN ({})""", cs_ids)
+    over = {}
+    for i in breach_pairs.tolist():
+        over.setdefault(int(data["pair_student"][i]), []).append(
+            f"{subjects.get(int(data['pair_cs'][i]), ('?',))[0]} {100 * r['pair_rate'][i]:.0f}%")
+    rows = []
+    for sid in ids:
+        code, name, class_code = people.get(sid, (None, None, None))
+        rows.append({"student_id": sid, "student_code": code, "full_name": name, "class_code": class_code,
+                     "level": LEVELS[r["level"][sid]], "worst_rate": round(100 * float(r["worst_rate"][sid]), 1),
+                     "worst_subject": subjects.get(int(r["worst_cs"][sid]), (None,))[0], "breaches": int(r["breaches"][sid]),
+                     "subjects": ", ".join(over.get(sid, ())), "recent_rate": round(100 * float(r["recent_rate"][sid]), 1),
+                     "trend": round(100 * float(r["trend"][sid]), 1)})
+    stats = {"students": data["students"], "pairs": int(data["pair_student"].size),
+             "events": int(data["ev_student"].size), "flagged": int((r["level"] >= 0).sum()),
+             "breached": int((r["level"] == 0).sum()), "absence_limit": absence_limit,
+             "window": (data["start"], data["today"]), "load_ms": (t1 - t0) * 1000, "analyze_ms": (t2 - t1) * 1000,
+             "total_ms": (time.perf_counter() - t0) * 1000}
+    return rows, stats
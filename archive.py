@@ -0,0 +1,211 @@
+# archive.py
+# Lưu trữ theo năm học: chuyển các buổi học đã đóng trước một mốc ngày (kèm dòng Attendance) từ attendance.db
+# sang file SQLite riêng của từng năm học (archive/attendance_<năm học>.db), theo lô, để DB nhận điểm danh
+# luôn nhỏ (index nông hơn, sao lưu nhanh hơn, ít áp lực page cache).
+# Chạy: python manage.py archive [--before YYYY-MM-DD] [--batch 50] [--vacuum]
+#
+# Mỗi lô (tối đa BATCH_SESSIONS buổi liên tiếp theo (date, id) trong một năm học) gồm hai giao dịch:
+#   1. chép sang kho (chỉ ghi file kho; DB chính chỉ đọc nên không chặn điểm danh)
+#   2. BEGIN IMMEDIATE trên DB chính: đối chiếu bản chép, xóa khỏi DB chính (bảng tổng hợp giữ nguyên số liệu,
+#      xem database.ARCHIVE_DETACH_SQL) và nâng mốc (archived_until, archived_until_id) trong archive_terms.
+# WAL không bảo đảm commit nguyên tử giữa hai file, nên thứ tự này chỉ có thể để lại bản chép thừa
+# (sau mốc, bị bên đọc bỏ qua và lần chạy sau ghi đè), không bao giờ mất dữ liệu.
+import os
+import sqlite3
+import time
+from datetime import date
+
+import database as db
+
+BATCH_SESSIONS = 50       # số buổi tối đa mỗi lô (~2k dòng Attendance với lớp 40 SV): khóa ghi ~0.1 s
+TERM_START_MONTH = 8      # năm học bắt đầu từ tháng 8
+VERIFY_ATTEMPTS = 3
+PAUSE_S = 0.1             # nghỉ giữa hai lô: busy handler của SQLite ngủ tới 100 ms, lượt điểm danh đang chờ kịp lấy khóa
+
+SESSION_COLUMNS = "id, class_subject_id, session_code, date, start_time, end_time, status, close_at, created_by, created_at"
+ATTENDANCE_COLUMNS = "id, session_id, student_id, status, note, marked_at, updated_at, updated_by"
+
+# Schema của file kho: cùng cột và các index đọc của DB chính, không khóa ngoại (lớp/sinh viên nằm ở DB chính)
+ARCHIVE_SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS attendance_sessions (
+        id INTEGER PRIMARY KEY,
+        class_subject_id INTEGER NOT NULL,
+        session_code TEXT NOT NULL,
+        date DATE NOT NULL,
+        start_time DATETIME,
+        end_time DATETIME,
+        status TEXT NOT NULL,
+        close_at DATETIME,
+        created_by INTEGER,
+        created_at DATETIME
+    );
+    CREATE INDEX IF NOT EXISTS idx_sessions_date ON attendance_sessions(date);
+    CREATE INDEX IF NOT EXISTS idx_sessions_cs_status ON attendance_sessions(class_subject_id, status);
+    CREATE TABLE IF NOT EXISTS Attendance (
+        id INTEGER PRIMARY KEY,
+        session_id INTEGER NOT NULL,
+        student_id INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        note TEXT,
+        marked_at DATETIME,
+        updated_at DATETIME,
+        updated_by INTEGER,
+        UNIQUE (session_id, student_id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_attendance_student_history ON Attendance(student_id, session_id, status, marked_at, note);
+"""
+
+# Lô = các buổi đã đóng có khóa (date, id) trong [đầu lô, cuối lô]; một ngày đông có thể chia nhiều lô.
+# `+status`: đi theo idx_sessions_date, không theo index trạng thái (gần như mọi buổi đều CLOSED)
+_RANGE = "(date, id) >= (?, ?) AND (date, id) <= (?, ?)"
+_BATCH_WHERE = "+status = 'CLOSED' AND " + _RANGE
+_NO_MARK = ("", 0)
+
+def term_of(day):
+    """Năm học của một ngày 'YYYY-MM-DD', vd. '2025-2026'."""
+    y, m = int(day[:4]), int(day[5:7])
+    start = y if m >= TERM_START_MONTH else y - 1
+    return f"{start}-{start + 1}"
+
+def term_file(term): return f"attendance_{term}.db"
+
+def current_term_start(today=None):
+    """Ngày đầu năm học hiện tại: mốc mặc định (lưu trữ mọi năm học trước)."""
+    today = today or db.get_vn_time()[:10]
+    return date(int(term_of(today)[:4]), TERM_START_MONTH, 1).isoformat()
+
+def _watermark(conn, term):
+    row = conn.execute("SELECT archived_until, archived_until_id FROM archive_terms WHERE term = ?", (term,)).fetchone()
+    return tuple(row) if row else _NO_MARK
+
+def plan(before, batch_sessions=BATCH_SESSIONS):
+    """Chia các buổi đã đóng trước `before` thành lô [(năm học, (date, id) đầu, (date, id) cuối, số buổi)].
+
+    Lô đi theo (date, id) tăng dần và không cắt ngang năm học. Buổi nằm dưới mốc đã lưu trữ của năm học
+    (còn mở khi năm học đó được lưu trữ) ở lại DB chính.
+    """
+    with db.get_connection() as conn:
+        marks = {}
+        keys = conn.execute("""SELECT date, id FROM attendance_sessions
+                               WHERE status = 'CLOSED' AND date < ? ORDER BY date, id""", (before,)).fetchall()
+        batches = []
+        for day, sid in keys:
+            term, key = term_of(day), (day, sid)
+            if term not in marks: marks[term] = _watermark(conn, term)
+            if key <= marks[term]: continue
+            if batches and batches[-1][0] == term and batches[-1][3] < batch_sessions:
+                t, first, _, count = batches[-1]; batches[-1] = (t, first, key, count + 1)
+            else: batches.append((term, key, key, 1))
+    return batches
+
+def _ensure_archive(term):
+    os.makedirs(db.archive_dir(), exist_ok=True)
+    path = os.path.join(db.archive_dir(), term_file(term))
+    conn = sqlite3.connect(path)
+    try: conn.executescript(ARCHIVE_SCHEMA_SQL)
+    finally: conn.close()
+    return path
+
+def _attach(conn, path):
+    conn.execute("ATTACH DATABASE ? AS arc", (path,))
+
+@db.retry_on_busy
+def _copy_batch(term, path, first, last):
+    """Giao dịch 1: bỏ bản chép dư sau mốc của năm học rồi chép lô sang kho."""
+    with db.get_connection() as conn:
+        _attach(conn, path)
+        try:
+            conn.execute("BEGIN")  # chỉ ghi vào kho: DB chính vẫn nhận điểm danh trong lúc chép
+            mark = _watermark(conn, term)
+            conn.execute("""DELETE FROM arc.Attendance WHERE session_id IN
+                            (SELECT id FROM arc.attendance_sessions WHERE (date, id) > (?, ?))""", mark)
+            conn.execute("DELETE FROM arc.attendance_sessions WHERE (date, id) > (?, ?)", mark)
+            conn.execute(f"""INSERT INTO arc.attendance_sessions ({SESSION_COLUMNS})
+                             SELECT {SESSION_COLUMNS} FROM main.attendance_sessions WHERE {_BATCH_WHERE}""", (*first, *last))
+            conn.execute(f"""INSERT INTO arc.Attendance ({ATTENDANCE_COLUMNS})
+                             SELECT {ATTENDANCE_COLUMNS} FROM main.Attendance
+                             WHERE session_id IN (SELECT id FROM arc.attendance_sessions WHERE {_RANGE})""", (*first, *last))
+            conn.commit()
+        finally:
+            if conn.in_transaction: conn.rollback()
+            conn.execute("DETACH DATABASE arc")
+
+def _differs(conn, table, columns, ids):
+    """Số dòng của lô ở DB chính không có bản chép y hệt trong kho, cộng chênh lệch số dòng."""
+    main_rows = f"SELECT {columns} FROM main.{table} WHERE {ids}"
+    missing = conn.execute(f"SELECT COUNT(*) FROM ({main_rows} EXCEPT SELECT {columns} FROM arc.{table} WHERE {ids})").fetchone()[0]
+    counts = conn.execute(f"SELECT (SELECT COUNT(*) FROM main.{table} WHERE {ids}) - (SELECT COUNT(*) FROM arc.{table} WHERE {ids})").fetchone()[0]
+    return missing + abs(counts)
+
+@db.retry_on_busy
+def _detach_batch(term, path, first, last):
+    """Giao dịch 2: đối chiếu rồi xóa lô khỏi DB chính. Trả về (số buổi, số dòng) hoặc None nếu bản chép lệch."""
+    with db.get_connection() as conn:
+        _attach(conn, path)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS archive_batch (id INTEGER PRIMARY KEY)")
+            conn.execute("DELETE FROM temp.archive_batch")
+            n_sessions = conn.execute(f"INSERT INTO temp.archive_batch SELECT id FROM main.attendance_sessions WHERE {_BATCH_WHERE}",
+                                      (*first, *last)).rowcount
+            copied = conn.execute(f"SELECT COUNT(*) FROM arc.attendance_sessions WHERE {_RANGE}", (*first, *last)).fetchone()[0]
+            in_batch = "session_id IN (SELECT id FROM temp.archive_batch)"
+            if copied != n_sessions or _differs(conn, "attendance_sessions", SESSION_COLUMNS, "id IN (SELECT id FROM temp.archive_batch)") \
+                    or _differs(conn, "Attendance", ATTENDANCE_COLUMNS, in_batch):
+                conn.rollback(); return None  # có người sửa/mở lại buổi sau khi chép: chép lại
+            n_rows = conn.execute(f"SELECT COUNT(*) FROM main.Attendance WHERE {in_batch}").fetchone()[0]
+            for stmt in db.ARCHIVE_DETACH_SQL.split(";"):
+                if stmt.strip(): conn.execute(stmt)
+            conn.execute("""INSERT INTO archive_terms (term, file_name, first_date, archived_until, archived_until_id,
+                                                       sessions, attendance_rows, updated_at)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                            ON CONFLICT (term) DO UPDATE SET first_date = MIN(first_date, excluded.first_date),
+                                archived_until = excluded.archived_until, archived_until_id = excluded.archived_until_id,
+                                sessions = sessions + excluded.sessions, attendance_rows = attendance_rows + excluded.attendance_rows,
+                                updated_at = excluded.updated_at""",
+                         (term, term_file(term), first[0], *last, n_sessions, n_rows, db.get_vn_time()))
+            conn.commit()
+            # Tự checkpoint WAL sau mỗi lô: không để lượt điểm danh kế tiếp phải gánh phần ghi của lô lưu trữ
+            conn.execute("PRAGMA main.wal_checkpoint(PASSIVE)")
+            return n_sessions, n_rows
+        finally:
+            if conn.in_transaction: conn.rollback()
+            conn.execute("DETACH DATABASE arc")
+
+def archive_before(before=None, batch_sessions=BATCH_SESSIONS, progress=None):
+    """Chuyển mọi buổi đã đóng có date < `before` (mặc định: đầu năm học hiện tại) sang kho năm học.
+
+    Chạy lại được bất cứ lúc nào (kể cả sau khi bị ngắt giữa chừng). `progress(năm học, số buổi, số dòng)`
+    được gọi sau mỗi lô. Trả về {năm học: {"sessions": ..., "rows": ...}}.
+    """
+    before = before or current_term_start()
+    totals = {}
+    for term, first, last, _ in plan(before, batch_sessions):
+        path = _ensure_archive(term)
+        for _ in range(VERIFY_ATTEMPTS):
+            _copy_batch(term, path, first, last)
+            moved = _detach_batch(term, path, first, last)
+            if moved: break
+        else:
+            raise RuntimeError(f"Dữ liệu ngày {first[0]}..{last[0]} liên tục thay đổi trong lúc lưu trữ, hãy chạy lại sau")
+        t = totals.setdefault(term, {"sessions": 0, "rows": 0})
+        t["sessions"] += moved[0]; t["rows"] += moved[1]
+        if progress: progress(term, *moved)
+        time.sleep(PAUSE_S)
+    return totals
+
+def list_archives():
+    """Danh mục kho (archive_terms) kèm kích thước file."""
+    with db.get_connection() as conn:
+        terms = db.rows_to_list(conn.execute("SELECT * FROM archive_terms ORDER BY first_date").fetchall())
+    for t in terms:
+        path = os.path.join(db.archive_dir(), t["file_name"])
+        t["path"], t["size"] = path, os.path.getsize(path) if os.path.exists(path) else None
+    return terms
+
+def vacuum():
+    """Thu hồi dung lượng file DB chính sau khi lưu trữ (chặn mọi thao tác ghi trong lúc chạy)."""
+    db.close_all_connections()
+    conn = sqlite3.connect(db.DB_PATH)
+    try: conn.execute("VACUUM")
+    finally: conn.close()
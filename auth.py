@@ -1,15 +1,111 @@
 # auth.py
 import hashlib
+import hmac
 import re
+import secrets
+import time
 from typing import Optional
 
+# --- BĂM MẬT KHẨU ---
+# Định dạng lưu: "<thuật toán>$<chi phí>$<salt hex>$<hash hex>"
+#   pbkdf2_sha256$<số vòng lặp>$...    scrypt$<n>:<r>:<p>$...
+# Hash cũ (SHA-256 không salt, 64 ký tự hex) vẫn đăng nhập được và được băm lại khi đăng nhập thành công.
+class PBKDF2Hasher:
+    algorithm = "pbkdf2_sha256"
+    default_cost = "260000"
+
+    def __init__(self, cost=None):
+        self.iterations = int(cost or self.default_cost)
+
+    @property
+    def cost(self): return str(self.iterations)
+
+    def digest(self, password, salt):
+        return hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, self.iterations).hex()
+
+    @classmethod
+    def calibrate(cls, target_ms):
+        """Chọn số vòng lặp để một lần băm tốn khoảng `target_ms` trên máy này."""
+        probe = cls(20000)
+        ms = _time_ms(probe)
+        return cls(max(10000, int(round(probe.iterations * target_ms / ms, -3))))
+
+class ScryptHasher:
+    algorithm = "scrypt"
+    default_cost = "16384:8:1"
+
+    def __init__(self, cost=None):
+        self.n, self.r, self.p = (int(x) for x in (cost or self.default_cost).split(":"))
+
+    @property
+    def cost(self): return f"{self.n}:{self.r}:{self.p}"
+
+    def digest(self, password, salt):
+        return hashlib.scrypt(password.encode("utf-8"), salt=salt, n=self.n, r=self.r, p=self.p,
+                              maxmem=256 * self.n * self.r * self.p + (1 << 20)).hex()
+
+    @classmethod
+    def calibrate(cls, target_ms):
+        """Tăng n (lũy thừa 2) tới khi một lần băm chạm `target_ms`."""
+        hasher = cls("1024:8:1")
+        while hasher.n < (1 << 20):
+            bigger = cls(f"{hasher.n * 2}:{hasher.r}:{hasher.p}")
+            if _time_ms(bigger) > target_ms: break
+            hasher = bigger
+        return hasher
+
+HASHERS = {h.algorithm: h for h in (PBKDF2Hasher, ScryptHasher)}
+_hasher = PBKDF2Hasher()
+
+def _time_ms(hasher, rounds=3):
+    salt = secrets.token_bytes(16)
+    best = float("inf")
+    for _ in range(rounds):
+        t0 = time.perf_counter(); hasher.digest("calibrate", salt)
+        best = min(best, (time.perf_counter() - t0) * 1000)
+    return best
+
+def get_hasher(algorithm=None, cost=None):
+    if algorithm is None: return _hasher
+    if algorithm not in HASHERS: raise ValueError(f"Thuật toán băm không hỗ trợ: {algorithm}")
+    return HASHERS[algorithm](cost)
+
+def configure(algorithm, cost=None):
+    """Đặt thuật toán/chi phí dùng cho các hash mới (mặc định pbkdf2_sha256)."""
+    global _hasher
+    _hasher = get_hasher(algorithm or PBKDF2Hasher.algorithm, cost)
+
+def configure_from_settings(get_setting):
+    """Áp dụng cấu hình đã lưu, vd. configure_from_settings(database.get_setting)."""
+    configure(get_setting("password_hasher"), get_setting("password_cost"))
+
+def calibrate(target_ms=250, algorithm=PBKDF2Hasher.algorithm):
+    """Đo trên máy hiện tại, trả về (hasher, thời gian một lần băm tính bằng ms)."""
+    hasher = get_hasher(algorithm).calibrate(target_ms)
+    return hasher, _time_ms(hasher)
+
 def hash_password(password: str) -> str:
-    """Hash mật khẩu bằng SHA-256"""
+    """Hash mật khẩu bằng KDF hiện hành, salt ngẫu nhiên."""
+    salt = secrets.token_bytes(16)
+    return f"{_hasher.algorithm}${_hasher.cost}${salt.hex()}${_hasher.digest(password, salt)}"
+
+def _legacy_hash(password):
     return hashlib.sha256(password.encode('utf-8')).hexdigest()
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Xác minh mật khẩu"""
-    return hash_password(plain_password) == hashed_password
+    """Xác minh mật khẩu (KDF mới hoặc SHA-256 cũ); tốn đúng chi phí của hash đã lưu."""
+    if not hashed_password: return False
+    if "$" not in hashed_password: return hmac.compare_digest(_legacy_hash(plain_password), hashed_password)
+    try:
+        algorithm, cost, salt, digest = hashed_password.split("$")
+        hasher = get_hasher(algorithm, cost)
+        return hmac.compare_digest(hasher.digest(plain_password, bytes.fromhex(salt)), digest)
+    except ValueError: return False
+
+def needs_rehash(hashed_password: str) -> bool:
+    """True nếu hash là kiểu cũ hoặc khác thuật toán/chi phí hiện hành."""
+    parts = (hashed_password or "").split("$")
+    return len(parts) != 4 or parts[0] != _hasher.algorithm or parts[1] != _hasher.cost
 
 def validate_email(email: str) -> bool:
     """Kiểm tra định dạng email"""
@@ -0,0 +1,165 @@
+# backup.py
+# Sao lưu trực tuyến bằng sqlite3.Connection.backup, không cần dừng GUI/server điểm danh.
+# Mỗi bản sao lưu là một thư mục backups/attendance-<thời điểm>/ gồm attendance.db và các file kho năm học
+# (archive.py); chỉ được đổi tên từ *.partial sang tên chính thức sau khi qua PRAGMA integrity_check.
+# Giữ KEEP bản mới nhất. Chạy: python manage.py backup [--keep 7] [--pages 256] [--sleep 0.005]
+#                               python manage.py restore backups/attendance-<thời điểm>
+import os
+import shutil
+import sqlite3
+import time
+
+import database as db
+
+BACKUP_DIR = os.environ.get("ATTENDANCE_BACKUP_DIR")  # mặc định: thư mục backups/ cạnh file DB
+KEEP = int(os.environ.get("ATTENDANCE_BACKUP_KEEP", "7"))
+PAGES_PER_STEP = 256      # ~1 MB mỗi bước với trang 4 KB
+STEP_SLEEP_S = 0.005      # nghỉ giữa các bước: nhường đĩa/CPU cho lượt điểm danh
+MAX_RESTARTS = 3          # rollback journal: bị chép lại quá số lần này thì chép nốt trong một bước
+DB_FILE = "attendance.db"
+PREFIX = "attendance-"
+PARTIAL = ".partial"
+
+class BackupError(Exception):
+    """Bản sao lưu không qua được kiểm tra toàn vẹn."""
+
+class _Restarted(Exception):
+    """Nguồn bị ghi quá nhiều lần giữa các bước (rollback journal)."""
+
+def backup_dir():
+    return BACKUP_DIR or os.path.join(os.path.dirname(os.path.abspath(db.DB_PATH)), "backups")
+
+def copy_database(src_path, dst_path, pages=PAGES_PER_STEP, sleep_s=STEP_SLEEP_S, progress=None):
+    """Chép file SQLite đang được dùng sang `dst_path`, `pages` trang mỗi bước (-1 = một bước).
+
+    Ở chế độ WAL, nguồn giữ một giao dịch đọc suốt quá trình: bản chép là một snapshot nhất quán, không bị
+    làm lại từ đầu mỗi khi có lượt điểm danh mới, và người ghi không bị chặn (WAL cho đọc/ghi song song).
+    Chế độ rollback journal thì nhả khóa giữa các bước để người ghi chen vào; mỗi lần có người ghi, SQLite
+    chép lại từ đầu, nên sau MAX_RESTARTS lần thì chép một bước (chặn ghi trong lúc đó).
+    `progress(số trang đã chép, tổng số trang)` được gọi sau mỗi bước.
+    """
+    src = sqlite3.connect(src_path, timeout=db.BUSY_TIMEOUT_MS / 1000)
+    dst = sqlite3.connect(dst_path)
+    try:
+        if src.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal":
+            src.execute("BEGIN"); src.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        last, restarts = [None], [0]
+        def step(status, remaining, total):
+            if last[0] is not None and remaining > last[0]:
+                restarts[0] += 1
+                if restarts[0] > MAX_RESTARTS: raise _Restarted
+            last[0] = remaining
+            if progress: progress(total - remaining, total)
+            if remaining and sleep_s: time.sleep(sleep_s)
+        try: src.backup(dst, pages=pages, progress=step)
+        except _Restarted: src.backup(dst, pages=-1, progress=step)
+    finally:
+        if src.in_transaction: src.rollback()
+        src.close(); dst.close()
+
+def integrity_errors(path, quick=False):
+    """Kết quả PRAGMA integrity_check (hoặc quick_check) khác 'ok'; rỗng nghĩa là file toàn vẹn."""
+    conn = sqlite3.connect(path)
+    try:
+        rows = [r[0] for r in conn.execute(f"PRAGMA {'quick_check' if quick else 'integrity_check'}")]
+    finally: conn.close()
+    return [] if rows == ["ok"] else rows
+
+def _archive_files(db_path):
+    """Các file kho mà DB `db_path` tham chiếu trong archive_terms (rỗng nếu DB chưa có bảng này)."""
+    conn = sqlite3.connect(db_path)
+    try:
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'archive_terms'").fetchone(): return []
+        return [r[0] for r in conn.execute("SELECT file_name FROM archive_terms ORDER BY first_date")]
+    finally: conn.close()
+
+def _files(snapshot):
+    """(đường dẫn trong bản sao lưu, đường dẫn đang dùng) của DB chính rồi từng file kho."""
+    main = os.path.join(snapshot, DB_FILE)
+    pairs = [(main, db.DB_PATH)]
+    pairs += [(os.path.join(snapshot, "archive", f), os.path.join(db.archive_dir(), f)) for f in _archive_files(main)]
+    return pairs
+
+def verify(snapshot, quick=False):
+    """{tên file: lỗi} của một bản sao lưu; rỗng nghĩa là mọi file đều toàn vẹn."""
+    errors = {}
+    for path, _ in _files(snapshot):
+        if not os.path.exists(path): errors[os.path.basename(path)] = ["thiếu file"]
+        else:
+            found = integrity_errors(path, quick)
+            if found: errors[os.path.basename(path)] = found
+    return errors
+
+def create_backup(dest_dir=None, keep=KEEP, pages=PAGES_PER_STEP, sleep_s=STEP_SLEEP_S, check=True, progress=None):
+    """Sao lưu DB hiện tại (kèm kho năm học) vào một thư mục mới trong `dest_dir`, rồi xoay vòng giữ `keep` bản.
+
+    DB chính được chép trước, kho sau: kho chỉ thêm dữ liệu dưới mốc archive_terms, nên bản chép kho luôn
+    đủ cho mốc trong bản chép DB chính. `progress(tên file, trang đã chép, tổng trang)`.
+    Trả về {"path", "bytes", "seconds", "files"}; BackupError nếu không qua kiểm tra toàn vẹn.
+    """
+    root = dest_dir or backup_dir()
+    os.makedirs(root, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    final = os.path.join(root, PREFIX + stamp)
+    for i in range(1, 100):
+        if not os.path.exists(final) and not os.path.exists(final + PARTIAL): break
+        final = os.path.join(root, f"{PREFIX}{stamp}-{i}")
+    tmp = final + PARTIAL
+    t0 = time.perf_counter()
+    try:
+        os.makedirs(os.path.join(tmp, "archive"))
+        copy_database(db.DB_PATH, os.path.join(tmp, DB_FILE), pages, sleep_s,
+                      progress and (lambda done, total: progress(DB_FILE, done, total)))
+        for path, live in _files(tmp)[1:]:
+            name = os.path.basename(path)
+            copy_database(live, path, pages, sleep_s, progress and (lambda done, total, name=name: progress(name, done, total)))
+        if check:
+            errors = verify(tmp)
+            if errors: raise BackupError(f"Bản sao lưu lỗi: {errors}")
+        os.rename(tmp, final)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    files = [p for p, _ in _files(final)]
+    result = {"path": final, "bytes": sum(os.path.getsize(p) for p in files), "seconds": time.perf_counter() - t0,
+              "files": len(files)}
+    if keep: rotate(root, keep)
+    return result
+
+def list_backups(dest_dir=None):
+    """Các bản sao lưu hoàn chỉnh, mới nhất trước: [{"name", "path", "bytes"}]."""
+    root = dest_dir or backup_dir()
+    if not os.path.isdir(root): return []
+    names = sorted((n for n in os.listdir(root) if n.startswith(PREFIX) and not n.endswith(PARTIAL)), reverse=True)
+    result = []
+    for name in names:
+        path = os.path.join(root, name)
+        size = sum(os.path.getsize(os.path.join(d, f)) for d, _, fs in os.walk(path) for f in fs)
+        result.append({"name": name, "path": path, "bytes": size})
+    return result
+
+def rotate(dest_dir=None, keep=KEEP):
+    """Xóa các bản sao lưu cũ hơn `keep` bản mới nhất. Trả về danh sách đã xóa."""
+    removed = [b["path"] for b in list_backups(dest_dir)[keep:]]
+    for path in removed: shutil.rmtree(path, ignore_errors=True)
+    return removed
+
+def restore(snapshot, check=True, progress=None):
+    """Khôi phục DB chính và kho năm học từ một bản sao lưu (chặn ghi trong lúc chạy).
+
+    Ghi đè tại chỗ bằng backup API một bước thay vì chép file: an toàn với file -wal/-shm hiện có, và tiến
+    trình khác đang mở DB thấy dữ liệu mới ở giao dịch kế tiếp. Kho được ghi trước, DB chính sau cùng.
+    """
+    if not os.path.exists(os.path.join(snapshot, DB_FILE)): raise FileNotFoundError(f"Không phải bản sao lưu: {snapshot}")
+    if check:
+        errors = verify(snapshot, quick=True)
+        if errors: raise BackupError(f"Bản sao lưu lỗi, không khôi phục: {errors}")
+    db.close_all_connections()
+    pairs = _files(snapshot)
+    if len(pairs) > 1: os.makedirs(db.archive_dir(), exist_ok=True)
+    for path, live in pairs[1:] + pairs[:1]:
+        name = os.path.basename(live)
+        copy_database(path, live, -1, 0, progress and (lambda done, total, name=name: progress(name, done, total)))
+    db.set_db_path(db.DB_PATH)  # bỏ cache dữ liệu tham chiếu của DB cũ
+    db.init_db()                # bản sao lưu cũ hơn phiên bản schema hiện tại thì migrate tiếp
+    return len(pairs)
@@ -0,0 +1,69 @@
+# benchmarks/backup_bench.py
+# Độ trễ điểm danh trong lúc backup.py sao lưu trực tuyến (backup chạy ở tiến trình riêng, như một cron job):
+# đo khi rảnh rồi lần lượt với từng cấu hình (số trang mỗi bước : giây nghỉ giữa các bước).
+# Chạy: python benchmarks/backup_bench.py [--classes 100] [--sessions 60] [--rate 200] [--configs -1:0,256:0.005,64:0.02]
+import argparse
+import multiprocessing as mp
+import os
+import time
+
+from common import db, percentile, populate, temp_database
+import backup
+
+def _run_backup(path, dest, pages, sleep_s, out):
+    db.set_db_path(path)
+    out.put(backup.create_backup(dest, keep=1, pages=pages, sleep_s=sleep_s))
+
+def checkins(pairs, rate, until):
+    """Điểm danh đều `rate` lượt/s tới khi until() trả về True; trả về độ trễ từng lượt (ms)."""
+    lat, i, interval = [], 0, 1.0 / rate
+    next_at = time.perf_counter()
+    while not until():
+        student_id, session_id = pairs[i % len(pairs)]; i += 1
+        t0 = time.perf_counter()
+        db.student_mark_attendance(student_id, session_id, "PRESENT", None)
+        lat.append((time.perf_counter() - t0) * 1000)
+        next_at += interval
+        time.sleep(max(0.0, next_at - time.perf_counter()))
+    return lat
+
+def report(label, lat, extra=""):
+    print(f"  {label:22s} {len(lat):>6,} lượt  p50 {percentile(lat, 50):6.2f}  p99 {percentile(lat, 99):7.2f}  "
+          f"max {max(lat):7.2f} ms{extra}")
+
+def main():
+    ap = argparse.ArgumentParser(description="Độ trễ điểm danh trong lúc sao lưu trực tuyến")
+    ap.add_argument("--classes", type=int, default=100)
+    ap.add_argument("--students-per-class", type=int, default=40)
+    ap.add_argument("--subjects", type=int, default=5)
+    ap.add_argument("--sessions", type=int, default=60, help="số buổi mỗi lớp-môn (60 => ~1.2M dòng mặc định)")
+    ap.add_argument("--rate", type=float, default=200, help="lượt điểm danh mỗi giây")
+    ap.add_argument("--idle-s", type=float, default=5, help="số giây đo khi không sao lưu")
+    ap.add_argument("--configs", default=f"-1:0,{backup.PAGES_PER_STEP}:{backup.STEP_SLEEP_S},64:0.02",
+                    help="các cấu hình trang:giây_nghỉ, phân cách bằng dấu phẩy (-1 = chép một bước)")
+    a = ap.parse_args()
+    configs = [(int(p), float(s)) for p, s in (c.split(":") for c in a.configs.split(","))]
+    ctx = mp.get_context("spawn")
+
+    with temp_database() as path:
+        populate(path, a.classes, a.students_per_class, a.subjects, a.sessions)
+        with db.get_connection() as conn:
+            pairs = [tuple(r) for r in conn.execute("""
+                SELECT st.id, s.id FROM attendance_sessions s JOIN class_subjects cs ON cs.id = s.class_subject_id
+                JOIN students st ON st.class_id = cs.class_id WHERE s.status = 'ACTIVE' ORDER BY st.id, s.id""")]
+        size = os.path.getsize(path) / 2**20
+        print(f"DB {size:.0f} MB, {len(pairs):,} cặp sinh viên-buổi đang mở, {a.rate:.0f} lượt/s")
+        deadline = time.perf_counter() + a.idle_s
+        report("không sao lưu", checkins(pairs, a.rate, lambda: time.perf_counter() > deadline))
+        for pages, sleep_s in configs:
+            out = ctx.Queue()
+            proc = ctx.Process(target=_run_backup, args=(path, os.path.join(os.path.dirname(path), "backups"), pages, sleep_s, out))
+            proc.start()
+            lat = checkins(pairs, a.rate, lambda: not proc.is_alive())
+            proc.join()
+            if proc.exitcode != 0: print(f"  {pages}:{sleep_s} LỖI (mã thoát {proc.exitcode})"); continue
+            r = out.get()
+            report(f"trang {pages}, nghỉ {sleep_s}s", lat, f"  | sao lưu + kiểm tra {r['seconds']:.1f}s, {r['bytes'] / 2**20:.0f} MB")
+
+if __name__ == "__main__":
+    main()
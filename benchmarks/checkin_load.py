@@ -0,0 +1,116 @@
+# benchmarks/checkin_load.py
+# Tạo tải lên server.py (chạy ở tiến trình riêng) bằng các client luồng dùng kết nối keep-alive:
+# pha 1 đăng nhập mọi sinh viên + lấy buổi đang mở, pha 2 điểm danh mọi buổi đó.
+# Chạy: python benchmarks/checkin_load.py [--classes 20] [--students-per-class 40] [--clients 16] [--group-commit]
+import argparse
+import http.client
+import json
+import queue
+import re
+import subprocess
+import sys
+import threading
+import time
+
+from common import ROOT_DIR, db, percentile, populate, temp_database
+import auth
+
+PASSWORD = "matkhau123"
+BENCH_COST = "1000"  # KDF rẻ để đo đường điểm danh, không phải tốc độ băm
+
+def prepare(path, a):
+    counts = populate(path, a.classes, a.students_per_class, a.subjects, 3)
+    db.set_setting("password_hasher", auth.PBKDF2Hasher.algorithm)
+    db.set_setting("password_cost", BENCH_COST)
+    auth.configure_from_settings(db.get_setting)
+    with db.get_connection() as conn:
+        conn.execute("UPDATE users SET password_hash = ?", (auth.hash_password(PASSWORD),))
+        # Buổi đang mở bắt đầu trống để mỗi lần điểm danh là một dòng mới
+        conn.execute("DELETE FROM Attendance WHERE session_id IN (SELECT id FROM attendance_sessions WHERE status = 'ACTIVE')")
+        conn.commit()
+    db.close_all_connections()
+    return counts
+
+def start_server(path, extra=()):
+    proc = subprocess.Popen([sys.executable, "server.py", "--db", path, "--port", "0", "--quiet", *extra],
+                            cwd=ROOT_DIR, stdout=subprocess.PIPE, text=True)
+    port = int(re.search(r":(\d+) ", proc.stdout.readline()).group(1))
+    return proc, port
+
+class Client:
+    def __init__(self, port):
+        self.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+
+    def call(self, method, path, body=None, token=None):
+        headers = {"Content-Type": "application/json"}
+        if token: headers["Authorization"] = f"Bearer {token}"
+        self.conn.request(method, path, json.dumps(body) if body is not None else None, headers)
+        resp = self.conn.getresponse()
+        return resp.status, json.loads(resp.read())
+
+def run_phase(port, n_clients, items, step):
+    """Chạy `step(client, item)` -> (status, kết quả) trên n_clients luồng; trả về (kết quả, độ trễ ms, lỗi, giây)."""
+    todo, results, latency, errors, lock = queue.Queue(), [], [], {}, threading.Lock()
+    for item in items: todo.put(item)
+    def worker():
+        client, res, lat, errs = Client(port), [], [], {}
+        while True:
+            try: item = todo.get_nowait()
+            except queue.Empty: break
+            t0 = time.perf_counter()
+            try: status, data = step(client, item)
+            except OSError as e: status = type(e).__name__; client.conn.close()
+            lat.append((time.perf_counter() - t0) * 1000)
+            if status == 200: res.append(data)
+            else: errs[status] = errs.get(status, 0) + 1
+        client.conn.close()
+        with lock:
+            results.extend(res); latency.extend(lat)
+            for k, v in errs.items(): errors[k] = errors.get(k, 0) + v
+    threads = [threading.Thread(target=worker) for _ in range(n_clients)]
+    t0 = time.perf_counter()
+    for t in threads: t.start()
+    for t in threads: t.join()
+    return results, latency, errors, time.perf_counter() - t0
+
+def login(client, username):
+    status, data = client.call("POST", "/api/login", {"username": username, "password": PASSWORD})
+    if status != 200: return status, None
+    status, sessions = client.call("GET", "/api/sessions", token=data["token"])
+    return status, (data["token"], [s["id"] for s in sessions.get("sessions", ())])
+
+def checkin(client, item):
+    token, session_id = item
+    return client.call("POST", "/api/checkin", {"session_id": session_id}, token)
+
+def report(name, n, latency, errors, elapsed):
+    print(f"  {name:10s} {n:>6,} lượt  {elapsed:5.1f}s  {n / elapsed:>6,.0f}/s  p50 {percentile(latency, 50):5.1f} ms  "
+          f"p95 {percentile(latency, 95):5.1f} ms  p99 {percentile(latency, 99):5.1f} ms  lỗi {errors or 0}")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--classes", type=int, default=20)
+    ap.add_argument("--students-per-class", type=int, default=40)
+    ap.add_argument("--subjects", type=int, default=3, help="số buổi đang mở mỗi sinh viên")
+    ap.add_argument("--clients", type=int, default=16)
+    ap.add_argument("--group-commit", action="store_true", help="server gom điểm danh vào chung giao dịch")
+    a = ap.parse_args()
+    with temp_database() as path:
+        counts = prepare(path, a)
+        proc, port = start_server(path, ["--group-commit"] if a.group_commit else [])
+        try:
+            users = [f"sv{i}" for i in range(1, counts["students"] + 1)]
+            logins, lat, errors, elapsed = run_phase(port, a.clients, users, login)
+            print(f"{a.clients} client, {counts['students']:,} sinh viên")
+            report("đăng nhập", len(users), lat, errors, elapsed)
+            items = [(token, sid) for token, sessions in logins for sid in sessions]
+            _, lat, errors, elapsed = run_phase(port, a.clients, items, checkin)
+            report("điểm danh", len(items), lat, errors, elapsed)
+        finally: proc.terminate(); proc.wait()
+        with db.get_connection() as conn:
+            stored = conn.execute("""SELECT COUNT(*) FROM Attendance a JOIN attendance_sessions s ON a.session_id = s.id
+                                     WHERE s.status = 'ACTIVE'""").fetchone()[0]
+        print(f"  đã ghi {stored:,} dòng Attendance")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+# benchmarks/common.py
+# Tiện ích dùng chung cho các script đo hiệu năng: DB tạm + nạp dữ liệu lớn nhanh (qua final_setup).
+import os
+import sys
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path: sys.path.insert(0, ROOT_DIR)
+
+import database as db
+import final_setup
+
+@contextmanager
+def temp_database(keep=False):
+    """Trỏ database.py sang một file DB tạm đã migrate; dọn dẹp khi xong."""
+    old_path = db.DB_PATH
+    tmp_dir = tempfile.mkdtemp(prefix="attendance_bench_")
+    path = os.path.join(tmp_dir, "bench.db")
+    db.set_db_path(path)
+    db.init_db()
+    try:
+        yield path
+    finally:
+        db.set_db_path(old_path)
+        if not keep: shutil.rmtree(tmp_dir, ignore_errors=True)
+
+def populate(path, classes=50, students_per_class=40, subjects_per_class=5,
+             sessions_per_subject=100, seed=11, start=date(2025, 9, 1)):
+    """Nạp dữ liệu giả lập vào DB (đã có schema) bằng final_setup.generate_dataset.
+
+    Số dòng Attendance = classes * subjects_per_class * (sessions_per_subject - 1) * students_per_class
+    (buổi cuối mỗi lớp-môn đang mở, chưa có ai điểm danh). Trả về dict số lượng dòng từng bảng.
+    """
+    db.close_all_connections()  # để generate_dataset đổi được journal_mode trong lúc nạp
+    return final_setup.generate_dataset(path, classes, students_per_class, subjects_per_class, sessions_per_subject,
+                                        seed, start, passwords=False, progress=None)
+
+def percentile(values, p):
+    """Phân vị p (0-100) theo kiểu nearest-rank; 0.0 nếu rỗng."""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] if values else 0.0
+
+def timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - t0) * 1000
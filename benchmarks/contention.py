@@ -0,0 +1,92 @@
+# benchmarks/contention.py
+# Tái hiện giờ cao điểm điểm danh: N tiến trình cùng gọi student_mark_attendance,
+# kèm vài tiến trình đọc báo cáo toàn trường. Thoát mã 1 nếu có lỗi "database is locked".
+# Chạy: python benchmarks/contention.py [--writers 60] [--per-writer 20] [--journal-mode DELETE --no-retry]
+import argparse
+import multiprocessing as mp
+import os
+import sqlite3
+import sys
+import time
+
+from common import db, populate, temp_database
+
+def _writer(path, student_ids, session_id, barrier, out):
+    db.set_db_path(path)
+    ok, locked, other, lat = 0, 0, 0, []
+    barrier.wait()
+    for sid in student_ids:
+        t0 = time.perf_counter()
+        try:
+            db.student_mark_attendance(sid, session_id, "PRESENT", "")
+            ok += 1
+        except sqlite3.OperationalError as e:
+            if db._is_busy_error(e) or isinstance(e, db.DatabaseBusyError): locked += 1
+            else: other += 1
+        lat.append((time.perf_counter() - t0) * 1000)
+    out.put(("w", ok, locked, other, lat))
+
+def _reader(path, stop, barrier, out):
+    db.set_db_path(path)
+    n, locked = 0, 0
+    barrier.wait()
+    while not stop.is_set():
+        try: db.get_school_attendance_report(); n += 1
+        except sqlite3.OperationalError: locked += 1
+    out.put(("r", n, locked, 0, []))
+
+def pct(values, p):
+    if not values: return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--writers", type=int, default=60)
+    ap.add_argument("--per-writer", type=int, default=20)
+    ap.add_argument("--readers", type=int, default=2)
+    ap.add_argument("--journal-mode", default=None, help="ghi đè ATTENDANCE_JOURNAL_MODE (vd: DELETE)")
+    ap.add_argument("--no-retry", action="store_true", help="tắt thử lại để thấy hành vi cũ")
+    a = ap.parse_args()
+    # Tiến trình con đọc cấu hình từ biến môi trường khi import database
+    if a.journal_mode: os.environ["ATTENDANCE_JOURNAL_MODE"] = a.journal_mode
+    if a.no_retry:
+        os.environ["ATTENDANCE_WRITE_RETRIES"] = "0"; os.environ["ATTENDANCE_BUSY_TIMEOUT_MS"] = "0"
+    ctx = mp.get_context("spawn")
+
+    n_students = a.writers * a.per_writer
+    with temp_database() as path:
+        populate(path, classes=1, students_per_class=n_students, subjects_per_class=1, sessions_per_subject=1)
+        with db.get_connection() as conn:
+            conn.execute("DELETE FROM Attendance"); conn.commit()
+            session_id = conn.execute("SELECT id FROM attendance_sessions WHERE status = 'ACTIVE'").fetchone()[0]
+        db.close_all_connections()
+
+        out, stop = ctx.Queue(), ctx.Event()
+        barrier = ctx.Barrier(a.writers + a.readers + 1)
+        ids = list(range(1, n_students + 1))
+        procs = [ctx.Process(target=_writer, args=(path, ids[i::a.writers], session_id, barrier, out)) for i in range(a.writers)]
+        procs += [ctx.Process(target=_reader, args=(path, stop, barrier, out)) for _ in range(a.readers)]
+        for p in procs: p.start()
+        barrier.wait(); t0 = time.perf_counter()
+        results = [out.get() for _ in range(a.writers)]
+        elapsed = time.perf_counter() - t0
+        stop.set()
+        results += [out.get() for _ in range(a.readers)]
+        for p in procs: p.join()
+
+        with db.get_connection() as conn:
+            stored = conn.execute("SELECT COUNT(*) FROM Attendance").fetchone()[0]
+
+    ok = sum(r[1] for r in results if r[0] == "w")
+    locked = sum(r[2] for r in results)
+    other = sum(r[3] for r in results)
+    lat = [x for r in results for x in r[4]]
+    reports = sum(r[1] for r in results if r[0] == "r")
+    print(f"journal_mode={os.environ.get('ATTENDANCE_JOURNAL_MODE', db.JOURNAL_MODE)} writers={a.writers} readers={a.readers}")
+    print(f"check-in OK={ok}/{n_students} (lưu {stored}) lock_errors={locked} other_errors={other}")
+    print(f"thông lượng={ok / elapsed:.0f}/s  p50={pct(lat, 50):.1f}ms p95={pct(lat, 95):.1f}ms p99={pct(lat, 99):.1f}ms  báo cáo đọc song song={reports}")
+    sys.exit(1 if locked or other or stored != n_students else 0)
+
+if __name__ == "__main__":
+    main()
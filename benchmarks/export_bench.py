@@ -0,0 +1,41 @@
+# benchmarks/export_bench.py
+# Đo tốc độ và bộ nhớ của export.py trên bảng Attendance nhiều triệu dòng.
+# Chạy: python benchmarks/export_bench.py [--sessions 200]   (200 => 2M dòng)
+import argparse
+import os
+import resource
+import tempfile
+
+from common import populate, temp_database, timed
+import export
+
+def max_rss_mib():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Linux: KiB
+
+def measure(fmt, path):
+    """Trả về (số dòng, ms, RSS đỉnh tăng thêm MiB) khi xuất toàn bộ nhật ký điểm danh."""
+    before = max_rss_mib()
+    n, ms = timed(export.export, "attendance_log", fmt, path)
+    return n, ms, max_rss_mib() - before
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--classes", type=int, default=50)
+    ap.add_argument("--students-per-class", type=int, default=40)
+    ap.add_argument("--sessions", type=int, default=200, help="số buổi mỗi lớp-môn (5 môn)")
+    a = ap.parse_args()
+    out_dir = tempfile.mkdtemp(prefix="attendance_export_")
+    with temp_database() as path:
+        counts, ms = timed(populate, path, a.classes, a.students_per_class, 5, a.sessions)
+        print(f"Đã nạp {counts['attendance']:,} dòng Attendance trong {ms / 1000:.1f}s")
+        for fmt in ("csv", "xlsx"):
+            out = os.path.join(out_dir, f"log.{fmt}")
+            n, ms, rss = measure(fmt, out)
+            size = os.path.getsize(out)
+            print(f"{fmt:5s} {n:>10,} dòng  {ms / 1000:6.1f}s  {n / (ms / 1000):>9,.0f} dòng/s  "
+                  f"file {size / 2**20:7.1f} MiB  RSS đỉnh tăng {rss:5.1f} MiB")
+            os.remove(out)
+    os.rmdir(out_dir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# benchmarks/group_commit.py
+# So sánh ghi điểm danh mỗi lượt một commit (student_mark_attendance) với hàng đợi group commit
+# (CheckinWriter) khi nhiều sinh viên điểm danh cùng lúc, ở các mức PRAGMA synchronous.
+# Chạy: python benchmarks/group_commit.py [--threads 32] [--students 2000]
+import argparse
+import threading
+import time
+
+from common import db, percentile, populate, temp_database
+
+def open_sessions():
+    with db.get_connection() as conn:
+        return [(r[0], r[1]) for r in conn.execute("""
+            SELECT e.student_id, s.id FROM attendance_sessions s
+            JOIN class_subjects cs ON cs.id = s.class_subject_id
+            JOIN Enrollment e ON e.class_id = cs.class_id
+            WHERE s.status = 'ACTIVE' ORDER BY s.id, e.student_id""")]
+
+def reset():
+    with db.get_connection() as conn:
+        conn.execute("DELETE FROM Attendance WHERE session_id IN (SELECT id FROM attendance_sessions WHERE status = 'ACTIVE')")
+        conn.commit()
+
+def run(pairs, n_threads, mark):
+    """Chia `pairs` cho n_threads luồng, mỗi luồng gọi mark(student_id, session_id). Trả về (giây, độ trễ ms)."""
+    latency, lock = [], threading.Lock()
+    def worker(chunk):
+        lat = []
+        for student_id, session_id in chunk:
+            t0 = time.perf_counter(); mark(student_id, session_id)
+            lat.append((time.perf_counter() - t0) * 1000)
+        with lock: latency.extend(lat)
+    threads = [threading.Thread(target=worker, args=(pairs[i::n_threads],)) for i in range(n_threads)]
+    t0 = time.perf_counter()
+    for t in threads: t.start()
+    for t in threads: t.join()
+    return time.perf_counter() - t0, latency
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--threads", type=int, default=32)
+    ap.add_argument("--students", type=int, default=2000)
+    ap.add_argument("--batch", type=int, default=db.CHECKIN_BATCH)
+    ap.add_argument("--wait-ms", type=float, default=db.CHECKIN_WAIT_MS)
+    a = ap.parse_args()
+    with temp_database() as path:
+        populate(path, classes=a.students // 40, students_per_class=40, subjects_per_class=1, sessions_per_subject=2)
+        pairs = open_sessions()
+        print(f"{len(pairs):,} lượt điểm danh, {a.threads} luồng, lô tối đa {a.batch}, chờ {a.wait_ms} ms")
+        for sync in ("NORMAL", "FULL"):
+            db.SYNCHRONOUS = sync; db.close_all_connections()
+            writer = db.CheckinWriter(a.batch, a.wait_ms)
+            modes = [("mỗi lượt 1 commit", lambda st, ss: db.student_mark_attendance(st, ss)),
+                     ("group commit", lambda st, ss: writer.submit(st, ss).result())]
+            for name, mark in modes:
+                reset()
+                elapsed, lat = run(pairs, a.threads, mark)
+                print(f"  synchronous={sync:6s} {name:18s} {len(pairs) / elapsed:>8,.0f} lượt/s  "
+                      f"p50 {percentile(lat, 50):6.2f} ms  p95 {percentile(lat, 95):6.2f} ms")
+            writer.close()
+            s = writer.stats()
+            print(f"  {'':23s}(group commit: {s['batches']:,} giao dịch, trung bình {s['avg_batch']:.1f} bản ghi/giao dịch)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+# benchmarks/import_bench.py
+# So sánh nhập CSV theo lô (importer.import_users) với gọi create_user_full từng dòng.
+# Chạy: python benchmarks/import_bench.py [--rows 5000]
+import argparse
+import csv
+import os
+import tempfile
+
+from common import db, populate, temp_database, timed
+import importer
+from auth import hash_password
+
+def write_cohort(path, rows, prefix):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(("username", "full_name", "email", "role", "class_code", "gender", "password"))
+        for i in range(rows):
+            w.writerow((f"{prefix}{i}", f"Sinh viên {prefix}{i}", f"{prefix}{i}@uni.edu.vn", "STUDENT", f"L{i % 10 + 1:03d}", "MF"[i % 2], ""))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=5000)
+    a = ap.parse_args()
+    path = os.path.join(tempfile.mkdtemp(prefix="attendance_import_"), "cohort.csv")
+    write_cohort(path, a.rows, "k25_")
+    with temp_database() as db_path:
+        populate(db_path, classes=10, students_per_class=40, subjects_per_class=1, sessions_per_subject=1)
+        result, ms = timed(importer.import_users, path)
+        print(f"import_users      {result['created']:>6,} dòng  {ms:8.0f} ms  {result['created'] / (ms / 1000):>9,.0f} dòng/s  lỗi {len(result['errors'])}")
+        pw = hash_password(importer.DEFAULT_PASSWORD)
+        def one_by_one():
+            for i in range(a.rows): db.create_user_full(f"r25_{i}", pw, f"Sinh viên r{i}", f"r25_{i}@uni.edu.vn", "STUDENT")
+        _, ms = timed(one_by_one)
+        print(f"create_user_full  {a.rows:>6,} dòng  {ms:8.0f} ms  {a.rows / (ms / 1000):>9,.0f} dòng/s  (không gồm lớp/Enrollment)")
+    os.remove(path); os.rmdir(os.path.dirname(path))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# benchmarks/query_plans.py
+# Kiểm tra EXPLAIN QUERY PLAN của các truy vấn nóng trên DB lớn (mặc định 1M dòng Attendance).
+# Chạy: python benchmarks/query_plans.py [--sessions 100] [--keep]
+# Thoát với mã 1 nếu có truy vấn nào full-scan bảng.
+import argparse
+import sys
+
+from common import db, populate, temp_database, timed
+
+# (tên hàm, tham số) — SQL thật được bắt qua trace callback nên luôn khớp với database.py
+HOT_QUERIES = [
+    ("get_student_history", (1,)),
+    ("get_student_history_page", (1,)),
+    ("get_student_history_page", (1, ("2025-10-01", 1000))),
+    ("get_student_subject_summary", (1,)),
+    ("get_open_sessions_for_student", (1,)),
+    ("get_attendance_records_for_session", (1,)),
+    ("get_attendance_changes_since", (1, 0)),
+    ("get_users_page", ()),
+    ("get_users_page", (1000, "STUDENT")),
+]
+
+def capture_sql(fn, *args):
+    """Chạy hàm và trả về các câu SELECT mà nó gửi xuống SQLite."""
+    captured = []
+    with db.get_connection() as conn:
+        conn.set_trace_callback(captured.append)
+        try: fn(*args)
+        finally: conn.set_trace_callback(None)
+    return [s for s in captured if s.lstrip().upper().startswith("SELECT")]
+
+def query_plan(sql):
+    with db.get_connection() as conn:
+        return [r["detail"] for r in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+
+def full_scans(plan):
+    return [d for d in plan if d.startswith("SCAN ") and not d.startswith("SCAN CONSTANT")]
+
+def check_query_plans(verbose=True):
+    """Trả về danh sách (hàm, chi tiết) các bước full-scan; rỗng nghĩa là đạt."""
+    failures = []
+    for name, args in HOT_QUERIES:
+        fn = getattr(db, name)
+        _, ms = timed(fn, *args)
+        for sql in capture_sql(fn, *args):
+            plan = query_plan(sql)
+            if verbose:
+                print(f"\n[{name}] {ms:.2f} ms")
+                for d in plan: print("   ", d)
+            failures += [(name, d) for d in full_scans(plan)]
+    return failures
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--classes", type=int, default=50)
+    ap.add_argument("--students-per-class", type=int, default=40)
+    ap.add_argument("--subjects", type=int, default=5)
+    ap.add_argument("--sessions", type=int, default=100, help="số buổi mỗi lớp-môn (100 => 1M dòng mặc định)")
+    ap.add_argument("--keep", action="store_true", help="giữ lại file DB tạm")
+    a = ap.parse_args()
+    with temp_database(keep=a.keep) as path:
+        counts, ms = timed(populate, path, a.classes, a.students_per_class, a.subjects, a.sessions)
+        print(f"Đã nạp {counts} trong {ms / 1000:.1f}s -> {path}")
+        failures = check_query_plans()
+    if failures:
+        print("\nFAIL: còn full-scan:")
+        for name, d in failures: print(f"  {name}: {d}")
+        sys.exit(1)
+    print("\nOK: không truy vấn nóng nào full-scan.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+# benchmarks/suite.py
+# Đo các hàm đọc của database.py ở nhiều quy mô dữ liệu, lạnh (cache trống) và nóng, xuất JSON để so giữa các lần chạy.
+# Chạy: python benchmarks/suite.py [--tiers 1k,10k] [--data-dir DIR] [--out suite.json] [--compare baseline.json]
+#   --data-dir giữ lại DB từng mức để lần sau khỏi nạp lại (mức 100k ~ 10M dòng Attendance).
+#   --compare thoát với mã 1 nếu p50 nóng của hàm nào chậm hơn baseline quá --threshold lần.
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+from common import ROOT_DIR, db, percentile, populate, temp_database, timed
+
+# Số dòng Attendance = sinh viên x môn x (buổi - 1) — buổi cuối mỗi lớp-môn đang mở
+TIERS = {
+    "1k": dict(classes=25, students_per_class=40, subjects_per_class=5, sessions_per_subject=41),     # 200k dòng
+    "10k": dict(classes=250, students_per_class=40, subjects_per_class=5, sessions_per_subject=41),   # 2M dòng
+    "100k": dict(classes=2500, students_per_class=40, subjects_per_class=5, sessions_per_subject=21), # 10M dòng
+}
+
+# (tên, hàm, sinh tham số từ (random, counts)) — mỗi lần đo một bộ tham số khác để không chỉ đo một trang đã nóng.
+# Hàm có @cached đo qua .uncached (đo truy vấn, không đo bộ nhớ đệm).
+CASES = [
+    ("get_school_attendance_report", db.get_school_attendance_report, lambda r, c: ()),
+    ("get_school_attendance_report[30 ngày]", db.get_school_attendance_report, lambda r, c: ("2025-09-01", "2025-09-30")),
+    ("get_student_history", db.get_student_history, lambda r, c: (r.randint(1, c["students"]),)),
+    ("get_student_history_page", db.get_student_history_page, lambda r, c: (r.randint(1, c["students"]),)),
+    ("get_student_subject_summary", db.get_student_subject_summary, lambda r, c: (r.randint(1, c["students"]),)),
+    ("get_open_sessions_for_student", db.get_open_sessions_for_student, lambda r, c: (r.randint(1, c["students"]),)),
+    ("get_attendance_records_for_session", db.get_attendance_records_for_session, lambda r, c: (r.randint(1, c["sessions"]),)),
+    ("get_attendance_changes_since", db.get_attendance_changes_since, lambda r, c: (r.randint(1, c["sessions"]), 0)),
+    ("get_users_page", db.get_users_page, lambda r, c: ()),
+    ("get_users_page[sâu, STUDENT]", db.get_users_page, lambda r, c: (r.randint(1, c["users"]), "STUDENT")),
+    ("get_all_users", db.get_all_users, lambda r, c: ()),
+    ("get_students_in_class", db.get_students_in_class, lambda r, c: (r.randint(1, c["classes"]),)),
+    ("get_classes_for_teacher", db.get_classes_for_teacher.uncached, lambda r, c: (r.randint(1, c["teachers"]),)),
+    ("get_user_by_username", db.get_user_by_username, lambda r, c: (f"sv{r.randint(1, c['students'])}",)),
+]
+
+COUNTED = {"users": "users", "teachers": "teachers", "students": "students", "classes": "classes",
+           "sessions": "attendance_sessions", "attendance": "Attendance"}
+
+def dataset_counts():
+    """Đếm từ chính DB (đúng cả khi dùng lại file của lần chạy trước)."""
+    with db.get_connection() as conn:
+        return {k: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for k, t in COUNTED.items()}
+
+@contextmanager
+def tier_database(tier, data_dir=None):
+    """DB của một mức; có data_dir thì dùng lại file đã nạp (nạp mới nếu chưa có hoặc khác phiên bản schema)."""
+    if data_dir is None:
+        with temp_database() as path:
+            _, ms = timed(populate, path, **TIERS[tier])
+            yield path, ms / 1000
+        return
+    os.makedirs(data_dir, exist_ok=True)
+    shape = "x".join(str(v) for v in TIERS[tier].values())  # đổi cấu hình mức => file mới
+    path, old_path, load_s = os.path.join(data_dir, f"tier-{tier}-{shape}.db"), db.DB_PATH, 0.0
+    if os.path.exists(path):
+        conn = sqlite3.connect(path)
+        try: stale = conn.execute("PRAGMA user_version").fetchone()[0] != db.SCHEMA_VERSION
+        finally: conn.close()
+        if stale:
+            for f in (path, path + "-wal", path + "-shm"):
+                if os.path.exists(f): os.remove(f)
+    fresh = not os.path.exists(path)
+    db.set_db_path(path)
+    try:
+        db.init_db()
+        if fresh: _, ms = timed(populate, path, **TIERS[tier]); load_s = ms / 1000
+        yield path, load_s
+    finally: db.set_db_path(old_path)
+
+def drop_caches(path):
+    """Trạng thái "lạnh": đóng kết nối (bỏ page cache của SQLite) và bỏ trang file khỏi page cache của OS."""
+    db.close_all_connections()
+    fadvise = getattr(os, "posix_fadvise", None)
+    for f in (path, path + "-wal"):
+        if fadvise and os.path.exists(f):
+            fd = os.open(f, os.O_RDONLY)
+            try: fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            finally: os.close(fd)
+    with db.get_connection(): pass  # mở sẵn kết nối: chỉ đo truy vấn
+
+def summarize(samples):
+    return {"n": len(samples), "min": min(samples), "p50": percentile(samples, 50), "p90": percentile(samples, 90),
+            "p99": percentile(samples, 99), "max": max(samples), "mean": sum(samples) / len(samples)}
+
+def measure(fn, make_args, counts, path, cold_runs, warm_runs, budget_s, seed):
+    rnd = random.Random(seed)
+    cold = []
+    for _ in range(cold_runs):
+        drop_caches(path)
+        result, ms = timed(fn, *make_args(rnd, counts))
+        cold.append(ms)
+    for _ in range(3): fn(*make_args(rnd, counts))  # làm nóng
+    warm, deadline = [], time.perf_counter() + budget_s
+    while len(warm) < warm_runs and (len(warm) < 5 or time.perf_counter() < deadline):
+        warm.append(timed(fn, *make_args(rnd, counts))[1])
+    if isinstance(result, tuple): result = result[0]  # (rows, mốc) của get_attendance_changes_since
+    rows = 0 if result is None else 1 if isinstance(result, dict) else len(result)
+    return {"rows_first_cold": rows, "cold_ms": cold, "warm_ms": summarize(warm)}
+
+def metadata():
+    try: commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True).stdout.strip()
+    except OSError: commit = None
+    return {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "git_commit": commit, "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version, "platform": platform.platform(), "cpus": os.cpu_count(),
+            "schema_version": db.SCHEMA_VERSION, "journal_mode": db.JOURNAL_MODE, "synchronous": db.SYNCHRONOUS}
+
+def compare(results, baseline, threshold, min_delta_ms=0.1):
+    """In bảng so p50 nóng với baseline; trả về danh sách (mức, hàm, tỉ lệ) bị chậm đi."""
+    regressions = []
+    print(f"\nSo với baseline {baseline['meta'].get('git_commit')} ({baseline['meta'].get('time')}):")
+    for tier, data in results["tiers"].items():
+        base = baseline.get("tiers", {}).get(tier, {}).get("cases", {})
+        for name, r in data["cases"].items():
+            if name not in base: continue
+            old, new = base[name]["warm_ms"]["p50"], r["warm_ms"]["p50"]
+            ratio = new / old if old else float("inf")
+            bad = ratio > threshold and new - old > min_delta_ms
+            if bad: regressions.append((tier, name, ratio))
+            print(f"  {tier:5s} {name:40s} {old:9.3f} -> {new:9.3f} ms  x{ratio:5.2f}{'  CHẬM HƠN' if bad else ''}")
+    return regressions
+
+def main():
+    ap = argparse.ArgumentParser(description="Bộ đo hiệu năng các hàm đọc của database.py")
+    ap.add_argument("--tiers", default="1k,10k", help=f"các mức, trong {', '.join(TIERS)}")
+    ap.add_argument("--data-dir", help="thư mục giữ DB từng mức giữa các lần chạy")
+    ap.add_argument("--cases", help="chỉ chạy các hàm có tên chứa một trong các chuỗi này (phân cách bằng dấu phẩy)")
+    ap.add_argument("--cold-runs", type=int, default=3)
+    ap.add_argument("--warm-runs", type=int, default=200)
+    ap.add_argument("--budget", type=float, default=2.0, help="giây tối đa cho phần đo nóng của mỗi hàm")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--out", default="suite_results.json")
+    ap.add_argument("--compare", help="file JSON của lần chạy trước")
+    ap.add_argument("--threshold", type=float, default=1.25)
+    a = ap.parse_args()
+    tiers = [t.strip() for t in a.tiers.split(",") if t.strip()]
+    unknown = [t for t in tiers if t not in TIERS]
+    if unknown: ap.error(f"mức không hỗ trợ: {', '.join(unknown)}")
+    cases = [c for c in CASES if not a.cases or any(k in c[0] for k in a.cases.split(","))]
+
+    results = {"meta": metadata(), "tiers": {}}
+    for tier in tiers:
+        with tier_database(tier, a.data_dir) as (path, load_s):
+            counts = dataset_counts()
+            print(f"\n== Mức {tier}: {counts['students']:,} sinh viên, {counts['attendance']:,} dòng Attendance"
+                  + (f" (nạp {load_s:.1f}s)" if load_s else " (dùng lại DB)"))
+            print(f"  {'hàm':40s} {'dòng':>7s} {'lạnh p50':>10s} {'nóng p50':>10s} {'p90':>9s} {'p99':>9s}  (ms)")
+            tier_result = {"counts": counts, "populate_s": load_s, "cases": {}}
+            for name, fn, make_args in cases:
+                r = measure(fn, make_args, counts, path, a.cold_runs, a.warm_runs, a.budget, a.seed)
+                tier_result["cases"][name] = r
+                w = r["warm_ms"]
+                print(f"  {name:40s} {r['rows_first_cold']:>7,} {percentile(r['cold_ms'], 50):10.3f} "
+                      f"{w['p50']:10.3f} {w['p90']:9.3f} {w['p99']:9.3f}")
+            results["tiers"][tier] = tier_result
+    with open(a.out, "w", encoding="utf-8") as f: json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\nĐã ghi {a.out}")
+    if a.compare:
+        with open(a.compare, encoding="utf-8") as f: baseline = json.load(f)
+        regressions = compare(results, baseline, a.threshold)
+        if regressions:
+            print(f"\nFAIL: {len(regressions)} hàm chậm hơn baseline quá x{a.threshold}")
+            sys.exit(1)
+        print("\nOK: không có hàm nào chậm đi đáng kể.")
+
+if __name__ == "__main__":
+    main()
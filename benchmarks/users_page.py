@@ -0,0 +1,30 @@
+# benchmarks/users_page.py
+# Đo thời gian lấy một trang người dùng (keyset) ở đầu / giữa / cuối danh sách, so với tải toàn bộ bảng.
+# Chạy: python benchmarks/users_page.py [--users 40000]
+import argparse
+
+from common import db, populate, temp_database, timed
+
+def best_of(n, fn, *args):
+    return min(timed(fn, *args)[1] for _ in range(n))
+
+def load_all():
+    with db.get_connection() as conn:
+        return conn.execute("SELECT id, username, full_name, role, email FROM users ORDER BY id DESC").fetchall()
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=40000, help="số tài khoản sinh viên")
+    a = ap.parse_args()
+    with temp_database() as path:
+        counts = populate(path, classes=50, students_per_class=a.users // 50, subjects_per_class=1, sessions_per_subject=1)
+        print(f"Đã nạp {counts['users']:,} người dùng")
+        ids = [r[0] for r in load_all()]
+        print(f"{'tải toàn bộ':24s} {best_of(3, load_all):8.2f} ms")
+        for label, after in (("trang đầu", None), ("trang giữa", ids[len(ids) // 2]), ("trang cuối", ids[-db.USERS_PAGE_SIZE])):
+            for role in (None, "STUDENT", "TEACHER"):
+                ms = best_of(5, db.get_users_page, after, role)
+                print(f"{label:12s} {role or 'tất cả':11s} {ms:8.2f} ms")
+
+if __name__ == "__main__":
+    main()
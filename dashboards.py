@@ -0,0 +1,544 @@
+# dashboards.py
+# Màn hình sau đăng nhập theo vai trò (Admin / Giáo viên / Sinh viên). gui.LoginScreen chỉ import module này
+# khi đăng nhập thành công, nên màn hình đăng nhập mở lên không phải nạp báo cáo, xuất file và hộp thoại.
+import tkinter as tk
+from tkinter import ttk, messagebox, simpledialog, filedialog
+import threading
+import database as db
+import reports
+import export
+import tasks
+from auth import hash_password, verify_password, validate_email, validate_required
+from datetime import datetime, timedelta
+
+ALERT_LABELS = {"WARN": "Sắp vượt hạn mức vắng", "LIMIT": "Vượt hạn mức vắng"}
+
+class BaseDashboard:
+    def __init__(self, root, user):
+        self.root = root
+        self.user = user
+        self.tasks = tasks.runner_for(root)
+        self.content_frame = None
+        self.create_sidebar()
+
+    def run(self, fn, *args, on_done=None, on_error=None, key=None, **kwargs):
+        """Chạy `fn` ở luồng nền cho màn hình hiện tại; kết quả bị bỏ nếu người dùng đã chuyển màn hình."""
+        return self.tasks.submit(fn, *args, on_done=on_done, on_error=on_error, key=key, group="view", **kwargs)
+    
+    def create_sidebar(self):
+        sidebar = tk.Frame(self.root, bg="#1976D2", width=220)
+        sidebar.pack(side="left", fill="y")
+        sidebar.pack_propagate(False)
+        
+        tk.Label(sidebar, text="HỆ THỐNG\nĐIỂM DANH", font=("Segoe UI", 14, "bold"), bg="#1976D2", fg="white").pack(pady=20)
+        tk.Label(sidebar, text=f"Xin chào,\n{self.user['full_name']}", font=("Segoe UI", 10), bg="#1976D2", fg="white").pack(pady=10)
+        
+        menu_frame = tk.Frame(sidebar, bg="#1976D2")
+        menu_frame.pack(pady=20, fill="both", expand=True)
+        
+        self.menu_items = self.get_menu_items()
+        for key, text, color in self.menu_items:
+            tk.Button(menu_frame, text=text, bg=color, fg="white", font=("Segoe UI", 10, "bold"),
+                      command=lambda k=key: self.switch_view(k), height=2, relief="flat").pack(fill="x", pady=2, padx=10)
+        
+        tk.Button(sidebar, text="Đổi mật khẩu", bg="#0288D1", fg="white", font=("Segoe UI", 10),
+                  command=self.change_password_dialog).pack(side="bottom", fill="x", pady=5, padx=10)
+
+        tk.Button(sidebar, text="Đăng xuất", bg="#D32F2F", fg="white", font=("Segoe UI", 10),
+                command=self.logout).pack(side="bottom", fill="x", pady=20, padx=10)
+
+        lbl_busy = tk.Label(sidebar, text="", font=("Segoe UI", 9, "italic"), bg="#1976D2", fg="white")
+        lbl_busy.pack(side="bottom")
+        self.tasks.on_busy(lambda busy: lbl_busy.config(text="Đang xử lý..." if busy else ""))
+    
+    def get_menu_items(self): return []
+    
+    def switch_view(self, view_key):
+        self.tasks.cancel(group="view")  # bỏ kết quả của màn hình cũ còn đang tải
+        if self.content_frame: self.content_frame.destroy()
+        self.content_frame = tk.Frame(self.root, bg="white")
+        self.content_frame.pack(side="right", fill="both", expand=True, padx=20, pady=20)
+        
+        view_method = getattr(self, f"render_{view_key}_view", None)
+        if view_method: view_method()
+        else: tk.Label(self.content_frame, text="Chức năng đang phát triển...", font=("Segoe UI", 14), bg="white").pack(pady=50)
+    
+    def create_scrolled_treeview(self, parent, columns, on_scroll_end=None):
+        """Treeview có thanh cuộn; `on_scroll_end()` (nếu có) được gọi khi cuộn gần cuối để nạp thêm dữ liệu."""
+        frame = tk.Frame(parent)
+        frame.pack(fill="both", expand=True, pady=5)
+        ysb = ttk.Scrollbar(frame, orient="vertical")
+        ysb.pack(side="right", fill="y")
+        xsb = ttk.Scrollbar(frame, orient="horizontal")
+        xsb.pack(side="bottom", fill="x")
+        def yscroll(first, last):
+            ysb.set(first, last)
+            if on_scroll_end and float(last) >= 0.9: frame.after_idle(on_scroll_end)
+        tree = ttk.Treeview(frame, columns=columns, show="headings", 
+                            yscrollcommand=yscroll, xscrollcommand=xsb.set)
+        ysb.config(command=tree.yview); xsb.config(command=tree.xview)
+        tree.pack(side="left", fill="both", expand=True)
+        for c in columns:
+            tree.heading(c, text=c); tree.column(c, width=150, minwidth=100)
+        return tree
+
+    def fill_tree(self, tree, columns, rows):
+        """Đổi bộ cột của Treeview (nếu khác) rồi nạp lại toàn bộ dòng."""
+        if tuple(tree["columns"]) != tuple(columns):
+            tree.configure(columns=columns)
+            for c in columns: tree.heading(c, text=c); tree.column(c, width=120, minwidth=80)
+        tree.delete(*tree.get_children())
+        for r in rows: tree.insert("", "end", values=r)
+
+    def create_report_filters(self, parent, dimensions):
+        """Ô lọc dùng chung cho báo cáo: Từ/Đến, mốc thời gian, chiều. Trả về hàm đọc giá trị."""
+        today = datetime.now()
+        tk.Label(parent, text="Từ:", bg="white").pack(side="left")
+        from_entry = tk.Entry(parent, width=12); from_entry.insert(0, today.replace(day=1).strftime("%Y-%m-%d")); from_entry.pack(side="left", padx=5)
+        tk.Label(parent, text="Đến:", bg="white").pack(side="left")
+        to_entry = tk.Entry(parent, width=12); to_entry.insert(0, today.strftime("%Y-%m-%d")); to_entry.pack(side="left", padx=5)
+        grans = list(reports.GRANULARITY_LABELS)
+        cb_gran = ttk.Combobox(parent, values=[reports.GRANULARITY_LABELS[g] for g in grans], width=7, state="readonly")
+        cb_gran.current(0); cb_gran.pack(side="left", padx=5)
+        cb_dim = ttk.Combobox(parent, values=[reports.DIMENSION_LABELS[d] for d in dimensions], width=11, state="readonly")
+        cb_dim.current(0); cb_dim.pack(side="left", padx=5)
+        return lambda: (from_entry.get(), to_entry.get(), grans[cb_gran.current()], dimensions[cb_dim.current()])
+
+    ROLLUP_COLUMNS = ("Thời gian", "Mã", "Tên", "Số buổi", "Đi học", "Vắng", "Muộn", "Tỷ lệ (%)")
+    def rollup_rows(self, data):
+        return [(r["bucket"], r["code"], r["name"], r["sessions"], r["present"], r["absent"] + r["excused"], r["late"], r["rate"]) for r in data]
+
+    def export_dialog(self, source, default_name, **params):
+        """Hỏi nơi lưu rồi xuất file ở luồng nền, hiện tiến độ; giao diện không bị treo."""
+        path = filedialog.asksaveasfilename(parent=self.root, initialfile=default_name, defaultextension=".xlsx",
+                                            filetypes=[("Excel", "*.xlsx"), ("CSV", "*.csv")])
+        if not path: return
+        fmt = "csv" if path.lower().endswith(".csv") else "xlsx"
+        self.progress_dialog("Xuất file", export.export, source, fmt, path, describe=lambda n: f"Đã ghi {n:,} dòng...",
+                             on_done=lambda n: messagebox.showinfo("Xuất file", f"Đã xuất {n:,} dòng ra:\n{path}"), **params)
+
+    def progress_dialog(self, title, fn, *args, describe, on_done, **kwargs):
+        """Chạy fn(*args, progress=..., cancel=..., **kwargs) ở luồng nền, kèm hộp thoại tiến độ và nút Hủy.
+
+        `describe(*tham số progress)` tạo dòng trạng thái; `on_done(kết quả)` chạy sau khi đóng hộp thoại.
+        """
+        win = tk.Toplevel(self.root); win.title(title)
+        lbl = tk.Label(win, text="Đang chuẩn bị dữ liệu..."); lbl.pack(padx=20, pady=10)
+        bar = ttk.Progressbar(win, mode="indeterminate", length=260); bar.pack(padx=20); bar.start(10)
+        cancel = threading.Event()
+        tk.Button(win, text="Hủy", command=cancel.set).pack(pady=10)
+        win.protocol("WM_DELETE_WINDOW", cancel.set)
+
+        def progress(*a): self.tasks.post(lbl.config, text=describe(*a))  # gọi từ worker
+        def finish(): bar.stop(); win.destroy()
+        def done(result): finish(); on_done(result)
+        def failed(e):
+            finish()
+            if not isinstance(e, export.ExportCancelled): messagebox.showerror("Lỗi", str(e))
+        self.tasks.submit(fn, *args, progress=progress, cancel=cancel, on_done=done, on_error=failed, **kwargs)
+
+    def change_password_dialog(self):
+        win = tk.Toplevel(self.root); win.title("Đổi mật khẩu"); win.geometry("300x200")
+        tk.Label(win, text="Mật khẩu cũ:").pack(pady=5)
+        e_old = tk.Entry(win, show="*"); e_old.pack()
+        tk.Label(win, text="Mật khẩu mới:").pack(pady=5)
+        e_new = tk.Entry(win, show="*"); e_new.pack()
+        
+        def save():
+            old, new = e_old.get(), e_new.get()
+            if len(new) < 6:
+                messagebox.showerror("Lỗi", "Mật khẩu mới phải >= 6 ký tự"); return
+            def work():
+                if not verify_password(old, self.user["password_hash"]): return None
+                new_hash = hash_password(new)
+                return new_hash if db.update_password(self.user["id"], new_hash) else False
+            def done(new_hash):
+                if new_hash is None: messagebox.showerror("Lỗi", "Mật khẩu cũ không đúng")
+                elif new_hash:
+                    self.user["password_hash"] = new_hash
+                    messagebox.showinfo("Thành công", "Đổi mật khẩu thành công!"); win.destroy()
+                else: messagebox.showerror("Lỗi", "Không thể cập nhật")
+            self.tasks.submit(work, on_done=done)
+        
+        tk.Button(win, text="Lưu", command=save, bg="#28a745", fg="white").pack(pady=15)
+
+    def logout(self):
+        if messagebox.askyesno("Đăng xuất", "Bạn có chắc muốn đăng xuất?"):
+            self.root.destroy(); import main; main.main()
+
+class AdminDashboard(BaseDashboard):
+    def get_menu_items(self):
+        return [("users", "Quản lý Người dùng", "#7B1FA2"), ("classes", "Quản lý Lớp học", "#7B1FA2"), ("report", "Báo cáo Tổng hợp", "#E64A19"),
+                ("risk", "SV Nguy cơ Cấm thi", "#C62828")]
+    
+    def render_users_view(self):
+        tk.Label(self.content_frame, text="QUẢN LÝ NGƯỜI DÙNG", font=("Segoe UI", 16, "bold"), fg="#7B1FA2", bg="white").pack(pady=10)
+        f = tk.LabelFrame(self.content_frame, text="Thêm mới", bg="white"); f.pack(fill="x")
+        entries = {}
+        for i, (lbl, key) in enumerate([("User:",0), ("Tên:",1), ("Email:",2)]):
+            tk.Label(f, text=lbl, bg="white").grid(row=0, column=i*2)
+            e = tk.Entry(f); e.grid(row=0, column=i*2+1); entries[key] = e
+        tk.Label(f, text="Role:", bg="white").grid(row=0, column=6)
+        cb = ttk.Combobox(f, values=["STUDENT", "TEACHER", "ADMIN"], width=8); cb.current(0); cb.grid(row=0, column=7)
+        def add():
+            username, full_name, email, role = entries[0].get(), entries[1].get(), entries[2].get(), cb.get()
+            def done(result):
+                s, m = result
+                if s: messagebox.showinfo("OK", "Đã tạo. Pass: 123456"); show_new()
+                else: messagebox.showerror("Err", m)
+            self.run(lambda: db.create_user_full(username, hash_password("123456"), full_name, email, role), on_done=done)
+        tk.Button(f, text="Thêm", command=add, bg="green", fg="white").grid(row=0, column=8, padx=10)
+        def import_csv():
+            import importer
+            path = filedialog.askopenfilename(parent=self.root, title="Chọn file CSV tài khoản", filetypes=[("CSV", "*.csv")])
+            if not path: return
+            def done(result):
+                msg = f"Đã tạo {result['created']:,}/{result['rows']:,} tài khoản (mật khẩu mặc định: {importer.DEFAULT_PASSWORD})."
+                if result["cancelled"]: msg += "\nĐã hủy giữa chừng: các lô đã ghi được giữ lại."
+                if result["errors"]:
+                    msg += f"\n\n{len(result['errors']):,} dòng lỗi:\n" + "\n".join(f"Dòng {line}: {err}" for line, err in result["errors"][:10])
+                    if len(result["errors"]) > 10: msg += "\n..."
+                    messagebox.showwarning("Nhập CSV", msg)
+                else: messagebox.showinfo("Nhập CSV", msg)
+                reset()
+            self.progress_dialog("Nhập CSV", importer.import_users, path, on_done=done,
+                                 describe=lambda rows, created: f"Đã đọc {rows:,} dòng, tạo {created:,} tài khoản...")
+        tk.Button(f, text="Nhập CSV...", command=import_csv, bg="#1976D2", fg="white").grid(row=0, column=9)
+
+        bar = tk.Frame(self.content_frame, bg="white"); bar.pack(fill="x", pady=5)
+        tk.Label(bar, text="Lọc vai trò:", bg="white").pack(side="left")
+        cb_role = ttk.Combobox(bar, values=["Tất cả", "STUDENT", "TEACHER", "ADMIN"], width=10, state="readonly")
+        cb_role.current(0); cb_role.pack(side="left", padx=5)
+        lbl_count = tk.Label(bar, text="", bg="white", fg="gray"); lbl_count.pack(side="left", padx=10)
+
+        # Danh sách nạp từng trang theo keyset khi cuộn tới cuối, không tải toàn bộ bảng users
+        state = {"last_id": None, "done": False, "loading": False}
+        def role_filter(): return None if cb_role.get() == "Tất cả" else cb_role.get()
+        def row_values(u): return (u['id'], u['username'], u['full_name'], u['email'], u['role'])
+        def load_more():
+            if state["done"] or state["loading"]: return
+            state["loading"] = True
+            self.run(db.get_users_page, state["last_id"], role_filter(), on_done=add_page, on_error=page_failed, key="users_page")
+        def add_page(page):
+            state["loading"] = False
+            for u in page:
+                if not tree.exists(str(u['id'])): tree.insert("", "end", iid=str(u['id']), values=row_values(u))
+            if page: state["last_id"] = page[-1]['id']
+            state["done"] = len(page) < db.USERS_PAGE_SIZE
+            lbl_count.config(text=f"Đã tải {len(tree.get_children())}" + ("" if state["done"] else "+"))
+        def page_failed(e): state["loading"] = False; tasks.show_error(e)
+        def reset(_e=None):
+            self.tasks.cancel(key="users_page")
+            tree.delete(*tree.get_children())
+            state.update(last_id=None, done=False, loading=False)
+            load_more()
+        def show_new():
+            # Chèn riêng người dùng vừa tạo lên đầu (id lớn nhất) thay vì nạp lại cả danh sách
+            def insert(page):
+                for u in page:
+                    if not tree.exists(str(u['id'])): tree.insert("", 0, iid=str(u['id']), values=row_values(u))
+            self.run(db.get_users_page, None, role_filter(), 1, on_done=insert)
+
+        cols = ("ID", "Tên ĐN", "Họ Tên", "Email", "Vai Trò")
+        tree = self.create_scrolled_treeview(self.content_frame, cols, on_scroll_end=load_more)
+        cb_role.bind("<<ComboboxSelected>>", reset)
+        reset()
+        def delete():
+            if not tree.selection(): return
+            item = tree.selection()[0]
+            if messagebox.askyesno("Xóa", "Chắc chắn xóa?"):
+                self.run(db.delete_user, tree.item(item, "values")[0], on_done=lambda _: tree.exists(item) and tree.delete(item))
+        tk.Button(self.content_frame, text="Xóa", command=delete, bg="red", fg="white").pack(pady=5)
+
+    def render_classes_view(self):
+        tk.Label(self.content_frame, text="QUẢN LÝ LỚP HỌC", font=("Segoe UI", 16, "bold"), fg="#7B1FA2", bg="white").pack(pady=10)
+        f = tk.LabelFrame(self.content_frame, text="Thêm lớp", bg="white"); f.pack(fill="x")
+        tk.Label(f, text="Mã Lớp:", bg="white").grid(row=0, column=0)
+        e_code = tk.Entry(f); e_code.grid(row=0, column=1)
+        tk.Label(f, text="Tên Lớp:", bg="white").grid(row=0, column=2)
+        e_name = tk.Entry(f); e_name.grid(row=0, column=3)
+        tk.Label(f, text="GVCN:", bg="white").grid(row=0, column=4)
+        cb_t = ttk.Combobox(f, values=[]); cb_t.grid(row=0, column=5)
+        self.run(db.get_all_teachers, on_done=lambda ts: cb_t.config(values=[f"{t['id']} - {t['full_name']}" for t in ts]), key="teachers")
+        def add():
+            if not e_code.get() or not cb_t.get(): return
+            tid = cb_t.get().split(" - ")[0]
+            def done(result):
+                s, m = result
+                if s: messagebox.showinfo("OK", "Thêm lớp thành công"); load()
+                else: messagebox.showerror("Err", m)
+            self.run(db.create_class, e_code.get(), e_name.get(), tid, on_done=done)
+        tk.Button(f, text="Thêm", command=add, bg="green", fg="white").grid(row=0, column=6, padx=10)
+        
+        cols = ("ID","Mã","Tên","GVCN")
+        tree = self.create_scrolled_treeview(self.content_frame, cols)
+        def load():
+            self.run(db.get_all_classes, key="classes", on_done=lambda classes: self.fill_tree(
+                tree, cols, [(c['id'], c['class_code'], c['class_name'], c['teacher_name']) for c in classes]))
+        load()
+        def delete():
+            if tree.selection(): self.run(db.delete_class, tree.item(tree.selection()[0], "values")[0], on_done=lambda _: load())
+        tk.Button(self.content_frame, text="Xóa Lớp", command=delete, bg="red", fg="white").pack()
+
+    def render_report_view(self):
+        tk.Label(self.content_frame, text="BÁO CÁO TỔNG HỢP", font=("Segoe UI", 16, "bold"), bg="white", fg="#E64A19").pack(pady=10)
+        filter_frame = tk.Frame(self.content_frame, bg="white")
+        filter_frame.pack(pady=5)
+        get_filters = self.create_report_filters(filter_frame, ["class", "subject", "teacher"])
+
+        cols = ("Lớp", "Tên Lớp", "Sĩ số", "Tổng buổi", "Đi học", "Vắng", "Muộn", "Tỷ lệ (%)")
+        tree = self.create_scrolled_treeview(self.content_frame, cols)
+
+        def query(start, end, gran, dim):
+            if gran == "all" and dim == "class":
+                data = db.get_school_attendance_report(start, end)
+                return cols, [list(r.values()) + [reports.attendance_rate(r["present_count"], r["late_count"], r["present_count"] + r["absent_count"] + r["late_count"])] for r in data]
+            return self.ROLLUP_COLUMNS, self.rollup_rows(reports.rollup(gran, dim, start, end))
+        def load_report():
+            self.run(query, *get_filters(), on_done=lambda result: self.fill_tree(tree, *result), key="report")
+
+        tk.Button(filter_frame, text="Xem", command=load_report, bg="#E64A19", fg="white").pack(side="left", padx=10)
+        def export_report():
+            start, end, _, _ = get_filters()
+            self.export_dialog("school_report", f"bao_cao_{start}_{end}.xlsx", start_date=start, end_date=end)
+        def export_log():
+            start, end, _, _ = get_filters()
+            self.export_dialog("attendance_log", f"nhat_ky_diem_danh_{start}_{end}.xlsx", start_date=start, end_date=end)
+        tk.Button(filter_frame, text="Xuất báo cáo", command=export_report, bg="#1976D2", fg="white").pack(side="left")
+        tk.Button(filter_frame, text="Xuất nhật ký", command=export_log, bg="#1976D2", fg="white").pack(side="left", padx=5)
+        load_report()
+
+    RISK_LIMIT = 2000  # số dòng hiển thị; thống kê vẫn tính trên toàn trường
+    def render_risk_view(self):
+        import analytics  # kéo theo NumPy: chỉ nạp khi mở màn hình này
+        tk.Label(self.content_frame, text="SINH VIÊN CÓ NGUY CƠ CẤM THI", font=("Segoe UI", 16, "bold"), bg="white", fg="#C62828").pack(pady=10)
+        if not analytics.available():
+            tk.Label(self.content_frame, text="Cần cài NumPy để dùng chức năng này: pip install numpy", bg="white", fg="red").pack(); return
+        lbl = tk.Label(self.content_frame, text="Đang phân tích toàn trường...", bg="white", fg="gray"); lbl.pack()
+        cols = ("Mã SV", "Họ Tên", "Lớp", "Mức", "Vắng cao nhất (%)", "Môn", "Số môn vượt", "Các môn vượt", "Vắng gần đây (%)", "Xu hướng (điểm %)")
+        tree = self.create_scrolled_treeview(self.content_frame, cols)
+        def show(result):
+            rows, st = result
+            self.fill_tree(tree, cols, [(r['student_code'], r['full_name'], r['class_code'], r['level'], r['worst_rate'], r['worst_subject'],
+                                         r['breaches'], r['subjects'], r['recent_rate'], f"{r['trend']:+.1f}") for r in rows])
+            lbl.config(text=f"{st['flagged']:,}/{st['students']:,} sinh viên cần chú ý, {st['breached']:,} vắng quá {100 * st['absence_limit']:.0f}% một môn"
+                            + (f" (hiện {len(rows):,} trường hợp nặng nhất)" if len(rows) < st['flagged'] else "")
+                            + f" — {st['total_ms']:.0f} ms", fg="#333")
+        def load(): self.run(analytics.at_risk_students, limit=self.RISK_LIMIT, on_done=show, key="at_risk")
+        tk.Button(self.content_frame, text="Làm mới", command=load, bg="#C62828", fg="white").pack(pady=5)
+        load()
+
+class TeacherDashboard(BaseDashboard):
+    def get_menu_items(self):
+        return [("attendance", "Quản lý Điểm danh", "#388E3C"), ("report", "Báo cáo Lớp", "#E64A19"), ("alerts", "Cảnh báo Vắng", "#C62828")]
+    def load_teacher_classes(self):
+        teacher = db.get_teacher_by_user_id(self.user["id"])
+        return teacher, (db.get_classes_for_teacher(teacher["id"]) if teacher else [])
+
+    def render_attendance_view(self):
+        tk.Label(self.content_frame, text="QUẢN LÝ ĐIỂM DANH", font=("Segoe UI", 16, "bold"), bg="white", fg="#388E3C").pack(pady=10)
+        self.run(self.load_teacher_classes, on_done=self.build_attendance_view, key="teacher")
+    def build_attendance_view(self, result):
+        self.teacher_info, self.classes = result
+        self.curr_ss = None
+        if not self.teacher_info: tk.Label(self.content_frame, text="Lỗi: Chưa cấp quyền Giáo viên", fg="red").pack(); return
+        if not self.classes: tk.Label(self.content_frame, text="Giáo viên chưa được phân công lớp nào.", bg="white").pack(); return
+
+        frame_top = tk.Frame(self.content_frame, bg="white"); frame_top.pack(fill="x", padx=20)
+        self.cb_class = ttk.Combobox(frame_top, values=[f"{c['class_code']} - {c['subject_name']}" for c in self.classes], width=40, state="readonly")
+        self.cb_class.current(0); self.cb_class.pack(side="left", padx=5)
+        tk.Button(frame_top, text="Tải Dữ Liệu", bg="#1976D2", fg="white", command=self.load_session).pack(side="left")
+        
+        self.frame_ss = tk.Frame(self.content_frame, bg="white", pady=10); self.frame_ss.pack(fill="x", padx=20)
+        self.lbl_stt = tk.Label(self.frame_ss, text="...", font=("Segoe UI", 10, "bold"), bg="white"); self.lbl_stt.pack(side="left")
+        self.btn_open = tk.Button(self.frame_ss, text="Mở Buổi Học Mới", bg="#28a745", fg="white", command=self.open_ss)
+        self.btn_close = tk.Button(self.frame_ss, text="Đóng Buổi Học", bg="#d32f2f", fg="white", command=self.close_ss)
+        self.btn_all_absent = tk.Button(self.frame_ss, text="Còn lại: Vắng", bg="#F57C00", fg="white", command=lambda: self.mark_remaining("ABSENT"))
+        self.btn_all_present = tk.Button(self.frame_ss, text="Còn lại: Có mặt", bg="#388E3C", fg="white", command=lambda: self.mark_remaining("PRESENT"))
+        self.btn_export = tk.Button(self.frame_ss, text="Xuất DS", bg="#1976D2", fg="white",
+                                    command=lambda: self.export_dialog("session_records", f"{self.curr_ss['session_code']}.xlsx", session_id=self.curr_ss['id']))
+
+        self.tree = self.create_scrolled_treeview(self.content_frame, ("ID","Mã","Tên","TT","Ghi chú"))
+        self.tree.column("ID", width=0, stretch=False)
+        self.tree.bind("<Double-1>", self.edit_att)
+
+    REFRESH_MS = 5000
+    def get_cid(self): return self.classes[self.cb_class.current()]["class_subject_id"]
+    @staticmethod
+    def fetch_session(class_subject_id, class_id):
+        ss = db.get_open_session_for_class_subject(class_subject_id)
+        recs, mark = db.get_attendance_changes_since(ss['id']) if ss else ([], None)
+        return ss, {r['student_id']: r for r in recs}, mark, db.get_students_in_class(class_id)
+    def load_session(self):
+        self.run(self.fetch_session, self.get_cid(), self.classes[self.cb_class.current()]['class_id'], on_done=self.show_session, key="session")
+    def show_session(self, result):
+        # Dựng lại cả bảng chỉ khi đổi lớp/buổi; sau đó cập nhật từng dòng (iid = student_id)
+        self.curr_ss, recs, self.sync_mark, students = result
+        self.tree.delete(*self.tree.get_children())
+        if self.curr_ss:
+            until = f", đóng lúc {self.curr_ss['close_at'][11:16]}" if self.curr_ss['close_at'] else ""
+            self.lbl_stt.config(text=f"Đang mở: {self.curr_ss['session_code']} (Ngày: {self.curr_ss['date']}{until})", fg="green")
+            self.btn_open.pack_forget(); self.btn_close.pack(side="right")
+            self.btn_all_absent.pack(side="right", padx=5); self.btn_all_present.pack(side="right"); self.btn_export.pack(side="right", padx=5)
+        else:
+            self.lbl_stt.config(text="Chưa có buổi học nào mở.", fg="#555")
+            self.btn_close.pack_forget(); self.btn_all_absent.pack_forget(); self.btn_all_present.pack_forget(); self.btn_export.pack_forget()
+            self.btn_open.pack(side="right")
+        for s in students:
+            r = recs.get(s['student_id'])
+            self.tree.insert("", "end", iid=str(s['student_id']),
+                             values=(s['student_id'], s['student_code'], s['full_name'], r['status'] if r else "---", (r['note'] or "") if r else ""))
+        if self.curr_ss: self.schedule_refresh()
+    def set_row(self, student_id, status, note):
+        iid = str(student_id)
+        if not self.tree.exists(iid): return
+        vals = list(self.tree.item(iid, "values")); vals[3], vals[4] = status, note or ""
+        self.tree.item(iid, values=vals)
+    def refresh_changes(self):
+        """Chỉ lấy các bản ghi mới/sửa từ lần đồng bộ trước (vd. sinh viên tự điểm danh)."""
+        ss = self.curr_ss
+        if not ss: return
+        def apply(result):
+            if self.curr_ss is not ss: return
+            rows, self.sync_mark = result
+            for r in rows: self.set_row(r['student_id'], r['status'], r['note'])
+        self.run(db.get_attendance_changes_since, ss['id'], self.sync_mark, on_done=apply, key="att_delta")
+    def schedule_refresh(self):
+        frame, ss = self.content_frame, self.curr_ss
+        def tick():
+            if self.content_frame is not frame or self.curr_ss is not ss: return  # đã chuyển màn hình/buổi
+            if ss['close_at'] and db.get_vn_time() >= ss['close_at']:  # hết giờ: đóng ngay, không chờ lượt của SessionCloser
+                self.run(db.close_expired_sessions, on_done=lambda _: self.load_session()); return
+            self.refresh_changes(); self.root.after(self.REFRESH_MS, tick)
+        self.root.after(self.REFRESH_MS, tick)
+    CHECKIN_WINDOW_MIN = 15
+    def open_ss(self):
+        minutes = simpledialog.askinteger("Mở buổi học", "Thời gian cho điểm danh (phút, 0 = đến khi bấm Đóng):",
+                                          initialvalue=self.CHECKIN_WINDOW_MIN, minvalue=0, maxvalue=24 * 60, parent=self.root)
+        if minutes is None: return
+        now_str = datetime.now().strftime('%Y-%m-%d')
+        code = f"{self.classes[self.cb_class.current()]['subject_code']}_{now_str}"
+        # close_at theo giờ VN như start_time; SessionCloser sẽ đóng buổi khi hết giờ
+        close_at = (datetime.strptime(db.get_vn_time(), "%Y-%m-%d %H:%M:%S") + timedelta(minutes=minutes)).strftime("%Y-%m-%d %H:%M:%S") if minutes else None
+        def done(_):
+            self.load_session()
+            messagebox.showinfo("Thành công", f"Đã mở buổi học ngày {now_str}" + (f", tự đóng lúc {close_at[11:16]}" if close_at else ""))
+        self.run(db.create_attendance_session, self.get_cid(), code, now_str, self.user["id"], close_at, on_done=done,
+                 on_error=lambda e: messagebox.showerror("Lỗi", f"Lỗi (Có thể đã mở rồi): {str(e)}"))
+    def close_ss(self):
+        if messagebox.askyesno("Đóng", "Kết thúc buổi học?"): self.run(db.close_attendance_session, self.curr_ss['id'], on_done=lambda _: self.load_session())
+    def edit_att(self, event):
+        if not self.curr_ss: return
+        items = self.tree.selection()
+        if not items: return
+        rows = [self.tree.item(i, "values") for i in items]
+        vals = rows[0]
+        win = tk.Toplevel(self.root)
+        win.title(f"Điểm danh: {vals[2]}" if len(rows) == 1 else f"Điểm danh: {len(rows)} sinh viên")
+        v = tk.StringVar(value=vals[3] if vals[3] != "---" else "PRESENT")
+        tk.Radiobutton(win, text="Có mặt", variable=v, value="PRESENT").pack()
+        tk.Radiobutton(win, text="Vắng", variable=v, value="ABSENT").pack()
+        def save():
+            tid, ss_id, status = self.teacher_info["id"], self.curr_ss['id'], v.get()
+            def done(_):
+                for r in rows: self.set_row(r[0], status, "")
+            if len(rows) == 1: self.run(db.upsert_attendance_record, ss_id, vals[0], status, "", tid, on_done=done)
+            else: self.run(db.bulk_upsert_attendance, ss_id, [(r[0], status, "") for r in rows], tid, on_done=done)
+            win.destroy()
+        tk.Button(win, text="Lưu", command=save).pack()
+    def mark_remaining(self, status):
+        if not self.curr_ss: return
+        label = "Có mặt" if status == "PRESENT" else "Vắng"
+        if not messagebox.askyesno("Điểm danh", f"Đánh dấu '{label}' cho tất cả sinh viên chưa điểm danh?"): return
+        def done(n): self.refresh_changes(); messagebox.showinfo("Thành công", f"Đã đánh dấu {n} sinh viên.")
+        self.run(db.mark_remaining_attendance, self.curr_ss['id'], self.classes[self.cb_class.current()]['class_id'], status,
+                 self.teacher_info["id"], on_done=done)
+
+    def render_report_view(self):
+        tk.Label(self.content_frame, text="BÁO CÁO LỚP", font=("Segoe UI", 16, "bold"), bg="white", fg="#E64A19").pack(pady=10)
+        self.run(self.load_teacher_classes, on_done=self.build_report_view, key="teacher")
+    def build_report_view(self, result):
+        teacher_info, classes = result
+        if not teacher_info: tk.Label(self.content_frame, text="Lỗi: Chưa cấp quyền Giáo viên", fg="red").pack(); return
+        filter_frame = tk.Frame(self.content_frame, bg="white"); filter_frame.pack(pady=5)
+        cb_cs = ttk.Combobox(filter_frame, values=["Tất cả lớp"] + [f"{c['class_code']} - {c['subject_name']}" for c in classes], width=25, state="readonly")
+        cb_cs.current(0); cb_cs.pack(side="left", padx=5)
+        get_filters = self.create_report_filters(filter_frame, ["class_subject", "student"])
+        tree = self.create_scrolled_treeview(self.content_frame, self.ROLLUP_COLUMNS)
+
+        def load_report():
+            start, end, gran, dim = get_filters()
+            cs_id = classes[cb_cs.current() - 1]["class_subject_id"] if cb_cs.current() > 0 else None
+            self.run(reports.rollup, gran, dim, start, end, teacher_id=teacher_info["id"], class_subject_id=cs_id, key="report",
+                     on_done=lambda data: self.fill_tree(tree, self.ROLLUP_COLUMNS, self.rollup_rows(data)))
+
+        tk.Button(filter_frame, text="Xem", command=load_report, bg="#E64A19", fg="white").pack(side="left", padx=10)
+        load_report()
+
+    def render_alerts_view(self):
+        tk.Label(self.content_frame, text="CẢNH BÁO VẮNG", font=("Segoe UI", 16, "bold"), bg="white", fg="#C62828").pack(pady=10)
+        # Bảng attendance_alerts được trigger cập nhật ngay khi ghi điểm danh: chỉ đọc, không tính lại
+        cols = ("Lớp", "Môn", "Mã SV", "Họ Tên", "Mức", "Vắng/Buổi", "Từ lúc")
+        tree = self.create_scrolled_treeview(self.content_frame, cols)
+        def fetch():
+            teacher = db.get_teacher_by_user_id(self.user["id"])
+            return db.get_teacher_alerts(teacher["id"]) if teacher else []
+        def show(rows):
+            self.fill_tree(tree, cols, [(r['class_code'], r['subject_name'], r['student_code'], r['full_name'], ALERT_LABELS[r['level']],
+                                         f"{r['absences']}/{r['sessions']}", r['raised_at']) for r in rows])
+        def load(): self.run(fetch, on_done=show, key="alerts")
+        tk.Button(self.content_frame, text="Làm mới", command=load, bg="#C62828", fg="white").pack(pady=5)
+        load()
+
+class StudentDashboard(BaseDashboard):
+    def get_menu_items(self): return [("attend", "Tự Điểm Danh", "#28a745"), ("history", "Lịch Sử", "#F57C00")]
+    def load_student(self, fetch):
+        s_info = db.get_student_by_user_id(self.user["id"])
+        return s_info, (fetch(s_info['id']) if s_info else [])
+
+    def render_attend_view(self):
+        tk.Label(self.content_frame, text="ĐIỂM DANH HÔM NAY", font=("Segoe UI", 16, "bold"), bg="white").pack(pady=10)
+        self.run(self.load_student, self.fetch_attend, on_done=self.build_attend_view, key="student")
+    @staticmethod
+    def fetch_attend(student_id): return db.get_open_sessions_for_student(student_id), db.get_student_alerts(student_id)
+    def build_attend_view(self, result):
+        s_info, data = result
+        if not s_info: return
+        sessions, alerts = data
+        for a in alerts:
+            color = "#C62828" if a['level'] == "LIMIT" else "#EF6C00"
+            tk.Label(self.content_frame, text=f"⚠ {ALERT_LABELS[a['level']]}: {a['subject_name']} ({a['class_code']}) — vắng {a['absences']}/{a['sessions']} buổi",
+                     bg=color, fg="white", font=("Segoe UI", 10, "bold"), anchor="w", padx=10).pack(fill="x", padx=20, pady=2)
+        if not sessions: tk.Label(self.content_frame, text="Không có buổi học nào đang mở.", bg="white").pack(); return
+        for s in sessions:
+            f = tk.Frame(self.content_frame, bg="#f8f9fa", bd=1, relief="solid"); f.pack(fill="x", padx=20, pady=5)
+            tk.Label(f, text=f"{s['subject_name']} | {s['date']}", bg="#f8f9fa", font=("Segoe UI", 10, "bold")).pack(anchor="w")
+            def mark(sid=s['id'], stid=s_info['id']):
+                self.run(db.student_mark_attendance, stid, sid, "PRESENT", "", on_done=lambda _: messagebox.showinfo("OK", "Điểm danh thành công!"))
+            tk.Button(f, text="CÓ MẶT NGAY", bg="#28a745", fg="white", command=mark).pack(pady=5)
+    def render_history_view(self):
+        tk.Label(self.content_frame, text="LỊCH SỬ ĐIỂM DANH", font=("Segoe UI", 16, "bold"), bg="white", fg="#F57C00").pack(pady=10)
+        # Thống kê theo môn đọc từ bảng tổng hợp; lịch sử chi tiết nạp từng trang khi cuộn tới cuối
+        summary = self.create_scrolled_treeview(self.content_frame, ("Môn Học", "Số buổi", "Có mặt", "Vắng", "Muộn", "Tỷ lệ (%)"))
+        summary.configure(height=6)
+        tree = self.create_scrolled_treeview(self.content_frame, ("Ngày", "Môn Học", "Trạng Thái", "Ghi Chú"), on_scroll_end=lambda: load_more())
+        state = {"student_id": None, "after": None, "done": False, "loading": False}
+        def load_more():
+            if state["student_id"] is None or state["done"] or state["loading"]: return
+            state["loading"] = True
+            self.run(db.get_student_history_page, state["student_id"], state["after"], on_done=add_page, on_error=page_failed, key="history_page")
+        def add_page(page):
+            state["loading"] = False
+            for h in page: tree.insert("", "end", values=(h['date'], h['subject_name'], h['status'], h['note'] or ""))
+            if page: state["after"] = (page[-1]['date'], page[-1]['session_id'])
+            state["done"] = len(page) < db.HISTORY_PAGE_SIZE
+        def page_failed(e): state["loading"] = False; tasks.show_error(e)
+        def show(result):
+            s_info, subjects = result
+            if not s_info: return
+            for r in subjects:
+                summary.insert("", "end", values=(r['subject_name'], r['sessions'], r['present'], r['absent'] + r['excused'], r['late'], r['rate']))
+            state["student_id"] = s_info['id']; load_more()
+            tk.Button(self.content_frame, text="Xuất lịch sử", bg="#1976D2", fg="white",
+                      command=lambda: self.export_dialog("student_history", f"lich_su_{s_info['student_code']}.xlsx", student_id=s_info['id'])).pack(pady=5)
+        self.run(self.load_student, db.get_student_subject_summary, on_done=show, key="student")
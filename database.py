@@ -5,6 +5,15 @@ import hashlib
 from datetime import datetime, timedelta
 import secrets
 import string
+import threading
+import weakref
+import time
+import random
+import functools
+import queue
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(BASE_DIR, "attendance.db")
@@ -13,20 +22,706 @@ DB_PATH = os.path.join(BASE_DIR, "attendance.db")
 def get_vn_time():
     return (datetime.utcnow() + timedelta(hours=7)).strftime("%Y-%m-%d %H:%M:%S")
 
+# === CHẾ ĐỘ ĐỒNG THỜI (WAL: người đọc không chặn người ghi) ===
+# Đặt ATTENDANCE_JOURNAL_MODE=DELETE để quay về rollback journal cũ.
+JOURNAL_MODE = os.environ.get("ATTENDANCE_JOURNAL_MODE", "WAL").upper()
+SYNCHRONOUS = os.environ.get("ATTENDANCE_SYNCHRONOUS", "NORMAL").upper()
+BUSY_TIMEOUT_MS = int(os.environ.get("ATTENDANCE_BUSY_TIMEOUT_MS", "5000"))
+WRITE_RETRIES = int(os.environ.get("ATTENDANCE_WRITE_RETRIES", "6"))
+
+class DatabaseBusyError(sqlite3.OperationalError):
+    """DB vẫn bị khóa sau khi đã thử lại; thông điệp dành cho người dùng."""
+
+def _is_busy_error(e):
+    msg = str(e).lower()
+    return "locked" in msg or "busy" in msg
+
+def retry_on_busy(fn):
+    """Thử lại hàm ghi khi gặp SQLITE_BUSY, backoff lũy thừa có jitter."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        for attempt in range(WRITE_RETRIES + 1):
+            try:
+                return fn(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                # Đang nằm trong giao dịch của hàm gọi ngoài thì không tự thử lại được
+                if not _is_busy_error(e) or _pool.in_checkout(): raise
+                if attempt == WRITE_RETRIES:
+                    raise DatabaseBusyError("Hệ thống đang bận, vui lòng thử lại sau giây lát.") from e
+                time.sleep(min(0.5, 0.01 * (2 ** attempt)) * random.uniform(0.5, 1.5))
+    return wrapper
+
+def _rollback_busy(conn, e):
+    """Cho hàm ghi tự bắt lỗi (trả False/thông điệp): hủy giao dịch dở; lỗi bận thì ném lại để retry_on_busy thử lại."""
+    conn.rollback()
+    if isinstance(e, sqlite3.OperationalError) and _is_busy_error(e): raise e
+
+# === QUẢN LÝ KẾT NỐI (MỖI LUỒNG GIỮ MỘT KẾT NỐI, DÙNG LẠI GIỮA CÁC LẦN GỌI) ===
+_local_commits = 0  # số lần commit của chính tiến trình này (xem ReferenceCache)
+_commits_lock = threading.Lock()  # nhiều luồng cùng commit: += không nguyên tử, mất lượt đếm thì cache giữ dữ liệu cũ
+
+class PooledConnection(sqlite3.Connection):
+    """Kết nối do pool quản lý (lớp con để WeakSet theo dõi được)."""
+    def commit(self):
+        global _local_commits
+        super().commit()
+        with _commits_lock: _local_commits += 1
+
+CONNECTION_FACTORY = PooledConnection  # profiler.install() thay bằng lớp con có đo thời gian
+
+class ConnectionPool:
+    """Mỗi luồng giữ một kết nối mở sẵn; PRAGMA chỉ chạy một lần lúc mở.
+
+    Dùng qua `with pool.connection() as conn:`. Khi thoát khối ngoài cùng mà
+    còn giao dịch chưa commit thì rollback (giống hành vi conn.close() cũ).
+    """
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._conns = weakref.WeakSet()
+        self._generation = 0
+        self._stats = {"opens": 0, "hits": 0, "closes": 0}
+
+    def _open(self):
+        if _schema_ready != DB_PATH: init_db()  # một lần mỗi file trong tiến trình, không stat mỗi lần mở
+        conn = sqlite3.connect(DB_PATH, factory=CONNECTION_FACTORY, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON;")
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS};")
+        conn.execute(f"PRAGMA journal_mode = {JOURNAL_MODE};")
+        conn.execute(f"PRAGMA synchronous = {SYNCHRONOUS};")
+        # Để trigger DELETE chạy cả khi có INSERT OR REPLACE (giữ bảng tổng hợp đúng)
+        conn.execute("PRAGMA recursive_triggers = ON;")
+        return conn
+
+    def in_checkout(self):
+        return getattr(self._local, "depth", 0) > 0
+
+    def _checkout(self):
+        local = self._local
+        conn = getattr(local, "conn", None)
+        if conn is not None and (local.path != DB_PATH or local.generation != self._generation
+                                 or (local.retired and local.depth == 0)):
+            self._discard(conn); conn = None
+        if conn is None:
+            conn = self._open()
+            local.conn, local.path, local.generation, local.depth, local.retired = conn, DB_PATH, self._generation, 0, False
+            with self._lock:
+                self._conns.add(conn); self._stats["opens"] += 1
+        else:
+            with self._lock: self._stats["hits"] += 1
+        return conn
+
+    def retire_current(self):
+        """Kết nối của luồng này mang trạng thái hỏng (vd. kho chưa DETACH được): lần mượn kế tiếp ngoài mọi khối with mở kết nối mới."""
+        self._local.retired = True
+
+    def _discard(self, conn):
+        self._local.conn = None
+        with self._lock:
+            if conn in self._conns:
+                self._conns.discard(conn); self._stats["closes"] += 1
+        try: conn.close()
+        except sqlite3.Error: pass
+
+    @contextmanager
+    def connection(self):
+        conn = self._checkout()
+        local = self._local
+        local.depth += 1
+        try:
+            yield conn
+        finally:
+            local.depth -= 1
+            if local.depth == 0 and conn.in_transaction: conn.rollback()
+
+    def close_all(self):
+        """Đóng mọi kết nối (trước khi xóa/khôi phục file DB, hoặc khi thoát)."""
+        with self._lock:
+            self._generation += 1
+            conns = list(self._conns); self._conns.clear()
+            self._stats["closes"] += len(conns)
+        for c in conns:
+            try: c.close()
+            except sqlite3.Error: pass
+        self._local.conn = None
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats); s["open_now"] = len(self._conns)
+        total = s["opens"] + s["hits"]
+        s["hit_rate"] = s["hits"] / total if total else 0.0
+        return s
+
+_pool = ConnectionPool()
+
 def get_connection():
-    if not os.path.exists(DB_PATH): init_db()
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA foreign_keys = ON;")
-    return conn
+    """Mượn kết nối của luồng hiện tại: `with get_connection() as conn:`"""
+    return _pool.connection()
 
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("PRAGMA foreign_keys = ON;")
-    
-    # 1. TẠO BẢNG
-    cur.execute("""CREATE TABLE IF NOT EXISTS users (
+def get_pool_stats(): return _pool.stats()
+def close_all_connections():
+    global _schema_ready
+    _pool.close_all()
+    _schema_ready = None  # file có thể bị xóa/thay sau đó: lần mở tới kiểm tra lại schema
+
+def set_db_path(path):
+    """Chuyển sang file DB khác (đóng hết kết nối cũ trong pool)."""
+    global DB_PATH
+    close_all_connections()
+    DB_PATH = path
+    _cache.invalidate()
+
+# === BỘ NHỚ ĐỆM DỮ LIỆU THAM CHIẾU (LRU + TTL) ===
+CACHE_SIZE = int(os.environ.get("ATTENDANCE_CACHE_SIZE", "512"))
+CACHE_TTL = float(os.environ.get("ATTENDANCE_CACHE_TTL", "60"))
+
+class ReferenceCache:
+    """Cache đọc-xuyên cho giáo viên/lớp/sinh viên: tối đa `maxsize` mục, mỗi mục sống `ttl` giây.
+
+    Bị xóa khi: hàm ghi liên quan gọi invalidate(); hoặc PRAGMA data_version đổi mà tiến trình
+    này không commit gì (tức tiến trình khác đã ghi DB). Nếu cả hai cùng ghi trong một khoảng
+    thì không phân biệt được — thay đổi từ ngoài khi đó chậm nhất `ttl` giây mới thấy.
+    Giá trị trả về dùng chung giữa các lần gọi: chỉ đọc, không sửa.
+    """
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL):
+        self.maxsize, self.ttl = maxsize, ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._epoch = 0
+        self._monitor = None  # kết nối riêng chỉ để đọc data_version
+        self._seen = (None, None, 0)  # (file DB, data_version, _local_commits) lần kiểm tra trước
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def invalidate(self):
+        with self._lock: self._clear()
+
+    def _clear(self):
+        self._data.clear(); self._epoch += 1; self._stats["invalidations"] += 1
+
+    def _check_external_writes(self):
+        if self._monitor is None or self._seen[0] != DB_PATH:
+            if not os.path.exists(DB_PATH): return  # để pool tự tạo schema, đừng tạo file rỗng
+            if self._monitor is not None: self._monitor.close()
+            self._monitor = sqlite3.connect(DB_PATH, check_same_thread=False)
+            self._seen = (DB_PATH, None, _local_commits)
+        version, commits = self._monitor.execute("PRAGMA data_version").fetchone()[0], _local_commits
+        _, seen_version, seen_commits = self._seen
+        if seen_version is not None and version != seen_version and commits == seen_commits: self._clear()
+        self._seen = (DB_PATH, version, commits)
+
+    def get(self, key, load):
+        now = time.monotonic()
+        with self._lock:
+            self._check_external_writes()
+            item = self._data.get(key)
+            if item is not None and item[0] > now:
+                self._data.move_to_end(key); self._stats["hits"] += 1
+                return item[1]
+            self._stats["misses"] += 1
+            epoch = self._epoch
+        value = load()
+        with self._lock:
+            if epoch == self._epoch:  # không lưu kết quả đọc trước một lần invalidate
+                self._data[key] = (now + self.ttl, value); self._data.move_to_end(key)
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False); self._stats["evictions"] += 1
+        return value
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats); s["size"] = len(self._data)
+        total = s["hits"] + s["misses"]
+        s["hit_rate"] = s["hits"] / total if total else 0.0
+        return s
+
+_cache = ReferenceCache()
+
+def cached(fn):
+    """Đọc qua _cache, khóa theo (tên hàm, tham số)."""
+    @functools.wraps(fn)
+    def wrapper(*args):
+        return _cache.get((fn.__name__,) + args, lambda: fn(*args))
+    wrapper.uncached = fn
+    return wrapper
+
+def get_cache_stats(): return _cache.stats()
+def invalidate_cache(): _cache.invalidate()
+
+# === BẢNG TỔNG HỢP ĐIỂM DANH (TRIGGER TỰ CẬP NHẬT) ===
+# attendance_daily_summary: mỗi (lớp-môn, ngày) -> số buổi ĐÃ ĐÓNG và số lượt theo trạng thái
+#   (chỉ tính buổi CLOSED, giống báo cáo toàn trường).
+# attendance_student_summary: mỗi (sinh viên, lớp-môn) -> số lượt theo trạng thái (mọi buổi).
+_STATUS_COUNTERS = (("present_count", "PRESENT"), ("absent_count", "ABSENT"),
+                    ("excused_count", "ABSENT_EXCUSED"), ("late_count", "LATE"))
+_SUMMARY_COUNTS = ", ".join(c for c, _ in _STATUS_COUNTERS)
+_ADD_COUNTS = ", ".join(f"{c} = {c} + excluded.{c}" for c, _ in _STATUS_COUNTERS)
+
+def _flags(alias):
+    return ", ".join(f"{alias}.status = '{s}'" for _, s in _STATUS_COUNTERS)
+
+def _sums(alias):
+    return ", ".join(f"COALESCE(SUM({alias}.status = '{s}'), 0)" for _, s in _STATUS_COUNTERS)
+
+def _sub_flags(alias):
+    return ", ".join(f"{c} = {c} - ({alias}.status = '{s}')" for c, s in _STATUS_COUNTERS)
+
+def _sub_sums(table, alias):
+    return ", ".join(f"{table}.{c} - COALESCE(SUM({alias}.status = '{s}'), 0)" for c, s in _STATUS_COUNTERS)
+
+def _attendance_add(alias):
+    return f"""
+    INSERT INTO attendance_student_summary (student_id, class_subject_id, {_SUMMARY_COUNTS})
+    SELECT {alias}.student_id, s.class_subject_id, {_flags(alias)}
+    FROM attendance_sessions s WHERE s.id = {alias}.session_id
+    ON CONFLICT (student_id, class_subject_id) DO UPDATE SET {_ADD_COUNTS};
+    INSERT INTO attendance_daily_summary (class_subject_id, date, session_count, {_SUMMARY_COUNTS})
+    SELECT s.class_subject_id, s.date, 0, {_flags(alias)}
+    FROM attendance_sessions s WHERE s.id = {alias}.session_id AND s.status = 'CLOSED'
+    ON CONFLICT (class_subject_id, date) DO UPDATE SET {_ADD_COUNTS};"""
+
+def _attendance_sub(alias):
+    return f"""
+    UPDATE attendance_student_summary SET {_sub_flags(alias)}
+    WHERE student_id = {alias}.student_id
+      AND class_subject_id = (SELECT class_subject_id FROM attendance_sessions WHERE id = {alias}.session_id);
+    UPDATE attendance_daily_summary SET {_sub_flags(alias)}
+    WHERE (class_subject_id, date) = (SELECT class_subject_id, date FROM attendance_sessions
+                                      WHERE id = {alias}.session_id AND status = 'CLOSED');"""
+
+def _session_daily_sub(alias):
+    return f"""
+    UPDATE attendance_daily_summary SET (session_count, {_SUMMARY_COUNTS}) = (
+        SELECT attendance_daily_summary.session_count - 1, {_sub_sums('attendance_daily_summary', 'a')}
+        FROM Attendance a WHERE a.session_id = {alias}.id)
+    WHERE class_subject_id = {alias}.class_subject_id AND date = {alias}.date AND {alias}.status = 'CLOSED';"""
+
+def _session_daily_add(alias):
+    return f"""
+    INSERT INTO attendance_daily_summary (class_subject_id, date, session_count, {_SUMMARY_COUNTS})
+    SELECT * FROM (SELECT {alias}.class_subject_id, {alias}.date, 1, {_sums('a')}
+                   FROM Attendance a WHERE a.session_id = {alias}.id)
+    WHERE {alias}.status = 'CLOSED'
+    ON CONFLICT (class_subject_id, date) DO UPDATE SET session_count = session_count + 1, {_ADD_COUNTS};"""
+
+def _session_student_sub(alias):
+    return f"""
+    UPDATE attendance_student_summary SET ({_SUMMARY_COUNTS}) = (
+        SELECT {_sub_sums('attendance_student_summary', 'a')}
+        FROM Attendance a WHERE a.session_id = {alias}.id AND a.student_id = attendance_student_summary.student_id)
+    WHERE class_subject_id = {alias}.class_subject_id
+      AND student_id IN (SELECT student_id FROM Attendance WHERE session_id = {alias}.id);"""
+
+# Bản hiện hành (migration 3 giữ bản chụp riêng _MIGRATION_3_SQL): đổi ở đây thì thêm migration tạo lại trigger
+SUMMARY_SCHEMA_SQL = f"""
+    CREATE TABLE IF NOT EXISTS attendance_daily_summary (
+        class_subject_id INTEGER NOT NULL,
+        date DATE NOT NULL,
+        session_count INTEGER NOT NULL DEFAULT 0,
+        present_count INTEGER NOT NULL DEFAULT 0,
+        absent_count INTEGER NOT NULL DEFAULT 0,
+        excused_count INTEGER NOT NULL DEFAULT 0,
+        late_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (class_subject_id, date)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS attendance_student_summary (
+        student_id INTEGER NOT NULL,
+        class_subject_id INTEGER NOT NULL,
+        present_count INTEGER NOT NULL DEFAULT 0,
+        absent_count INTEGER NOT NULL DEFAULT 0,
+        excused_count INTEGER NOT NULL DEFAULT 0,
+        late_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (student_id, class_subject_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_student_summary_cs ON attendance_student_summary(class_subject_id);
+
+    CREATE TRIGGER IF NOT EXISTS trg_attendance_summary_ins AFTER INSERT ON Attendance
+    BEGIN {_attendance_add('NEW')}
+    END;
+    -- migration 12 thay trigger này bằng bản có xét lại cảnh báo (ATTENDANCE_DELETE_TRIGGER_SQL)
+    CREATE TRIGGER IF NOT EXISTS trg_attendance_summary_del AFTER DELETE ON Attendance
+    BEGIN {_attendance_sub('OLD')}
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_attendance_summary_upd AFTER UPDATE OF status, session_id, student_id ON Attendance
+    BEGIN {_attendance_sub('OLD')} {_attendance_add('NEW')}
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_session_summary_ins AFTER INSERT ON attendance_sessions WHEN NEW.status = 'CLOSED'
+    BEGIN {_session_daily_add('NEW')}
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_session_summary_upd AFTER UPDATE OF status, date, class_subject_id ON attendance_sessions
+    WHEN OLD.status IS NOT NEW.status OR OLD.date IS NOT NEW.date OR OLD.class_subject_id IS NOT NEW.class_subject_id
+    BEGIN {_session_daily_sub('OLD')} {_session_daily_add('NEW')}
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_session_summary_move AFTER UPDATE OF class_subject_id ON attendance_sessions
+    WHEN OLD.class_subject_id IS NOT NEW.class_subject_id
+    BEGIN {_session_student_sub('OLD')}
+    INSERT INTO attendance_student_summary (student_id, class_subject_id, {_SUMMARY_COUNTS})
+    SELECT a.student_id, NEW.class_subject_id, {_sums('a')}
+    FROM Attendance a WHERE a.session_id = NEW.id GROUP BY a.student_id
+    ON CONFLICT (student_id, class_subject_id) DO UPDATE SET {_ADD_COUNTS};
+    END;
+    -- BEFORE DELETE: lúc cascade xóa Attendance thì buổi học đã biến mất nên trigger con không trừ nữa
+    CREATE TRIGGER IF NOT EXISTS trg_session_summary_del BEFORE DELETE ON attendance_sessions
+    BEGIN {_session_daily_sub('OLD')} {_session_student_sub('OLD')}
+    END;
+"""
+
+# Tổng hợp lại từ dữ liệu gốc (dùng cho rebuild và kiểm tra nhất quán).
+# Dạng mẫu {db}/{until} để chạy cả trên kho lưu trữ học kỳ đã ATTACH (xem union_archives).
+RAW_STUDENT_SUMMARY_TEMPLATE = f"""
+    SELECT a.student_id, s.class_subject_id, {_sums('a')}
+    FROM {{db}}.Attendance a JOIN {{db}}.attendance_sessions s ON s.id = a.session_id
+    WHERE 1 = 1 {{until}}
+    GROUP BY a.student_id, s.class_subject_id"""
+RAW_DAILY_SUMMARY_TEMPLATE = """
+    SELECT s.class_subject_id, s.date, COUNT(*), COALESCE(SUM(x.p), 0), COALESCE(SUM(x.a), 0),
+           COALESCE(SUM(x.e), 0), COALESCE(SUM(x.l), 0)
+    FROM {db}.attendance_sessions s
+    LEFT JOIN (SELECT a.session_id, SUM(a.status = 'PRESENT') AS p, SUM(a.status = 'ABSENT') AS a,
+                      SUM(a.status = 'ABSENT_EXCUSED') AS e, SUM(a.status = 'LATE') AS l
+               FROM {db}.Attendance a GROUP BY a.session_id) x ON x.session_id = s.id
+    WHERE s.status = 'CLOSED' {until}
+    GROUP BY s.class_subject_id, s.date"""
+RAW_STUDENT_SUMMARY_SQL = RAW_STUDENT_SUMMARY_TEMPLATE.format(db="main", until="")
+RAW_DAILY_SUMMARY_SQL = RAW_DAILY_SUMMARY_TEMPLATE.format(db="main", until="")
+SUMMARY_REBUILD_SQL = f"""
+    DELETE FROM attendance_daily_summary;
+    DELETE FROM attendance_student_summary;
+    INSERT INTO attendance_student_summary (student_id, class_subject_id, {_SUMMARY_COUNTS}) {RAW_STUDENT_SUMMARY_SQL};
+    INSERT INTO attendance_daily_summary (class_subject_id, date, session_count, {_SUMMARY_COUNTS}) {RAW_DAILY_SUMMARY_SQL};
+"""
+
+# === CẢNH BÁO VẮNG THEO NGƯỠNG (TRIGGER TRÊN BẢNG TỔNG HỢP) ===
+# attendance_student_summary đã là bộ đếm chạy theo (sinh viên, lớp-môn), cập nhật trong cùng giao dịch
+# với mỗi lần ghi Attendance. Trigger trên bảng đó so bộ đếm mới với ngưỡng và ghi/đóng cảnh báo:
+# mỗi lần ghi chỉ vài lần tra khóa chính, không tổng hợp lại Attendance dù học kỳ dài bao nhiêu.
+#   WARN : số buổi vắng (kể cả có phép) đã chạm warn_ratio x hạn mức
+#   LIMIT: vượt hạn mức absence_limit x số buổi (tối thiểu term_sessions buổi dự kiến của học kỳ)
+# Ngưỡng đọc từ app_settings qua view attendance_alert_limits; đổi ngưỡng thì gọi recheck_attendance_alerts().
+ALERT_DEFAULTS = {"absence_limit": 0.20, "absence_warn_ratio": 0.75, "term_sessions": 15}
+ALERT_LEVELS = ("WARN", "LIMIT")
+_VN_NOW_SQL = "strftime('%Y-%m-%d %H:%M:%S', 'now', '+7 hours')"  # cùng định dạng với get_vn_time()
+
+def _absences(alias): return f"({alias}.absent_count + {alias}.excused_count)"
+def _total(alias): return f"({alias}.present_count + {alias}.absent_count + {alias}.excused_count + {alias}.late_count)"
+def _term(alias): return f"MAX(l.term_sessions, {_total(alias)})"
+
+def _crossed(alias, level):
+    # level là cột/biểu thức SQL ('WARN' | 'LIMIT'): một câu lệnh xử lý cả hai mức
+    return f"""CASE {level} WHEN 'LIMIT' THEN {_absences(alias)} > l.absence_limit * {_term(alias)}
+        ELSE {_absences(alias)} > 0 AND {_absences(alias)} >= l.warn_ratio * l.absence_limit * {_term(alias)} END"""
+
+_ALERT_LEVELS_SQL = " UNION ALL ".join(f"SELECT '{lv}' AS level" for lv in ALERT_LEVELS)
+
+def _alert_raise(alias, source):
+    # Chỉ ghi khi chuyển trạng thái (mới vượt ngưỡng hoặc mở lại cảnh báo đã đóng), không ghi ở mỗi buổi vắng thêm:
+    # absences/sessions là số liệu lúc vượt ngưỡng, số hiện tại đọc từ attendance_student_summary
+    return f"""
+    INSERT INTO attendance_alerts (student_id, class_subject_id, level, absences, sessions, raised_at)
+    SELECT {alias}.student_id, {alias}.class_subject_id, lv.level, {_absences(alias)}, {_term(alias)}, {_VN_NOW_SQL}
+    FROM {source}, ({_ALERT_LEVELS_SQL}) lv WHERE {_crossed(alias, "lv.level")}
+    ON CONFLICT (student_id, class_subject_id, level) DO UPDATE SET
+        absences = excluded.absences, sessions = excluded.sessions, raised_at = excluded.raised_at, resolved_at = NULL
+    WHERE resolved_at IS NOT NULL;"""
+
+def _alert_resolve(scope, alias, source, match):
+    return f"""
+    UPDATE attendance_alerts SET resolved_at = {_VN_NOW_SQL}
+    WHERE {scope} AND resolved_at IS NULL
+      AND NOT EXISTS (SELECT 1 FROM {source} WHERE {match} AND {_crossed(alias, "attendance_alerts.level")});"""
+
+_ALERT_SCOPE_NEW = "student_id = NEW.student_id AND class_subject_id = NEW.class_subject_id"
+# Bỏ qua cặp chưa vắng buổi nào và không có cảnh báo mở (phần lớn lượt điểm danh có mặt)
+_ALERT_WHEN_NEW = (f"({_absences('NEW')} > 0 OR EXISTS (SELECT 1 FROM attendance_alerts "
+                   f"WHERE {_ALERT_SCOPE_NEW} AND resolved_at IS NULL))")
+_ALERT_CHECK_NEW = (_alert_raise("NEW", "attendance_alert_limits l")
+                    + _alert_resolve(_ALERT_SCOPE_NEW, "NEW", "attendance_alert_limits l", "1"))
+
+_ALERT_SETTING_SQL = "COALESCE((SELECT CAST(value AS {1}) FROM app_settings WHERE key = '{0}'), {2})"
+# Bản hiện hành (migration 9 giữ bản chụp riêng _MIGRATION_9_SQL): đổi ở đây thì thêm migration tạo lại trigger
+ALERT_SCHEMA_SQL = f"""
+    CREATE TABLE IF NOT EXISTS attendance_alerts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        student_id INTEGER NOT NULL,
+        class_subject_id INTEGER NOT NULL,
+        level TEXT NOT NULL CHECK (level IN ('WARN','LIMIT')),
+        absences INTEGER NOT NULL,
+        sessions INTEGER NOT NULL,
+        raised_at DATETIME NOT NULL,
+        resolved_at DATETIME,
+        UNIQUE (student_id, class_subject_id, level),
+        FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE,
+        FOREIGN KEY (class_subject_id) REFERENCES class_subjects(id) ON DELETE CASCADE
+    );
+    CREATE INDEX IF NOT EXISTS idx_alerts_open_cs ON attendance_alerts(class_subject_id) WHERE resolved_at IS NULL;
+    CREATE VIEW IF NOT EXISTS attendance_alert_limits AS SELECT
+        {_ALERT_SETTING_SQL.format("absence_limit", "REAL", ALERT_DEFAULTS["absence_limit"])} AS absence_limit,
+        {_ALERT_SETTING_SQL.format("absence_warn_ratio", "REAL", ALERT_DEFAULTS["absence_warn_ratio"])} AS warn_ratio,
+        {_ALERT_SETTING_SQL.format("term_sessions", "INTEGER", ALERT_DEFAULTS["term_sessions"])} AS term_sessions;
+
+    CREATE TRIGGER IF NOT EXISTS trg_alert_summary_ins AFTER INSERT ON attendance_student_summary WHEN {_ALERT_WHEN_NEW}
+    BEGIN {_ALERT_CHECK_NEW}
+    END;
+    -- Sửa một bản ghi Attendance = bước trừ rồi bước cộng: chỉ xét ở trạng thái cuối (tổng số buổi không giảm),
+    -- nếu không cảnh báo sẽ bị đóng rồi mở lại với mốc mới. Tổng chỉ giảm thật khi xóa lớp/người dùng,
+    -- lúc đó cảnh báo bị xóa theo (ON DELETE CASCADE).
+    CREATE TRIGGER IF NOT EXISTS trg_alert_summary_upd AFTER UPDATE OF {_SUMMARY_COUNTS} ON attendance_student_summary
+    WHEN {_total('NEW')} >= {_total('OLD')} AND {_ALERT_WHEN_NEW}
+    BEGIN {_ALERT_CHECK_NEW}
+    END;
+"""
+# Xóa hẳn một bản ghi Attendance (khác bước trừ của UPDATE): tổng giảm thật nên xét lại ngưỡng ngay trong trigger
+# xóa, sau bước trừ. Cascade từ xóa buổi (archive.py) hay xóa sinh viên thì buổi/sinh viên đã biến mất: phạm vi
+# rỗng, cảnh báo giữ nguyên (hoặc xóa theo sinh viên).
+_ALERT_SCOPE_OLD = ("student_id = OLD.student_id AND class_subject_id = "
+                    "(SELECT class_subject_id FROM attendance_sessions WHERE id = OLD.session_id) "
+                    "AND EXISTS (SELECT 1 FROM students WHERE id = OLD.student_id)")
+_ALERT_SOURCE_OLD = f"(SELECT * FROM attendance_student_summary WHERE {_ALERT_SCOPE_OLD}) ss, attendance_alert_limits l"
+ATTENDANCE_DELETE_TRIGGER_SQL = f"""
+    DROP TRIGGER IF EXISTS trg_attendance_summary_del;
+    CREATE TRIGGER trg_attendance_summary_del AFTER DELETE ON Attendance
+    BEGIN {_attendance_sub('OLD')}{_alert_raise('ss', _ALERT_SOURCE_OLD)}{_alert_resolve(_ALERT_SCOPE_OLD, 'ss', _ALERT_SOURCE_OLD, '1')}
+    END;
+"""
+# Đối chiếu lại toàn bộ theo một lượt (sau khi đổi ngưỡng, nạp dữ liệu hàng loạt hoặc rebuild bảng tổng hợp)
+ALERT_RECHECK_SQL = (_alert_raise("ss", "attendance_student_summary ss, attendance_alert_limits l")
+    + _alert_resolve("1", "ss", "attendance_student_summary ss, attendance_alert_limits l",
+                     "ss.student_id = attendance_alerts.student_id AND ss.class_subject_id = attendance_alerts.class_subject_id"))
+
+# === MIGRATION THEO PRAGMA user_version ===
+# Mỗi phần tử: (phiên bản, mô tả, script SQL). Chỉ THÊM vào cuối danh sách,
+# không sửa migration đã phát hành; DB cũ sẽ được nâng cấp tại chỗ.
+# --- VĂN BẢN CÁC MIGRATION ĐÃ PHÁT HÀNH (KHÔNG SỬA) ---
+# DB nào đã chạy một migration thì mang đúng văn bản đó; SUMMARY_*_SQL / ALERT_*_SQL ở trên vẫn được sửa theo
+# code mới (rebuild, archive...), nên migration 3, 9 và 12 là bản chụp lúc phát hành thay vì ghép từ các hằng đó.
+# Đổi bảng/trigger thì thêm migration mới.
+_MIGRATION_3_SQL = """
+    CREATE TABLE IF NOT EXISTS attendance_daily_summary (
+        class_subject_id INTEGER NOT NULL,
+        date DATE NOT NULL,
+        session_count INTEGER NOT NULL DEFAULT 0,
+        present_count INTEGER NOT NULL DEFAULT 0,
+        absent_count INTEGER NOT NULL DEFAULT 0,
+        excused_count INTEGER NOT NULL DEFAULT 0,
+        late_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (class_subject_id, date)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS attendance_student_summary (
+        student_id INTEGER NOT NULL,
+        class_subject_id INTEGER NOT NULL,
+        present_count INTEGER NOT NULL DEFAULT 0,
+        absent_count INTEGER NOT NULL DEFAULT 0,
+        excused_count INTEGER NOT NULL DEFAULT 0,
+        late_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (student_id, class_subject_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_student_summary_cs ON attendance_student_summary(class_subject_id);
+
+    CREATE TRIGGER IF NOT EXISTS trg_attendance_summary_ins AFTER INSERT ON Attendance
+    BEGIN 
+    INSERT INTO attendance_student_summary (student_id, class_subject_id, present_count, absent_count, excused_count, late_count)
+    SELECT NEW.student_id, s.class_subject_id, NEW.status = 'PRESENT', NEW.status = 'ABSENT', NEW.status = 'ABSENT_EXCUSED', NEW.status = 'LATE'
+    FROM attendance_sessions s WHERE s.id = NEW.session_id
+    ON CONFLICT (student_id, class_subject_id) DO UPDATE SET present_count = present_count + excluded.present_count, absent_count = absent_count + excluded.absent_count, excused_count = excused_count + excluded.excused_count, late_count = late_count + excluded.late_count;
+    INSERT INTO attendance_daily_summary (class_subject_id, date, session_count, present_count, absent_count, excused_count, late_count)
+    SELECT s.class_subject_id, s.date, 0, NEW.status = 'PRESENT', NEW.status = 'ABSENT', NEW.status = 'ABSENT_EXCUSED', NEW.status = 'LATE'
+    FROM attendance_sessions s WHERE s.id = NEW.session_id AND s.status = 'CLOSED'
+    ON CONFLICT (class_subject_id, date) DO UPDATE SET present_count = present_count + excluded.present_count, absent_count = absent_count + excluded.absent_count, excused_count = excused_count + excluded.excused_count, late_count = late_count + excluded.late_count;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_attendance_summary_del AFTER DELETE ON Attendance
+    BEGIN 
+    UPDATE attendance_student_summary SET present_count = present_count - (OLD.status = 'PRESENT'), absent_count = absent_count - (OLD.status = 'ABSENT'), excused_count = excused_count - (OLD.status = 'ABSENT_EXCUSED'), late_count = late_count - (OLD.status = 'LATE')
+    WHERE student_id = OLD.student_id
+      AND class_subject_id = (SELECT class_subject_id FROM attendance_sessions WHERE id = OLD.session_id);
+    UPDATE attendance_daily_summary SET present_count = present_count - (OLD.status = 'PRESENT'), absent_count = absent_count - (OLD.status = 'ABSENT'), excused_count = excused_count - (OLD.status = 'ABSENT_EXCUSED'), late_count = late_count - (OLD.status = 'LATE')
+    WHERE (class_subject_id, date) = (SELECT class_subject_id, date FROM attendance_sessions
+                                      WHERE id = OLD.session_id AND status = 'CLOSED');
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_attendance_summary_upd AFTER UPDATE OF status, session_id, student_id ON Attendance
+    BEGIN 
+    UPDATE attendance_student_summary SET present_count = present_count - (OLD.status = 'PRESENT'), absent_count = absent_count - (OLD.status = 'ABSENT'), excused_count = excused_count - (OLD.status = 'ABSENT_EXCUSED'), late_count = late_count - (OLD.status = 'LATE')
+    WHERE student_id = OLD.student_id
+      AND class_subject_id = (SELECT class_subject_id FROM attendance_sessions WHERE id = OLD.session_id);
+    UPDATE attendance_daily_summary SET present_count = present_count - (OLD.status = 'PRESENT'), absent_count = absent_count - (OLD.status = 'ABSENT'), excused_count = excused_count - (OLD.status = 'ABSENT_EXCUSED'), late_count = late_count - (OLD.status = 'LATE')
+    WHERE (class_subject_id, date) = (SELECT class_subject_id, date FROM attendance_sessions
+                                      WHERE id = OLD.session_id AND status = 'CLOSED'); 
+    INSERT INTO attendance_student_summary (student_id, class_subject_id, present_count, absent_count, excused_count, late_count)
+    SELECT NEW.student_id, s.class_subject_id, NEW.status = 'PRESENT', NEW.status = 'ABSENT', NEW.status = 'ABSENT_EXCUSED', NEW.status = 'LATE'
+    FROM attendance_sessions s WHERE s.id = NEW.session_id
+    ON CONFLICT (student_id, class_subject_id) DO UPDATE SET present_count = present_count + excluded.present_count, absent_count = absent_count + excluded.absent_count, excused_count = excused_count + excluded.excused_count, late_count = late_count + excluded.late_count;
+    INSERT INTO attendance_daily_summary (class_subject_id, date, session_count, present_count, absent_count, excused_count, late_count)
+    SELECT s.class_subject_id, s.date, 0, NEW.status = 'PRESENT', NEW.status = 'ABSENT', NEW.status = 'ABSENT_EXCUSED', NEW.status = 'LATE'
+    FROM attendance_sessions s WHERE s.id = NEW.session_id AND s.status = 'CLOSED'
+    ON CONFLICT (class_subject_id, date) DO UPDATE SET present_count = present_count + excluded.present_count, absent_count = absent_count + excluded.absent_count, excused_count = excused_count + excluded.excused_count, late_count = late_count + excluded.late_count;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_session_summary_ins AFTER INSERT ON attendance_sessions WHEN NEW.status = 'CLOSED'
+    BEGIN 
+    INSERT INTO attendance_daily_summary (class_subject_id, date, session_count, present_count, absent_count, excused_count, late_count)
+    SELECT * FROM (SELECT NEW.class_subject_id, NEW.date, 1, COALESCE(SUM(a.status = 'PRESENT'), 0), COALESCE(SUM(a.status = 'ABSENT'), 0), COALESCE(SUM(a.status = 'ABSENT_EXCUSED'), 0), COALESCE(SUM(a.status = 'LATE'), 0)
+                   FROM Attendance a WHERE a.session_id = NEW.id)
+    WHERE NEW.status = 'CLOSED'
+    ON CONFLICT (class_subject_id, date) DO UPDATE SET session_count = session_count + 1, present_count = present_count + excluded.present_count, absent_count = absent_count + excluded.absent_count, excused_count = excused_count + excluded.excused_count, late_count = late_count + excluded.late_count;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_session_summary_upd AFTER UPDATE OF status, date, class_subject_id ON attendance_sessions
+    WHEN OLD.status IS NOT NEW.status OR OLD.date IS NOT NEW.date OR OLD.class_subject_id IS NOT NEW.class_subject_id
+    BEGIN 
+    UPDATE attendance_daily_summary SET (session_count, present_count, absent_count, excused_count, late_count) = (
+        SELECT attendance_daily_summary.session_count - 1, attendance_daily_summary.present_count - COALESCE(SUM(a.status = 'PRESENT'), 0), attendance_daily_summary.absent_count - COALESCE(SUM(a.status = 'ABSENT'), 0), attendance_daily_summary.excused_count - COALESCE(SUM(a.status = 'ABSENT_EXCUSED'), 0), attendance_daily_summary.late_count - COALESCE(SUM(a.status = 'LATE'), 0)
+        FROM Attendance a WHERE a.session_id = OLD.id)
+    WHERE class_subject_id = OLD.class_subject_id AND date = OLD.date AND OLD.status = 'CLOSED'; 
+    INSERT INTO attendance_daily_summary (class_subject_id, date, session_count, present_count, absent_count, excused_count, late_count)
+    SELECT * FROM (SELECT NEW.class_subject_id, NEW.date, 1, COALESCE(SUM(a.status = 'PRESENT'), 0), COALESCE(SUM(a.status = 'ABSENT'), 0), COALESCE(SUM(a.status = 'ABSENT_EXCUSED'), 0), COALESCE(SUM(a.status = 'LATE'), 0)
+                   FROM Attendance a WHERE a.session_id = NEW.id)
+    WHERE NEW.status = 'CLOSED'
+    ON CONFLICT (class_subject_id, date) DO UPDATE SET session_count = session_count + 1, present_count = present_count + excluded.present_count, absent_count = absent_count + excluded.absent_count, excused_count = excused_count + excluded.excused_count, late_count = late_count + excluded.late_count;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_session_summary_move AFTER UPDATE OF class_subject_id ON attendance_sessions
+    WHEN OLD.class_subject_id IS NOT NEW.class_subject_id
+    BEGIN 
+    UPDATE attendance_student_summary SET (present_count, absent_count, excused_count, late_count) = (
+        SELECT attendance_student_summary.present_count - COALESCE(SUM(a.status = 'PRESENT'), 0), attendance_student_summary.absent_count - COALESCE(SUM(a.status = 'ABSENT'), 0), attendance_student_summary.excused_count - COALESCE(SUM(a.status = 'ABSENT_EXCUSED'), 0), attendance_student_summary.late_count - COALESCE(SUM(a.status = 'LATE'), 0)
+        FROM Attendance a WHERE a.session_id = OLD.id AND a.student_id = attendance_student_summary.student_id)
+    WHERE class_subject_id = OLD.class_subject_id
+      AND student_id IN (SELECT student_id FROM Attendance WHERE session_id = OLD.id);
+    INSERT INTO attendance_student_summary (student_id, class_subject_id, present_count, absent_count, excused_count, late_count)
+    SELECT a.student_id, NEW.class_subject_id, COALESCE(SUM(a.status = 'PRESENT'), 0), COALESCE(SUM(a.status = 'ABSENT'), 0), COALESCE(SUM(a.status = 'ABSENT_EXCUSED'), 0), COALESCE(SUM(a.status = 'LATE'), 0)
+    FROM Attendance a WHERE a.session_id = NEW.id GROUP BY a.student_id
+    ON CONFLICT (student_id, class_subject_id) DO UPDATE SET present_count = present_count + excluded.present_count, absent_count = absent_count + excluded.absent_count, excused_count = excused_count + excluded.excused_count, late_count = late_count + excluded.late_count;
+    END;
+    -- BEFORE DELETE: lúc cascade xóa Attendance thì buổi học đã biến mất nên trigger con không trừ nữa
+    CREATE TRIGGER IF NOT EXISTS trg_session_summary_del BEFORE DELETE ON attendance_sessions
+    BEGIN 
+    UPDATE attendance_daily_summary SET (session_count, present_count, absent_count, excused_count, late_count) = (
+        SELECT attendance_daily_summary.session_count - 1, attendance_daily_summary.present_count - COALESCE(SUM(a.status = 'PRESENT'), 0), attendance_daily_summary.absent_count - COALESCE(SUM(a.status = 'ABSENT'), 0), attendance_daily_summary.excused_count - COALESCE(SUM(a.status = 'ABSENT_EXCUSED'), 0), attendance_daily_summary.late_count - COALESCE(SUM(a.status = 'LATE'), 0)
+        FROM Attendance a WHERE a.session_id = OLD.id)
+    WHERE class_subject_id = OLD.class_subject_id AND date = OLD.date AND OLD.status = 'CLOSED'; 
+    UPDATE attendance_student_summary SET (present_count, absent_count, excused_count, late_count) = (
+        SELECT attendance_student_summary.present_count - COALESCE(SUM(a.status = 'PRESENT'), 0), attendance_student_summary.absent_count - COALESCE(SUM(a.status = 'ABSENT'), 0), attendance_student_summary.excused_count - COALESCE(SUM(a.status = 'ABSENT_EXCUSED'), 0), attendance_student_summary.late_count - COALESCE(SUM(a.status = 'LATE'), 0)
+        FROM Attendance a WHERE a.session_id = OLD.id AND a.student_id = attendance_student_summary.student_id)
+    WHERE class_subject_id = OLD.class_subject_id
+      AND student_id IN (SELECT student_id FROM Attendance WHERE session_id = OLD.id);
+    END;
+
+    DELETE FROM attendance_daily_summary;
+    DELETE FROM attendance_student_summary;
+    INSERT INTO attendance_student_summary (student_id, class_subject_id, present_count, absent_count, excused_count, late_count) 
+    SELECT a.student_id, s.class_subject_id, COALESCE(SUM(a.status = 'PRESENT'), 0), COALESCE(SUM(a.status = 'ABSENT'), 0), COALESCE(SUM(a.status = 'ABSENT_EXCUSED'), 0), COALESCE(SUM(a.status = 'LATE'), 0)
+    FROM Attendance a JOIN attendance_sessions s ON s.id = a.session_id
+    GROUP BY a.student_id, s.class_subject_id;
+    INSERT INTO attendance_daily_summary (class_subject_id, date, session_count, present_count, absent_count, excused_count, late_count) 
+    SELECT s.class_subject_id, s.date, COUNT(*), COALESCE(SUM(x.p), 0), COALESCE(SUM(x.a), 0),
+           COALESCE(SUM(x.e), 0), COALESCE(SUM(x.l), 0)
+    FROM attendance_sessions s
+    LEFT JOIN (SELECT a.session_id, SUM(a.status = 'PRESENT') AS p, SUM(a.status = 'ABSENT') AS a,
+                      SUM(a.status = 'ABSENT_EXCUSED') AS e, SUM(a.status = 'LATE') AS l
+               FROM Attendance a GROUP BY a.session_id) x ON x.session_id = s.id
+    WHERE s.status = 'CLOSED'
+    GROUP BY s.class_subject_id, s.date;
+"""
+
+_MIGRATION_9_SQL = """
+    CREATE TABLE IF NOT EXISTS attendance_alerts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        student_id INTEGER NOT NULL,
+        class_subject_id INTEGER NOT NULL,
+        level TEXT NOT NULL CHECK (level IN ('WARN','LIMIT')),
+        absences INTEGER NOT NULL,
+        sessions INTEGER NOT NULL,
+        raised_at DATETIME NOT NULL,
+        resolved_at DATETIME,
+        UNIQUE (student_id, class_subject_id, level),
+        FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE,
+        FOREIGN KEY (class_subject_id) REFERENCES class_subjects(id) ON DELETE CASCADE
+    );
+    CREATE INDEX IF NOT EXISTS idx_alerts_open_cs ON attendance_alerts(class_subject_id) WHERE resolved_at IS NULL;
+    CREATE VIEW IF NOT EXISTS attendance_alert_limits AS SELECT
+        COALESCE((SELECT CAST(value AS REAL) FROM app_settings WHERE key = 'absence_limit'), 0.2) AS absence_limit,
+        COALESCE((SELECT CAST(value AS REAL) FROM app_settings WHERE key = 'absence_warn_ratio'), 0.75) AS warn_ratio,
+        COALESCE((SELECT CAST(value AS INTEGER) FROM app_settings WHERE key = 'term_sessions'), 15) AS term_sessions;
+
+    CREATE TRIGGER IF NOT EXISTS trg_alert_summary_ins AFTER INSERT ON attendance_student_summary WHEN ((NEW.absent_count + NEW.excused_count) > 0 OR EXISTS (SELECT 1 FROM attendance_alerts WHERE student_id = NEW.student_id AND class_subject_id = NEW.class_subject_id AND resolved_at IS NULL))
+    BEGIN 
+    INSERT INTO attendance_alerts (student_id, class_subject_id, level, absences, sessions, raised_at)
+    SELECT NEW.student_id, NEW.class_subject_id, lv.level, (NEW.absent_count + NEW.excused_count), MAX(l.term_sessions, (NEW.present_count + NEW.absent_count + NEW.excused_count + NEW.late_count)), strftime('%Y-%m-%d %H:%M:%S', 'now', '+7 hours')
+    FROM attendance_alert_limits l, (SELECT 'WARN' AS level UNION ALL SELECT 'LIMIT' AS level) lv WHERE CASE lv.level WHEN 'LIMIT' THEN (NEW.absent_count + NEW.excused_count) > l.absence_limit * MAX(l.term_sessions, (NEW.present_count + NEW.absent_count + NEW.excused_count + NEW.late_count))
+        ELSE (NEW.absent_count + NEW.excused_count) > 0 AND (NEW.absent_count + NEW.excused_count) >= l.warn_ratio * l.absence_limit * MAX(l.term_sessions, (NEW.present_count + NEW.absent_count + NEW.excused_count + NEW.late_count)) END
+    ON CONFLICT (student_id, class_subject_id, level) DO UPDATE SET
+        absences = excluded.absences, sessions = excluded.sessions, raised_at = excluded.raised_at, resolved_at = NULL
+    WHERE resolved_at IS NOT NULL;
+    UPDATE attendance_alerts SET resolved_at = strftime('%Y-%m-%d %H:%M:%S', 'now', '+7 hours')
+    WHERE student_id = NEW.student_id AND class_subject_id = NEW.class_subject_id AND resolved_at IS NULL
+      AND NOT EXISTS (SELECT 1 FROM attendance_alert_limits l WHERE 1 AND CASE attendance_alerts.level WHEN 'LIMIT' THEN (NEW.absent_count + NEW.excused_count) > l.absence_limit * MAX(l.term_sessions, (NEW.present_count + NEW.absent_count + NEW.excused_count + NEW.late_count))
+        ELSE (NEW.absent_count + NEW.excused_count) > 0 AND (NEW.absent_count + NEW.excused_count) >= l.warn_ratio * l.absence_limit * MAX(l.term_sessions, (NEW.present_count + NEW.absent_count + NEW.excused_count + NEW.late_count)) END);
+    END;
+    -- Sửa một bản ghi Attendance = bước trừ rồi bước cộng: chỉ xét ở trạng thái cuối (tổng số buổi không giảm),
+    -- nếu không cảnh báo sẽ bị đóng rồi mở lại với mốc mới. Tổng chỉ giảm thật khi xóa lớp/người dùng,
+    -- lúc đó cảnh báo bị xóa theo (ON DELETE CASCADE).
+    CREATE TRIGGER IF NOT EXISTS trg_alert_summary_upd AFTER UPDATE OF present_count, absent_count, excused_count, late_count ON attendance_student_summary
+    WHEN (NEW.present_count + NEW.absent_count + NEW.excused_count + NEW.late_count) >= (OLD.present_count + OLD.absent_count + OLD.excused_count + OLD.late_count) AND ((NEW.absent_count + NEW.excused_count) > 0 OR EXISTS (SELECT 1 FROM attendance_alerts WHERE student_id = NEW.student_id AND class_subject_id = NEW.class_subject_id AND resolved_at IS NULL))
+    BEGIN 
+    INSERT INTO attendance_alerts (student_id, class_subject_id, level, absences, sessions, raised_at)
+    SELECT NEW.student_id, NEW.class_subject_id, lv.level, (NEW.absent_count + NEW.excused_count), MAX(l.term_sessions, (NEW.present_count + NEW.absent_count + NEW.excused_count + NEW.late_count)), strftime('%Y-%m-%d %H:%M:%S', 'now', '+7 hours')
+    FROM attendance_alert_limits l, (SELECT 'WARN' AS level UNION ALL SELECT 'LIMIT' AS level) lv WHERE CASE lv.level WHEN 'LIMIT' THEN (NEW.absent_count + NEW.excused_count) > l.absence_limit * MAX(l.term_sessions, (NEW.present_count + NEW.absent_count + NEW.excused_count + NEW.late_count))
+        ELSE (NEW.absent_count + NEW.excused_count) > 0 AND (NEW.absent_count + NEW.excused_count) >= l.warn_ratio * l.absence_limit * MAX(l.term_sessions, (NEW.present_count + NEW.absent_count + NEW.excused_count + NEW.late_count)) END
+    ON CONFLICT (student_id, class_subject_id, level) DO UPDATE SET
+        absences = excluded.absences, sessions = excluded.sessions, raised_at = excluded.raised_at, resolved_at = NULL
+    WHERE resolved_at IS NOT NULL;
+    UPDATE attendance_alerts SET resolved_at = strftime('%Y-%m-%d %H:%M:%S', 'now', '+7 hours')
+    WHERE student_id = NEW.student_id AND class_subject_id = NEW.class_subject_id AND resolved_at IS NULL
+      AND NOT EXISTS (SELECT 1 FROM attendance_alert_limits l WHERE 1 AND CASE attendance_alerts.level WHEN 'LIMIT' THEN (NEW.absent_count + NEW.excused_count) > l.absence_limit * MAX(l.term_sessions, (NEW.present_count + NEW.absent_count + NEW.excused_count + NEW.late_count))
+        ELSE (NEW.absent_count + NEW.excused_count) > 0 AND (NEW.absent_count + NEW.excused_count) >= l.warn_ratio * l.absence_limit * MAX(l.term_sessions, (NEW.present_count + NEW.absent_count + NEW.excused_count + NEW.late_count)) END);
+    END;
+
+    INSERT INTO attendance_alerts (student_id, class_subject_id, level, absences, sessions, raised_at)
+    SELECT ss.student_id, ss.class_subject_id, lv.level, (ss.absent_count + ss.excused_count), MAX(l.term_sessions, (ss.present_count + ss.absent_count + ss.excused_count + ss.late_count)), strftime('%Y-%m-%d %H:%M:%S', 'now', '+7 hours')
+    FROM attendance_student_summary ss, attendance_alert_limits l, (SELECT 'WARN' AS level UNION ALL SELECT 'LIMIT' AS level) lv WHERE CASE lv.level WHEN 'LIMIT' THEN (ss.absent_count + ss.excused_count) > l.absence_limit * MAX(l.term_sessions, (ss.present_count + ss.absent_count + ss.excused_count + ss.late_count))
+        ELSE (ss.absent_count + ss.excused_count) > 0 AND (ss.absent_count + ss.excused_count) >= l.warn_ratio * l.absence_limit * MAX(l.term_sessions, (ss.present_count + ss.absent_count + ss.excused_count + ss.late_count)) END
+    ON CONFLICT (student_id, class_subject_id, level) DO UPDATE SET
+        absences = excluded.absences, sessions = excluded.sessions, raised_at = excluded.raised_at, resolved_at = NULL
+    WHERE resolved_at IS NOT NULL;
+    UPDATE attendance_alerts SET resolved_at = strftime('%Y-%m-%d %H:%M:%S', 'now', '+7 hours')
+    WHERE 1 AND resolved_at IS NULL
+      AND NOT EXISTS (SELECT 1 FROM attendance_student_summary ss, attendance_alert_limits l WHERE ss.student_id = attendance_alerts.student_id AND ss.class_subject_id = attendance_alerts.class_subject_id AND CASE attendance_alerts.level WHEN 'LIMIT' THEN (ss.absent_count + ss.excused_count) > l.absence_limit * MAX(l.term_sessions, (ss.present_count + ss.absent_count + ss.excused_count + ss.late_count))
+        ELSE (ss.absent_count + ss.excused_count) > 0 AND (ss.absent_count + ss.excused_count) >= l.warn_ratio * l.absence_limit * MAX(l.term_sessions, (ss.present_count + ss.absent_count + ss.excused_count + ss.late_count)) END);"""
+
+_MIGRATION_12_SQL = """
+    DROP TRIGGER IF EXISTS trg_attendance_summary_del;
+    CREATE TRIGGER trg_attendance_summary_del AFTER DELETE ON Attendance
+    BEGIN 
+    UPDATE attendance_student_summary SET present_count = present_count - (OLD.status = 'PRESENT'), absent_count = absent_count - (OLD.status = 'ABSENT'), excused_count = excused_count - (OLD.status = 'ABSENT_EXCUSED'), late_count = late_count - (OLD.status = 'LATE')
+    WHERE student_id = OLD.student_id
+      AND class_subject_id = (SELECT class_subject_id FROM attendance_sessions WHERE id = OLD.session_id);
+    UPDATE attendance_daily_summary SET present_count = present_count - (OLD.status = 'PRESENT'), absent_count = absent_count - (OLD.status = 'ABSENT'), excused_count = excused_count - (OLD.status = 'ABSENT_EXCUSED'), late_count = late_count - (OLD.status = 'LATE')
+    WHERE (class_subject_id, date) = (SELECT class_subject_id, date FROM attendance_sessions
+                                      WHERE id = OLD.session_id AND status = 'CLOSED');
+    INSERT INTO attendance_alerts (student_id, class_subject_id, level, absences, sessions, raised_at)
+    SELECT ss.student_id, ss.class_subject_id, lv.level, (ss.absent_count + ss.excused_count), MAX(l.term_sessions, (ss.present_count + ss.absent_count + ss.excused_count + ss.late_count)), strftime('%Y-%m-%d %H:%M:%S', 'now', '+7 hours')
+    FROM (SELECT * FROM attendance_student_summary WHERE student_id = OLD.student_id AND class_subject_id = (SELECT class_subject_id FROM attendance_sessions WHERE id = OLD.session_id) AND EXISTS (SELECT 1 FROM students WHERE id = OLD.student_id)) ss, attendance_alert_limits l, (SELECT 'WARN' AS level UNION ALL SELECT 'LIMIT' AS level) lv WHERE CASE lv.level WHEN 'LIMIT' THEN (ss.absent_count + ss.excused_count) > l.absence_limit * MAX(l.term_sessions, (ss.present_count + ss.absent_count + ss.excused_count + ss.late_count))
+        ELSE (ss.absent_count + ss.excused_count) > 0 AND (ss.absent_count + ss.excused_count) >= l.warn_ratio * l.absence_limit * MAX(l.term_sessions, (ss.present_count + ss.absent_count + ss.excused_count + ss.late_count)) END
+    ON CONFLICT (student_id, class_subject_id, level) DO UPDATE SET
+        absences = excluded.absences, sessions = excluded.sessions, raised_at = excluded.raised_at, resolved_at = NULL
+    WHERE resolved_at IS NOT NULL;
+    UPDATE attendance_alerts SET resolved_at = strftime('%Y-%m-%d %H:%M:%S', 'now', '+7 hours')
+    WHERE student_id = OLD.student_id AND class_subject_id = (SELECT class_subject_id FROM attendance_sessions WHERE id = OLD.session_id) AND EXISTS (SELECT 1 FROM students WHERE id = OLD.student_id) AND resolved_at IS NULL
+      AND NOT EXISTS (SELECT 1 FROM (SELECT * FROM attendance_student_summary WHERE student_id = OLD.student_id AND class_subject_id = (SELECT class_subject_id FROM attendance_sessions WHERE id = OLD.session_id) AND EXISTS (SELECT 1 FROM students WHERE id = OLD.student_id)) ss, attendance_alert_limits l WHERE 1 AND CASE attendance_alerts.level WHEN 'LIMIT' THEN (ss.absent_count + ss.excused_count) > l.absence_limit * MAX(l.term_sessions, (ss.present_count + ss.absent_count + ss.excused_count + ss.late_count))
+        ELSE (ss.absent_count + ss.excused_count) > 0 AND (ss.absent_count + ss.excused_count) >= l.warn_ratio * l.absence_limit * MAX(l.term_sessions, (ss.present_count + ss.absent_count + ss.excused_count + ss.late_count)) END);
+    END;
+
+    INSERT INTO attendance_alerts (student_id, class_subject_id, level, absences, sessions, raised_at)
+    SELECT ss.student_id, ss.class_subject_id, lv.level, (ss.absent_count + ss.excused_count), MAX(l.term_sessions, (ss.present_count + ss.absent_count + ss.excused_count + ss.late_count)), strftime('%Y-%m-%d %H:%M:%S', 'now', '+7 hours')
+    FROM attendance_student_summary ss, attendance_alert_limits l, (SELECT 'WARN' AS level UNION ALL SELECT 'LIMIT' AS level) lv WHERE CASE lv.level WHEN 'LIMIT' THEN (ss.absent_count + ss.excused_count) > l.absence_limit * MAX(l.term_sessions, (ss.present_count + ss.absent_count + ss.excused_count + ss.late_count))
+        ELSE (ss.absent_count + ss.excused_count) > 0 AND (ss.absent_count + ss.excused_count) >= l.warn_ratio * l.absence_limit * MAX(l.term_sessions, (ss.present_count + ss.absent_count + ss.excused_count + ss.late_count)) END
+    ON CONFLICT (student_id, class_subject_id, level) DO UPDATE SET
+        absences = excluded.absences, sessions = excluded.sessions, raised_at = excluded.raised_at, resolved_at = NULL
+    WHERE resolved_at IS NOT NULL;
+    UPDATE attendance_alerts SET resolved_at = strftime('%Y-%m-%d %H:%M:%S', 'now', '+7 hours')
+    WHERE 1 AND resolved_at IS NULL
+      AND NOT EXISTS (SELECT 1 FROM attendance_student_summary ss, attendance_alert_limits l WHERE ss.student_id = attendance_alerts.student_id AND ss.class_subject_id = attendance_alerts.class_subject_id AND CASE attendance_alerts.level WHEN 'LIMIT' THEN (ss.absent_count + ss.excused_count) > l.absence_limit * MAX(l.term_sessions, (ss.present_count + ss.absent_count + ss.excused_count + ss.late_count))
+        ELSE (ss.absent_count + ss.excused_count) > 0 AND (ss.absent_count + ss.excused_count) >= l.warn_ratio * l.absence_limit * MAX(l.term_sessions, (ss.present_count + ss.absent_count + ss.excused_count + ss.late_count)) END);"""
+
+MIGRATIONS = [
+    (1, "Bảng gốc", """
+    CREATE TABLE IF NOT EXISTS users (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         username TEXT NOT NULL UNIQUE,
         password_hash TEXT NOT NULL,
@@ -35,8 +730,8 @@ def init_db():
         role TEXT NOT NULL CHECK (role IN ('ADMIN','TEACHER','STUDENT')),
         is_active INTEGER NOT NULL DEFAULT 1,
         created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-    )""")
-    cur.execute("""CREATE TABLE IF NOT EXISTS password_resets (
+    );
+    CREATE TABLE IF NOT EXISTS password_resets (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         user_id INTEGER NOT NULL,
         token TEXT NOT NULL UNIQUE,
@@ -44,22 +739,22 @@ def init_db():
         used INTEGER NOT NULL DEFAULT 0,
         created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
         FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-    )""")
-    cur.execute("""CREATE TABLE IF NOT EXISTS teachers (
+    );
+    CREATE TABLE IF NOT EXISTS teachers (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         user_id INTEGER NOT NULL UNIQUE,
         teacher_code TEXT NOT NULL UNIQUE,
         FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-    )""")
-    cur.execute("""CREATE TABLE IF NOT EXISTS classes (
+    );
+    CREATE TABLE IF NOT EXISTS classes (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         class_code TEXT NOT NULL UNIQUE,
         class_name TEXT NOT NULL,
         homeroom_teacher_id INTEGER,
         is_active INTEGER NOT NULL DEFAULT 1,
         FOREIGN KEY (homeroom_teacher_id) REFERENCES teachers(id)
-    )""")
-    cur.execute("""CREATE TABLE IF NOT EXISTS students (
+    );
+    CREATE TABLE IF NOT EXISTS students (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         user_id INTEGER NOT NULL UNIQUE,
         student_code TEXT NOT NULL UNIQUE,
@@ -68,13 +763,13 @@ def init_db():
         note TEXT,
         FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
         FOREIGN KEY (class_id) REFERENCES classes(id)
-    )""")
-    cur.execute("""CREATE TABLE IF NOT EXISTS subjects (
+    );
+    CREATE TABLE IF NOT EXISTS subjects (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         subject_code TEXT NOT NULL UNIQUE,
         subject_name TEXT NOT NULL
-    )""")
-    cur.execute("""CREATE TABLE IF NOT EXISTS class_subjects (
+    );
+    CREATE TABLE IF NOT EXISTS class_subjects (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         class_id INTEGER NOT NULL,
         subject_id INTEGER NOT NULL,
@@ -83,8 +778,8 @@ def init_db():
         FOREIGN KEY (class_id) REFERENCES classes(id) ON DELETE CASCADE,
         FOREIGN KEY (subject_id) REFERENCES subjects(id) ON DELETE CASCADE,
         FOREIGN KEY (teacher_id) REFERENCES teachers(id) ON DELETE CASCADE
-    )""")
-    cur.execute("""CREATE TABLE IF NOT EXISTS Enrollment (
+    );
+    CREATE TABLE IF NOT EXISTS Enrollment (
         EnrollmentID INTEGER PRIMARY KEY AUTOINCREMENT,
         student_id INTEGER,
         class_id INTEGER,
@@ -92,8 +787,8 @@ def init_db():
         status TEXT CHECK (status IN ('Active', 'Canceled')),
         FOREIGN KEY (student_id) REFERENCES students(id),
         FOREIGN KEY (class_id) REFERENCES classes(id)
-    )""")
-    cur.execute("""CREATE TABLE IF NOT EXISTS attendance_sessions (
+    );
+    CREATE TABLE IF NOT EXISTS attendance_sessions (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         class_subject_id INTEGER NOT NULL,
         session_code TEXT NOT NULL UNIQUE,
@@ -106,8 +801,8 @@ def init_db():
         created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
         FOREIGN KEY (class_subject_id) REFERENCES class_subjects(id) ON DELETE CASCADE,
         FOREIGN KEY (created_by) REFERENCES teachers(id)
-    )""")
-    cur.execute("""CREATE TABLE IF NOT EXISTS Attendance (
+    );
+    CREATE TABLE IF NOT EXISTS Attendance (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         session_id INTEGER NOT NULL,
         student_id INTEGER NOT NULL,
@@ -120,84 +815,298 @@ def init_db():
         FOREIGN KEY (session_id) REFERENCES attendance_sessions(id) ON DELETE CASCADE,
         FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE,
         FOREIGN KEY (updated_by) REFERENCES teachers(id)
-    )""")
-    conn.close()
+    );
+    """),
+    (2, "Index cho các truy vấn nóng", """
+    CREATE INDEX IF NOT EXISTS idx_attendance_student ON Attendance(student_id);
+    CREATE INDEX IF NOT EXISTS idx_sessions_cs_status ON attendance_sessions(class_subject_id, status);
+    CREATE INDEX IF NOT EXISTS idx_students_class ON students(class_id);
+    CREATE INDEX IF NOT EXISTS idx_enrollment_student_class ON Enrollment(student_id, class_id);
+    CREATE INDEX IF NOT EXISTS idx_class_subjects_teacher ON class_subjects(teacher_id);
+    CREATE INDEX IF NOT EXISTS idx_password_resets_lookup ON password_resets(token, used, expires_at);
+    """),
+    (3, "Bảng tổng hợp điểm danh + trigger", _MIGRATION_3_SQL),
+    (4, "Index phân trang người dùng theo vai trò", """
+    CREATE INDEX IF NOT EXISTS idx_users_role_id ON users(role, id);
+    """),
+    (5, "Bảng cấu hình ứng dụng", """
+    CREATE TABLE IF NOT EXISTS app_settings (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    );
+    """),
+    (6, "Index tự đóng buổi học hết giờ", """
+    CREATE INDEX IF NOT EXISTS idx_sessions_status_close_at ON attendance_sessions(status, close_at);
+    """),
+    (7, "Index phủ cho lịch sử điểm danh của sinh viên", """
+    CREATE INDEX IF NOT EXISTS idx_attendance_student_history ON Attendance(student_id, session_id, status, marked_at, note);
+    DROP INDEX IF EXISTS idx_attendance_student;
+    """),
+    (8, "Index riêng phần cho lượt vắng/muộn (analytics.py)", """
+    CREATE INDEX IF NOT EXISTS idx_attendance_not_present ON Attendance(session_id, student_id, status) WHERE status <> 'PRESENT';
+    """),
+    (9, "Cảnh báo vắng theo ngưỡng + trigger", _MIGRATION_9_SQL),
+    (10, "Danh mục kho lưu trữ theo năm học (archive.py)", """
+    CREATE TABLE IF NOT EXISTS archive_terms (
+        term TEXT PRIMARY KEY,
+        file_name TEXT NOT NULL,
+        first_date DATE NOT NULL,
+        archived_until DATE NOT NULL,
+        archived_until_id INTEGER NOT NULL,
+        sessions INTEGER NOT NULL DEFAULT 0,
+        attendance_rows INTEGER NOT NULL DEFAULT 0,
+        updated_at DATETIME
+    );
+    CREATE INDEX IF NOT EXISTS idx_archive_terms_until ON archive_terms(archived_until);
+    CREATE INDEX IF NOT EXISTS idx_sessions_date ON attendance_sessions(date);
+    """),
+    # Mốc đồng bộ lưới điểm danh theo thứ tự commit: seq cấp lúc ghi, khi đang giữ khóa ghi, nên giao dịch commit
+    # sau luôn có seq lớn hơn (marked_at/updated_at do máy ghi đặt, có thể lùi so với thứ tự commit).
+    # AUTOINCREMENT: không dùng lại seq của dòng đã dọn. Chỉ ghi cho buổi đang mở (chỉ chúng có lưới theo dõi),
+    # đóng/xóa buổi thì dọn, nên bảng luôn nhỏ: không cần index theo buổi (rẻ hơn cho mỗi lượt điểm danh).
+    (11, "Nhật ký thay đổi điểm danh của buổi đang mở (mốc đồng bộ)", """
+    CREATE TABLE IF NOT EXISTS attendance_changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id INTEGER NOT NULL,
+        student_id INTEGER NOT NULL
+    );
+    CREATE TRIGGER IF NOT EXISTS trg_attendance_changes_ins AFTER INSERT ON Attendance
+    WHEN (SELECT status FROM attendance_sessions WHERE id = NEW.session_id) = 'ACTIVE'
+    BEGIN
+        INSERT INTO attendance_changes (session_id, student_id) VALUES (NEW.session_id, NEW.student_id);
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_attendance_changes_upd AFTER UPDATE OF status, note, session_id, student_id ON Attendance
+    WHEN (SELECT status FROM attendance_sessions WHERE id = NEW.session_id) = 'ACTIVE'
+    BEGIN
+        INSERT INTO attendance_changes (session_id, student_id) VALUES (NEW.session_id, NEW.student_id);
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_attendance_changes_close AFTER UPDATE OF status ON attendance_sessions
+    WHEN NEW.status <> 'ACTIVE'
+    BEGIN
+        DELETE FROM attendance_changes WHERE session_id = NEW.id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_attendance_changes_session_del AFTER DELETE ON attendance_sessions
+    BEGIN
+        DELETE FROM attendance_changes WHERE session_id = OLD.id;
+    END;
+    """),
+    (12, "Xóa bản ghi điểm danh thì xét lại cảnh báo vắng", _MIGRATION_12_SQL),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn):
+    """Chạy các migration còn thiếu, mỗi bản trong một giao dịch. Trả về danh sách phiên bản đã áp dụng."""
+    applied = []
+    current = get_schema_version(conn)
+    for version, _desc, script in MIGRATIONS:
+        if version <= current: continue
+        try:
+            conn.executescript(f"BEGIN;\n{script}\nPRAGMA user_version = {version};\nCOMMIT;")
+        except sqlite3.Error:
+            if conn.in_transaction: conn.rollback()
+            raise
+        applied.append(version)
+    return applied
+
+_schema_ready = None  # DB_PATH đã được init_db() xác nhận đúng SCHEMA_VERSION trong tiến trình này
+
+def init_db():
+    """Tạo/nâng schema khi cần. Đường nhanh: DB đã ở SCHEMA_VERSION thì chỉ đọc một PRAGMA user_version."""
+    global _schema_ready
+    path = DB_PATH
+    conn = sqlite3.connect(path)
+    try:
+        if get_schema_version(conn) == SCHEMA_VERSION: applied = []
+        else:
+            conn.execute("PRAGMA foreign_keys = ON;")
+            applied = migrate(conn)
+    finally: conn.close()
+    _schema_ready = path
+    return applied
 
 # --- HÀM HỖ TRỢ ---
 def row_to_dict(row): return dict(row) if row else None
 def rows_to_list(rows): return [row_to_dict(r) for r in rows]
 
+def stream_query(query, params=(), batch_size=1000):
+    """Sinh từng dòng (tuple) bằng fetchmany: bộ nhớ không phụ thuộc số dòng kết quả."""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(query, params)
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows: break
+                for r in rows: yield tuple(r)
+        finally: cur.close()
+
+# --- KHO LƯU TRỮ THEO NĂM HỌC (ATTACH KHI CẦN) ---
+# archive.py chuyển buổi học đã đóng (kèm Attendance) của các năm học cũ sang file SQLite riêng và ghi vào
+# archive_terms. Bảng tổng hợp/cảnh báo vẫn tính cả phần đã lưu trữ, nên chỉ các truy vấn đọc dòng gốc
+# (lịch sử, nhật ký, báo cáo theo sinh viên) mới cần ATTACH — và chỉ kho giao với khoảng ngày được hỏi.
+# Trong một kho, chỉ buổi có (date, id) <= (archived_until, archived_until_id) là hợp lệ: phần chép dư của
+# lần chạy bị ngắt nằm sau mốc này, bị bỏ qua khi đọc và bị ghi đè ở lần chạy sau.
+ARCHIVE_DIR = os.environ.get("ATTENDANCE_ARCHIVE_DIR")  # mặc định: thư mục archive/ cạnh file DB
+
+def archive_dir():
+    return ARCHIVE_DIR or os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), "archive")
+
+def get_archive_terms(conn, start_date=None, end_date=None):
+    """Các kho có dữ liệu giao với [start_date, end_date] (None = không giới hạn), cũ trước."""
+    return conn.execute("""SELECT * FROM archive_terms WHERE archived_until >= ? AND first_date <= ?
+                           ORDER BY first_date""", (start_date or "0000-01-01", end_date or "9999-12-31")).fetchall()
+
+@contextmanager
+def attached_archives(start_date=None, end_date=None):
+    """Kết nối của luồng, kèm các kho cần cho khoảng ngày đã ATTACH (tên arc0, arc1...). DETACH khi thoát.
+
+    yield (conn, archives) với archives = [(tên schema, (archived_until, archived_until_id))]; rỗng khi không cần kho nào
+    (trường hợp thường gặp: chỉ tốn một lần tra archive_terms).
+    """
+    with get_connection() as conn:
+        terms = get_archive_terms(conn, start_date, end_date)
+        limit = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED) if hasattr(conn, "getlimit") else 10
+        if len(terms) > limit:
+            raise ValueError(f"Khoảng ngày cần {len(terms)} kho lưu trữ (tối đa {limit}): hãy thu hẹp khoảng ngày")
+        archives = []
+        try:
+            for i, t in enumerate(terms):
+                path = os.path.join(archive_dir(), t["file_name"])
+                if not os.path.exists(path): raise FileNotFoundError(f"Thiếu file lưu trữ năm học {t['term']}: {path}")
+                conn.execute(f"ATTACH DATABASE ? AS arc{i}", (path,))
+                archives.append((f"arc{i}", (t["archived_until"], t["archived_until_id"])))
+            yield conn, archives
+        finally:
+            if archives and conn.in_transaction: conn.rollback()
+            for name, _ in archives:
+                try: conn.execute(f"DETACH DATABASE {name}")
+                except sqlite3.OperationalError:  # còn cursor mở trên kho: đừng để kho dính lại vào kết nối dùng chung
+                    _pool.retire_current()
+
+# Xóa các buổi trong temp.archive_batch khỏi DB chính mà bảng tổng hợp vẫn giữ số liệu của chúng:
+# chụp phần đóng góp của lô, xóa (trigger trừ đi), rồi cộng lại. Cảnh báo vắng không đổi vì trigger
+# cảnh báo bỏ qua bước làm giảm tổng số buổi. Chạy trong giao dịch của archive.py; CROSS JOIN đi từ lô
+# (bảng tạm, planner không có thống kê) sang buổi rồi Attendance thay vì quét cả Attendance.
+ARCHIVE_DETACH_SQL = f"""
+    CREATE TEMP TABLE IF NOT EXISTS archive_student_counts (student_id, class_subject_id, {_SUMMARY_COUNTS});
+    CREATE TEMP TABLE IF NOT EXISTS archive_daily_counts (class_subject_id, date, session_count, {_SUMMARY_COUNTS});
+    DELETE FROM temp.archive_student_counts;
+    DELETE FROM temp.archive_daily_counts;
+    INSERT INTO temp.archive_student_counts
+    SELECT a.student_id, s.class_subject_id, {_sums('a')}
+    FROM temp.archive_batch b CROSS JOIN main.attendance_sessions s ON s.id = b.id CROSS JOIN main.Attendance a ON a.session_id = s.id
+    GROUP BY a.student_id, s.class_subject_id;
+    INSERT INTO temp.archive_daily_counts
+    SELECT s.class_subject_id, s.date, COUNT(DISTINCT s.id), {_sums('a')}
+    FROM temp.archive_batch b CROSS JOIN main.attendance_sessions s ON s.id = b.id LEFT JOIN main.Attendance a ON a.session_id = s.id
+    WHERE s.status = 'CLOSED'
+    GROUP BY s.class_subject_id, s.date;
+    DELETE FROM main.attendance_sessions WHERE id IN (SELECT id FROM temp.archive_batch);
+    INSERT INTO attendance_student_summary (student_id, class_subject_id, {_SUMMARY_COUNTS})
+    SELECT * FROM temp.archive_student_counts WHERE 1
+    ON CONFLICT (student_id, class_subject_id) DO UPDATE SET {_ADD_COUNTS};
+    INSERT INTO attendance_daily_summary (class_subject_id, date, session_count, {_SUMMARY_COUNTS})
+    SELECT * FROM temp.archive_daily_counts WHERE 1
+    ON CONFLICT (class_subject_id, date) DO UPDATE SET session_count = session_count + excluded.session_count, {_ADD_COUNTS};
+"""
+
+ARCHIVE_UNTIL = "AND (s.date, s.id) <= (?, ?)"
+
+def union_archives(template, params, archives):
+    """Nhân `template` cho DB chính và từng kho của attached_archives, nối bằng UNION ALL.
+
+    template ghi `{db}.Attendance` / `{db}.attendance_sessions` (bí danh buổi học `s`) và đặt `{until}`
+    ở cuối mệnh đề WHERE, sau mọi tham số khác (ở kho lưu trữ nó thành điều kiện mốc lưu trữ).
+    Trả về (sql, params).
+    """
+    parts, all_params = [template.format(db="main", until="")], list(params)
+    for name, until in archives:
+        parts.append(template.format(db=name, until=ARCHIVE_UNTIL)); all_params += [*params, *until]
+    return "\nUNION ALL\n".join(parts), all_params
+
+# --- CẤU HÌNH ỨNG DỤNG (bảng app_settings) ---
+def get_setting(key, default=None):
+    with get_connection() as conn:
+        row = conn.execute("SELECT value FROM app_settings WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+@retry_on_busy
+def set_setting(key, value):
+    with get_connection() as conn:
+        conn.execute("""INSERT INTO app_settings (key, value, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)
+                        ON CONFLICT (key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at""", (key, str(value)))
+        conn.commit()
+
 # --- TRUY VẤN CƠ BẢN ---
 def get_user_by_username(username: str):
-    conn = get_connection()
-    try:
+    with get_connection() as conn:
         cur = conn.execute("SELECT * FROM users WHERE username = ? AND is_active = 1", (username,))
         return row_to_dict(cur.fetchone())
-    finally: conn.close()
 
 def get_user_by_email(email: str):
-    conn = get_connection()
-    try:
+    with get_connection() as conn:
         cur = conn.execute("SELECT * FROM users WHERE email = ? AND is_active = 1", (email,))
         return row_to_dict(cur.fetchone())
-    finally: conn.close()
 
 # --- QUÊN MẬT KHẨU & ĐỔI MK ---
+@retry_on_busy
 def request_password_reset(email: str):
     user = get_user_by_email(email)
     if not user: return None
     token = ''.join(secrets.choice(string.digits) for _ in range(6))
     expires = (datetime.utcnow() + timedelta(hours=7, minutes=15)).strftime("%Y-%m-%d %H:%M:%S")
-    conn = get_connection()
-    try:
+    with get_connection() as conn:
         conn.execute("INSERT INTO password_resets (user_id, token, expires_at) VALUES (?, ?, ?)", (user["id"], token, expires))
         conn.commit()
         return token
-    finally: conn.close()
 
+@retry_on_busy
 def reset_password_with_token(token, new_pass_hash):
-    conn = get_connection()
-    try:
-        now_vn = get_vn_time()
-        cur = conn.execute(f"SELECT user_id FROM password_resets WHERE token = ? AND used = 0 AND expires_at > '{now_vn}'", (token,))
-        row = cur.fetchone()
-        if not row: return False
+    with get_connection() as conn:
+        try:
+            now_vn = get_vn_time()
+            cur = conn.execute(f"SELECT user_id FROM password_resets WHERE token = ? AND used = 0 AND expires_at > '{now_vn}'", (token,))
+            row = cur.fetchone()
+            if not row: return False
         
-        user_id = row[0]
-        conn.execute("UPDATE users SET password_hash = ? WHERE id = ?", (new_pass_hash, user_id))
-        conn.execute("UPDATE password_resets SET used = 1 WHERE token = ?", (token,))
-        conn.commit()
-        return True
-    except: return False
-    finally: conn.close()
+            user_id = row[0]
+            conn.execute("UPDATE users SET password_hash = ? WHERE id = ?", (new_pass_hash, user_id))
+            conn.execute("UPDATE password_resets SET used = 1 WHERE token = ?", (token,))
+            conn.commit()
+            return True
+        except Exception as e:
+            _rollback_busy(conn, e); return False
 
+@retry_on_busy
 def update_password(user_id, new_password_hash):
-    conn = get_connection()
-    try:
-        conn.execute("UPDATE users SET password_hash = ? WHERE id = ?", (new_password_hash, user_id))
-        conn.commit()
-        return True
-    except: return False
-    finally: conn.close()
+    with get_connection() as conn:
+        try:
+            conn.execute("UPDATE users SET password_hash = ? WHERE id = ?", (new_password_hash, user_id))
+            conn.commit()
+            return True
+        except Exception as e:
+            _rollback_busy(conn, e); return False
 
 # --- LẤY DỮ LIỆU ---
+@cached
 def get_teacher_by_user_id(user_id: int):
-    conn = get_connection()
-    try:
+    with get_connection() as conn:
         cur = conn.execute("SELECT t.*, u.full_name FROM teachers t JOIN users u ON u.id = t.user_id WHERE t.user_id = ?", (user_id,))
         return row_to_dict(cur.fetchone())
-    finally: conn.close()
 
+@cached
 def get_student_by_user_id(user_id: int):
-    conn = get_connection()
-    try:
+    with get_connection() as conn:
         cur = conn.execute("SELECT s.*, u.full_name FROM students s JOIN users u ON u.id = s.user_id WHERE s.user_id = ?", (user_id,))
         return row_to_dict(cur.fetchone())
-    finally: conn.close()
 
+@cached
 def get_classes_for_teacher(teacher_id: int):
-    conn = get_connection()
-    try:
+    with get_connection() as conn:
         cur = conn.execute("""
             SELECT cs.id AS class_subject_id, c.id AS class_id, c.class_code, c.class_name,
                    s.id AS subject_id, s.subject_code, s.subject_name
@@ -207,61 +1116,146 @@ def get_classes_for_teacher(teacher_id: int):
             WHERE cs.teacher_id = ?
         """, (teacher_id,))
         return rows_to_list(cur.fetchall())
-    finally: conn.close()
 
 def get_students_in_class(class_id: int):
-    conn = get_connection()
-    try:
+    with get_connection() as conn:
         cur = conn.execute("""
             SELECT s.id AS student_id, s.student_code, u.full_name, s.gender, u.email
             FROM students s JOIN users u ON u.id = s.user_id
             WHERE s.class_id = ?
         """, (class_id,))
         return rows_to_list(cur.fetchall())
-    finally: conn.close()
 
 # --- XỬ LÝ ĐIỂM DANH ---
-def create_attendance_session(class_subject_id, session_code, date_str, created_by):
-    conn = get_connection()
-    try:
+# Ghi đè bản ghi cũ như INSERT OR REPLACE nhưng bằng UPDATE tại chỗ: giữ id và để
+# trigger UPDATE cập nhật bảng tổng hợp (REPLACE xóa ngầm, không chạy trigger DELETE).
+_ON_CONFLICT_REPLACE_ATTENDANCE = """ON CONFLICT (session_id, student_id) DO UPDATE SET
+                status = excluded.status, note = excluded.note, marked_at = excluded.marked_at,
+                updated_at = excluded.updated_at, updated_by = excluded.updated_by"""
+
+@retry_on_busy
+def create_attendance_session(class_subject_id, session_code, date_str, created_by, close_at=None):
+    """`close_at` ('YYYY-MM-DD HH:MM:SS', giờ VN): hết giờ điểm danh, buổi được đóng tự động (xem close_expired_sessions)."""
+    with get_connection() as conn:
         now_vn = get_vn_time()
         cur = conn.execute(f"""
-            INSERT INTO attendance_sessions (class_subject_id, session_code, date, status, created_by, start_time, created_at)
-            VALUES (?, ?, ?, 'ACTIVE', ?, '{now_vn}', '{now_vn}')
-        """, (class_subject_id, session_code, date_str, created_by))
+            INSERT INTO attendance_sessions (class_subject_id, session_code, date, status, created_by, start_time, created_at, close_at)
+            VALUES (?, ?, ?, 'ACTIVE', ?, '{now_vn}', '{now_vn}', ?)
+        """, (class_subject_id, session_code, date_str, created_by, close_at))
         conn.commit()
         return cur.lastrowid
-    finally: conn.close()
 
 def get_open_session_for_class_subject(class_subject_id):
-    conn = get_connection()
-    try:
+    with get_connection() as conn:
         cur = conn.execute("SELECT * FROM attendance_sessions WHERE class_subject_id = ? AND status = 'ACTIVE'", (class_subject_id,))
         return row_to_dict(cur.fetchone())
-    finally: conn.close()
 
+@retry_on_busy
 def close_attendance_session(session_id):
-    conn = get_connection()
-    try:
+    with get_connection() as conn:
         now_vn = get_vn_time()
         conn.execute(f"UPDATE attendance_sessions SET status = 'CLOSED', end_time = '{now_vn}' WHERE id = ?", (session_id,))
         conn.commit()
-    finally: conn.close()
 
+# --- TỰ ĐÓNG BUỔI HỌC HẾT GIỜ (close_at) ---
+# Một câu UPDATE cho mọi buổi hết hạn, tìm theo idx_sessions_status_close_at; trigger của bảng
+# tổng hợp chạy như khi giáo viên bấm "Đóng Buổi Học". end_time ghi đúng mốc close_at.
+SESSION_CLOSE_INTERVAL = float(os.environ.get("ATTENDANCE_SESSION_CLOSE_INTERVAL", "30"))
+
+@retry_on_busy
+def close_expired_sessions(now=None):
+    """Đóng mọi buổi ACTIVE có close_at <= `now` (mặc định giờ VN hiện tại). Trả về số buổi đã đóng."""
+    with get_connection() as conn:
+        cur = conn.execute("""
+            UPDATE attendance_sessions SET status = 'CLOSED', end_time = close_at
+            WHERE status = 'ACTIVE' AND close_at <= ?
+        """, (now or get_vn_time(),))
+        conn.commit()
+        return cur.rowcount
+
+class SessionCloser:
+    """Luồng nền gọi close_expired_sessions mỗi `interval` giây (GUI và server.py).
+
+    Chạy ở nhiều tiến trình cùng lúc vẫn an toàn: UPDATE chỉ chạm buổi còn ACTIVE.
+    Khi không có tiến trình nào chạy, dùng `python manage.py close-expired` theo lịch (cron).
+    """
+    def __init__(self, interval=SESSION_CLOSE_INTERVAL, on_error=None):
+        self.interval, self.on_error = interval, on_error
+        self.closed_total = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="session-closer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def _loop(self):
+        while True:
+            try: self.closed_total += close_expired_sessions()
+            except Exception as e:
+                if self.on_error: self.on_error(e)
+            if self._stop.wait(self.interval): return
+
+_session_closer = None
+_session_closer_lock = threading.Lock()
+
+def start_session_closer(interval=SESSION_CLOSE_INTERVAL):
+    """Khởi động SessionCloser dùng chung của tiến trình (gọi lại không tạo luồng mới)."""
+    global _session_closer
+    with _session_closer_lock:
+        if _session_closer is None: _session_closer = SessionCloser(interval)
+        return _session_closer
+
+def stop_session_closer():
+    global _session_closer
+    with _session_closer_lock: closer, _session_closer = _session_closer, None
+    if closer is not None: closer.stop()
+
+@retry_on_busy
 def upsert_attendance_record(session_id, student_id, status, note, updated_by):
-    conn = get_connection()
-    try:
+    with get_connection() as conn:
         now_vn = get_vn_time()
         conn.execute(f"""
-            INSERT OR REPLACE INTO Attendance (session_id, student_id, status, note, marked_at, updated_at, updated_by)
+            INSERT INTO Attendance (session_id, student_id, status, note, marked_at, updated_at, updated_by)
             VALUES (?, ?, ?, ?, '{now_vn}', '{now_vn}', ?)
+            {_ON_CONFLICT_REPLACE_ATTENDANCE}
         """, (session_id, student_id, status, note, updated_by))
         conn.commit()
-    finally: conn.close()
+
+# --- ĐIỂM DANH HÀNG LOẠT (MỘT GIAO DỊCH, MỘT COMMIT) ---
+@retry_on_busy
+def bulk_upsert_attendance(session_id, records, updated_by):
+    """Ghi nhiều bản ghi (student_id, status, note) bằng executemany. Trả về số bản ghi."""
+    now_vn = get_vn_time()
+    rows = [(session_id, student_id, status, note, now_vn, now_vn, updated_by) for student_id, status, note in records]
+    if not rows: return 0
+    with get_connection() as conn:
+        conn.executemany(f"""
+            INSERT INTO Attendance (session_id, student_id, status, note, marked_at, updated_at, updated_by)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            {_ON_CONFLICT_REPLACE_ATTENDANCE}
+        """, rows)
+        conn.commit()
+    return len(rows)
+
+@retry_on_busy
+def mark_remaining_attendance(session_id, class_id, status, updated_by):
+    """Đánh dấu `status` cho mọi SV của lớp chưa có bản ghi ở buổi này (một INSERT ... SELECT)."""
+    with get_connection() as conn:
+        now_vn = get_vn_time()
+        cur = conn.execute("""
+            INSERT INTO Attendance (session_id, student_id, status, note, marked_at, updated_at, updated_by)
+            SELECT ?, s.id, ?, NULL, ?, ?, ?
+            FROM students s
+            WHERE s.class_id = ?
+              AND NOT EXISTS (SELECT 1 FROM Attendance a WHERE a.session_id = ? AND a.student_id = s.id)
+        """, (session_id, status, now_vn, now_vn, updated_by, class_id, session_id))
+        conn.commit()
+        return cur.rowcount
 
 def get_attendance_records_for_session(session_id):
-    conn = get_connection()
-    try:
+    with get_connection() as conn:
         cur = conn.execute("""
             SELECT ar.*, s.student_code, u.full_name
             FROM Attendance ar
@@ -270,120 +1264,403 @@ def get_attendance_records_for_session(session_id):
             WHERE ar.session_id = ?
         """, (session_id,))
         return rows_to_list(cur.fetchall())
-    finally: conn.close()
+
+def get_attendance_changes_since(session_id, since=None):
+    """Bản ghi của buổi (đang mở) được ghi/sửa sau mốc `since` (None = tất cả).
+
+    Trả về (rows, mốc đồng bộ mới) — truyền mốc đó vào lần gọi sau. Mốc là seq của attendance_changes
+    (thứ tự commit), nên lượt ghi có marked_at lùi (lô CheckinWriter chờ khóa, máy khác lệch giờ) vẫn tới.
+    """
+    with get_connection() as conn:
+        # Đọc mốc trước dữ liệu: bản ghi commit xen giữa hai câu có seq > mốc, lần sau gửi lại (áp dụng lại không sao)
+        mark = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM attendance_changes").fetchone()[0]
+        if since is None:
+            cur = conn.execute("SELECT student_id, status, note FROM Attendance WHERE session_id = ?", (session_id,))
+        else:
+            cur = conn.execute("""
+                SELECT student_id, status, note FROM Attendance
+                WHERE session_id = ? AND student_id IN (SELECT student_id FROM attendance_changes WHERE seq > ? AND session_id = ?)
+            """, (session_id, since, session_id))
+        rows = rows_to_list(cur.fetchall())
+    return rows, max(mark, since or 0)  # MAX(seq) có thể lùi khi dòng mới nhất bị dọn
 
 def get_open_sessions_for_student(student_id):
-    conn = get_connection()
-    try:
+    # CROSS JOIN giữ thứ tự nối: đi từ lớp của sinh viên xuống buổi (idx_sessions_cs_status) thay vì
+    # để planner quét mọi buổi ACTIVE của toàn trường qua idx_sessions_status_close_at.
+    with get_connection() as conn:
         cur = conn.execute("""
             SELECT s.*, c.class_code, sub.subject_name
-            FROM attendance_sessions s
-            JOIN class_subjects cs ON s.class_subject_id = cs.id
-            JOIN classes c ON cs.class_id = c.id
+            FROM Enrollment e
+            CROSS JOIN classes c ON c.id = e.class_id
+            CROSS JOIN class_subjects cs ON cs.class_id = c.id
+            CROSS JOIN attendance_sessions s ON s.class_subject_id = cs.id
             JOIN subjects sub ON cs.subject_id = sub.id
-            JOIN Enrollment e ON e.class_id = c.id
-            WHERE e.student_id = ? AND s.status = 'ACTIVE'
-        """, (student_id,))
+            WHERE e.student_id = ? AND s.status = 'ACTIVE' AND (s.close_at IS NULL OR s.close_at > ?)
+        """, (student_id, get_vn_time()))
         return rows_to_list(cur.fetchall())
-    finally: conn.close()
 
+@retry_on_busy
 def student_mark_attendance(student_id, session_id, status="PRESENT", note=None):
-    conn = get_connection()
-    try:
+    with get_connection() as conn:
         now_vn = get_vn_time()
         conn.execute(f"""
-            INSERT OR REPLACE INTO Attendance (session_id, student_id, status, note, marked_at)
-            VALUES (?, ?, ?, ?, '{now_vn}')
+            INSERT INTO Attendance (session_id, student_id, status, note, marked_at, updated_at, updated_by)
+            VALUES (?, ?, ?, ?, '{now_vn}', NULL, NULL)
+            {_ON_CONFLICT_REPLACE_ATTENDANCE}
         """, (session_id, student_id, status, note))
         conn.commit()
-    finally: conn.close()
+
+# --- GHI ĐIỂM DANH THEO NHÓM (GROUP COMMIT) ---
+# Đầu giờ cả lớp điểm danh trong vòng một phút: mỗi lượt một commit là mỗi lượt một lần đồng bộ đĩa.
+# CheckinWriter cho một luồng ghi duy nhất gom các lượt đang chờ vào một giao dịch
+# (tối đa CHECKIN_BATCH bản ghi hoặc chờ thêm CHECKIN_WAIT_MS sau lượt đầu tiên).
+CHECKIN_BATCH = int(os.environ.get("ATTENDANCE_CHECKIN_BATCH", "256"))
+CHECKIN_WAIT_MS = float(os.environ.get("ATTENDANCE_CHECKIN_WAIT_MS", "2"))
+
+_CHECKIN_SQL = f"""
+    INSERT INTO Attendance (session_id, student_id, status, note, marked_at, updated_at, updated_by)
+    VALUES (?, ?, ?, ?, ?, NULL, NULL)
+    {_ON_CONFLICT_REPLACE_ATTENDANCE}
+"""
+
+class CheckinWriter:
+    """Hàng đợi ghi một luồng cho lượt tự điểm danh của sinh viên.
+
+    `submit(...)` trả về Future: xong (kết quả None) khi giao dịch chứa bản ghi đã commit
+    (bền vững theo PRAGMA synchronous đang dùng), hoặc mang ngoại lệ nếu riêng bản ghi đó
+    không ghi được — các bản ghi khác cùng lô vẫn được ghi.
+    """
+    def __init__(self, max_batch=CHECKIN_BATCH, max_wait_ms=CHECKIN_WAIT_MS):
+        self.max_batch, self.max_wait = max_batch, max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stats = {"records": 0, "batches": 0, "largest_batch": 0}
+        self._thread = threading.Thread(target=self._loop, name="checkin-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, student_id, session_id, status="PRESENT", note=None):
+        fut = Future()
+        fut.set_running_or_notify_cancel()  # đã gửi thì không hủy được
+        with self._lock:
+            if self._closed: raise RuntimeError("Hàng đợi điểm danh đã đóng.")
+            self._queue.put(((session_id, student_id, status, note, get_vn_time()), fut))
+        return fut
+
+    def close(self, timeout=None):
+        """Ghi nốt các lượt đang chờ rồi dừng luồng ghi."""
+        with self._lock:
+            if self._closed: return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join(timeout)
+
+    def stats(self):
+        with self._lock: s = dict(self._stats)
+        s["avg_batch"] = s["records"] / s["batches"] if s["batches"] else 0.0
+        return s
+
+    def _loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None: return
+            batch, deadline, stop = [item], time.monotonic() + self.max_wait, False
+            while len(batch) < self.max_batch:
+                wait = deadline - time.monotonic()
+                try: item = self._queue.get(timeout=wait) if wait > 0 else self._queue.get_nowait()
+                except queue.Empty: break
+                if item is None: stop = True; break
+                batch.append(item)
+            self._flush(batch)
+            if stop: return
+
+    def _flush(self, batch):
+        try: errors = self._write([row for row, _ in batch])
+        except Exception as e: errors = [e] * len(batch)
+        for (_, fut), err in zip(batch, errors):
+            if err is None: fut.set_result(None)
+            else: fut.set_exception(err)
+        with self._lock:
+            self._stats["records"] += len(batch); self._stats["batches"] += 1
+            self._stats["largest_batch"] = max(self._stats["largest_batch"], len(batch))
+
+    @retry_on_busy
+    def _write(self, rows):
+        """Ghi cả lô trong một giao dịch; trả về danh sách lỗi theo từng bản ghi (None = thành công)."""
+        with get_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(_CHECKIN_SQL, rows)
+                errors = [None] * len(rows)
+            except sqlite3.IntegrityError:
+                # Có bản ghi vi phạm ràng buộc (vd. buổi đã bị xóa): ghi lại từng dòng để chỉ nó thất bại
+                conn.rollback(); conn.execute("BEGIN IMMEDIATE")
+                errors = []
+                for row in rows:
+                    try: conn.execute(_CHECKIN_SQL, row); errors.append(None)
+                    except sqlite3.IntegrityError as e: errors.append(e)
+            conn.commit()
+        return errors
+
+_checkin_writer = None
+_checkin_writer_lock = threading.Lock()
+
+def get_checkin_writer():
+    """CheckinWriter dùng chung của tiến trình (khởi động khi gọi lần đầu)."""
+    global _checkin_writer
+    with _checkin_writer_lock:
+        if _checkin_writer is None: _checkin_writer = CheckinWriter()
+        return _checkin_writer
+
+def close_checkin_writer():
+    global _checkin_writer
+    with _checkin_writer_lock: writer, _checkin_writer = _checkin_writer, None
+    if writer is not None: writer.close()
 
 def get_student_history(student_id):
-    conn = get_connection()
-    try:
-        cur = conn.execute("""
+    with attached_archives() as (conn, archives):
+        sql, params = union_archives("""
             SELECT a.status, a.marked_at, a.note, s.session_code, s.date, sub.subject_name
-            FROM Attendance a
-            JOIN attendance_sessions s ON a.session_id = s.id
+            FROM {db}.Attendance a
+            JOIN {db}.attendance_sessions s ON a.session_id = s.id
+            JOIN class_subjects cs ON s.class_subject_id = cs.id
+            JOIN subjects sub ON cs.subject_id = sub.id
+            WHERE a.student_id = ? {until}
+        """, (student_id,), archives)
+        return rows_to_list(conn.execute(sql + " ORDER BY date DESC", params).fetchall())
+
+# --- LỊCH SỬ ĐIỂM DANH THEO TRANG ---
+# Sinh viên năm cuối có hàng nghìn lượt: giao diện nạp từng trang theo keyset (date, session_id) giảm dần.
+# Phần Attendance đọc hoàn toàn từ idx_attendance_student_history (không chạm bảng), mỗi dòng
+# nối buổi học theo khóa chính; chi phí một trang không phụ thuộc trang đã cuộn qua.
+HISTORY_PAGE_SIZE = 100
+_MAX_ROWID = 2**63 - 1
+
+_HISTORY_PAGE_TEMPLATE = """
+            SELECT a.session_id, a.status, a.marked_at, a.note, s.session_code, s.date, sub.subject_name
+            FROM {db}.Attendance a
+            JOIN {db}.attendance_sessions s ON a.session_id = s.id
             JOIN class_subjects cs ON s.class_subject_id = cs.id
             JOIN subjects sub ON cs.subject_id = sub.id
-            WHERE a.student_id = ?
-            ORDER BY s.date DESC
+            WHERE a.student_id = ? AND (s.date, s.id) < (?, ?) {until}"""
+
+def get_student_history_page(student_id, after=None, limit=HISTORY_PAGE_SIZE):
+    """Một trang lịch sử, mới nhất trước. `after` = (date, session_id) của dòng cuối trang trước (None = trang đầu)."""
+    params = (student_id, *(after or ("9999-12-31", _MAX_ROWID)))
+    order = " ORDER BY date DESC, session_id DESC LIMIT ?"
+    with get_connection() as conn:
+        rows = conn.execute(_HISTORY_PAGE_TEMPLATE.format(db="main", until="") + order, (*params, limit)).fetchall()
+    # Chỉ đọc kho lưu trữ khi trang chưa đầy, hoặc kho có thể chứa dòng mới hơn dòng cuối của trang
+    with attached_archives(rows[-1]["date"] if len(rows) == limit else None, params[1]) as (conn, archives):
+        if archives:
+            sql, all_params = union_archives(_HISTORY_PAGE_TEMPLATE, params, archives)
+            rows = conn.execute(sql + order, (*all_params, limit)).fetchall()
+    return rows_to_list(rows)
+
+def get_student_subject_summary(student_id):
+    """Thống kê theo môn của một sinh viên: một câu GROUP BY trên attendance_student_summary.
+
+    Mỗi dòng: subject_code, subject_name, sessions, present, absent, excused, late, rate
+    (rate = có mặt + muộn trên tổng lượt, như reports.attendance_rate).
+    """
+    with get_connection() as conn:
+        cur = conn.execute("""
+            SELECT sub.subject_code, sub.subject_name,
+                   SUM(ss.present_count + ss.absent_count + ss.excused_count + ss.late_count) AS sessions,
+                   SUM(ss.present_count) AS present, SUM(ss.absent_count) AS absent,
+                   SUM(ss.excused_count) AS excused, SUM(ss.late_count) AS late,
+                   ROUND(100.0 * SUM(ss.present_count + ss.late_count)
+                         / SUM(ss.present_count + ss.absent_count + ss.excused_count + ss.late_count), 1) AS rate
+            FROM attendance_student_summary ss
+            JOIN class_subjects cs ON cs.id = ss.class_subject_id
+            JOIN subjects sub ON sub.id = cs.subject_id
+            WHERE ss.student_id = ?
+            GROUP BY sub.id
+            HAVING sessions > 0
+            ORDER BY sub.subject_name
         """, (student_id,))
         return rows_to_list(cur.fetchall())
-    finally: conn.close()
 
-# --- ADMIN MANAGEMENT ---
-def get_all_users():
-    conn = get_connection()
-    try:
-        cur = conn.execute("SELECT id, username, full_name, role, email FROM users ORDER BY id DESC")
+# --- CẢNH BÁO VẮNG (ĐỌC TỪ attendance_alerts) ---
+# Số buổi vắng/số buổi hiện tại lấy từ bảng tổng hợp; cặp đã vượt hạn mức (LIMIT) thì không hiện thêm dòng WARN.
+_OPEN_ALERT_SELECT = f"""al.level, {_absences('ss')} AS absences, {_term('ss')} AS sessions, al.raised_at"""
+_OPEN_ALERT_JOIN = """JOIN attendance_student_summary ss ON ss.student_id = al.student_id AND ss.class_subject_id = al.class_subject_id
+            CROSS JOIN attendance_alert_limits l"""
+_OPEN_ALERT_WHERE = """al.resolved_at IS NULL
+              AND NOT (al.level = 'WARN' AND EXISTS (SELECT 1 FROM attendance_alerts x
+                       WHERE x.student_id = al.student_id AND x.class_subject_id = al.class_subject_id
+                         AND x.level = 'LIMIT' AND x.resolved_at IS NULL))"""
+
+def get_student_alerts(student_id):
+    with get_connection() as conn:
+        cur = conn.execute(f"""
+            SELECT {_OPEN_ALERT_SELECT}, sub.subject_name, c.class_code
+            FROM attendance_alerts al
+            {_OPEN_ALERT_JOIN}
+            JOIN class_subjects cs ON cs.id = al.class_subject_id
+            JOIN subjects sub ON sub.id = cs.subject_id
+            JOIN classes c ON c.id = cs.class_id
+            WHERE al.student_id = ? AND {_OPEN_ALERT_WHERE}
+            ORDER BY al.level = 'LIMIT' DESC, al.raised_at DESC
+        """, (student_id,))
         return rows_to_list(cur.fetchall())
-    finally: conn.close()
 
+def get_teacher_alerts(teacher_id):
+    """Cảnh báo đang mở của mọi lớp-môn giáo viên dạy (đi từ lớp-môn qua idx_alerts_open_cs)."""
+    with get_connection() as conn:
+        cur = conn.execute(f"""
+            SELECT {_OPEN_ALERT_SELECT}, c.class_code, sub.subject_name, st.student_code, u.full_name
+            FROM class_subjects cs
+            CROSS JOIN attendance_alerts al ON al.class_subject_id = cs.id
+            {_OPEN_ALERT_JOIN}
+            JOIN subjects sub ON sub.id = cs.subject_id
+            JOIN classes c ON c.id = cs.class_id
+            JOIN students st ON st.id = al.student_id
+            JOIN users u ON u.id = st.user_id
+            WHERE cs.teacher_id = ? AND {_OPEN_ALERT_WHERE}
+            ORDER BY al.level = 'LIMIT' DESC, al.raised_at DESC
+        """, (teacher_id,))
+        return rows_to_list(cur.fetchall())
+
+@retry_on_busy
+def recheck_attendance_alerts():
+    """Đối chiếu mọi cặp (sinh viên, lớp-môn) với ngưỡng hiện tại — gọi sau khi đổi ngưỡng. Trả về số cảnh báo đang mở."""
+    with get_connection() as conn:
+        conn.executescript(f"BEGIN IMMEDIATE;\n{ALERT_RECHECK_SQL}\nCOMMIT;")
+        return conn.execute("SELECT COUNT(*) FROM attendance_alerts WHERE resolved_at IS NULL").fetchone()[0]
+
+# --- ADMIN MANAGEMENT ---
+USERS_PAGE_SIZE = 200
+
+def get_users_page(after_id=None, role=None, limit=USERS_PAGE_SIZE):
+    """Một trang người dùng theo keyset, id giảm dần (mới nhất trước).
+
+    `after_id` là id cuối của trang trước (None = trang đầu); chi phí mỗi trang chỉ phụ thuộc `limit`.
+    """
+    query = "SELECT id, username, full_name, role, email FROM users WHERE id < ?"
+    params = [_MAX_ROWID if after_id is None else after_id]
+    if role: query += " AND role = ?"; params.append(role)
+    query += " ORDER BY id DESC LIMIT ?"; params.append(limit)
+    with get_connection() as conn:
+        return rows_to_list(conn.execute(query, params).fetchall())
+
+def get_all_users(role=None):
+    """Toàn bộ người dùng (id giảm dần), ghép từ các trang get_users_page; màn hình quản trị dùng thẳng get_users_page."""
+    users, after_id = [], None
+    while True:
+        page = get_users_page(after_id, role, USERS_PAGE_SIZE)
+        users += page
+        if len(page) < USERS_PAGE_SIZE: return users
+        after_id = page[-1]["id"]
+
+@retry_on_busy
 def create_user_full(username, password_hash, full_name, email, role):
-    conn = get_connection()
-    try:
-        cur = conn.execute("INSERT INTO users (username, password_hash, full_name, email, role) VALUES (?, ?, ?, ?, ?)",
-                     (username, password_hash, full_name, email, role))
-        user_id = cur.lastrowid
-        if role == 'TEACHER':
-            code = f"GV{user_id:03d}"
-            conn.execute("INSERT INTO teachers (user_id, teacher_code) VALUES (?, ?)", (user_id, code))
-        elif role == 'STUDENT':
-            code = f"SV{user_id:03d}"
-            conn.execute("INSERT INTO students (user_id, student_code, gender, class_id) VALUES (?, ?, 'M', NULL)", (user_id, code))
-        conn.commit()
-        return True, "Tạo thành công"
-    except Exception as e:
-        return False, str(e)
-    finally: conn.close()
+    with get_connection() as conn:
+        try:
+            cur = conn.execute("INSERT INTO users (username, password_hash, full_name, email, role) VALUES (?, ?, ?, ?, ?)",
+                         (username, password_hash, full_name, email, role))
+            user_id = cur.lastrowid
+            if role == 'TEACHER':
+                code = f"GV{user_id:03d}"
+                conn.execute("INSERT INTO teachers (user_id, teacher_code) VALUES (?, ?)", (user_id, code))
+            elif role == 'STUDENT':
+                code = f"SV{user_id:03d}"
+                conn.execute("INSERT INTO students (user_id, student_code, gender, class_id) VALUES (?, ?, 'M', NULL)", (user_id, code))
+            conn.commit()
+            _cache.invalidate()
+            return True, "Tạo thành công"
+        except Exception as e:
+            _rollback_busy(conn, e); return False, str(e)
 
+@retry_on_busy
 def delete_user(user_id):
-    conn = get_connection()
-    try:
+    with get_connection() as conn:
         conn.execute("DELETE FROM users WHERE id = ?", (user_id,))
         conn.commit()
-    finally: conn.close()
+    _cache.invalidate()
+
+def school_report_query(start_date=None, end_date=None):
+    """(sql, params) của báo cáo theo lớp trên attendance_daily_summary; dùng chung cho GUI và export.py.
+
+    Lọc ngày nằm trong điều kiện LEFT JOIN (không phải WHERE) để lớp chưa có buổi nào vẫn có dòng 0.
+    """
+    query = """
+        SELECT c.class_code, c.class_name,
+               (SELECT COUNT(*) FROM students s WHERE s.class_id = c.id) AS total_students,
+               COALESCE(SUM(d.session_count), 0) AS total_sessions,
+               COALESCE(SUM(d.present_count), 0) AS present_count,
+               COALESCE(SUM(d.absent_count + d.excused_count), 0) AS absent_count,
+               COALESCE(SUM(d.late_count), 0) AS late_count
+        FROM classes c
+        LEFT JOIN class_subjects cs ON cs.class_id = c.id
+        LEFT JOIN attendance_daily_summary d ON d.class_subject_id = cs.id
+    """
+    params = []
+    if start_date: query += " AND d.date >= ?"; params.append(start_date)
+    if end_date: query += " AND d.date <= ?"; params.append(end_date)
+    return query + " GROUP BY c.id ORDER BY c.class_code", params
 
 def get_school_attendance_report(start_date=None, end_date=None):
-    conn = get_connection()
-    try:
-        query = """
-            SELECT c.class_code, c.class_name, 
-                   COUNT(DISTINCT s.id) AS total_students,
-                   COUNT(DISTINCT asess.id) AS total_sessions,
-                   SUM(CASE WHEN ar.status = 'PRESENT' THEN 1 ELSE 0 END) AS present_count,
-                   SUM(CASE WHEN ar.status LIKE 'ABSENT%' THEN 1 ELSE 0 END) AS absent_count,
-                   SUM(CASE WHEN ar.status = 'LATE' THEN 1 ELSE 0 END) AS late_count
-            FROM classes c
-            LEFT JOIN students s ON s.class_id = c.id
-            LEFT JOIN class_subjects cs ON cs.class_id = c.id
-            LEFT JOIN attendance_sessions asess ON asess.class_subject_id = cs.id AND asess.status = 'CLOSED'
-            LEFT JOIN Attendance ar ON ar.session_id = asess.id
-        """
-        params = []
-        if start_date:
-            query += " AND asess.date >= ?"
-            params.append(start_date)
-        if end_date:
-            query += " AND asess.date <= ?"
-            params.append(end_date)
-        query += " GROUP BY c.id"
-        cur = conn.execute(query, params)
-        return rows_to_list(cur.fetchall())
-    finally: conn.close()
+    """Báo cáo theo lớp, đọc từ attendance_daily_summary: chi phí O(lớp x ngày trong khoảng)."""
+    with get_connection() as conn:
+        return rows_to_list(conn.execute(*school_report_query(start_date, end_date)).fetchall())
 
+# --- BẢNG TỔNG HỢP: REBUILD & KIỂM TRA NHẤT QUÁN ---
+def rebuild_attendance_summaries():
+    """Tính lại toàn bộ bảng tổng hợp (và đối chiếu lại cảnh báo vắng) từ dữ liệu gốc, trong một giao dịch.
+
+    Dữ liệu gốc gồm cả các kho lưu trữ năm học (bảng tổng hợp luôn tính cả phần đã chuyển đi).
+    """
+    with attached_archives() as (conn, archives):
+        conn.execute("BEGIN IMMEDIATE")
+        for stmt in SUMMARY_REBUILD_SQL.split(";"):
+            if stmt.strip(): conn.execute(stmt)
+        for name, until in archives:
+            conn.execute(f"""INSERT INTO attendance_student_summary (student_id, class_subject_id, {_SUMMARY_COUNTS})
+                {RAW_STUDENT_SUMMARY_TEMPLATE.format(db=name, until=ARCHIVE_UNTIL)}
+                ON CONFLICT (student_id, class_subject_id) DO UPDATE SET {_ADD_COUNTS}""", until)
+            conn.execute(f"""INSERT INTO attendance_daily_summary (class_subject_id, date, session_count, {_SUMMARY_COUNTS})
+                {RAW_DAILY_SUMMARY_TEMPLATE.format(db=name, until=ARCHIVE_UNTIL)}
+                ON CONFLICT (class_subject_id, date) DO UPDATE SET session_count = session_count + excluded.session_count, {_ADD_COUNTS}""", until)
+        for stmt in ALERT_RECHECK_SQL.split(";"):
+            if stmt.strip(): conn.execute(stmt)
+        conn.commit()
+        daily = conn.execute("SELECT COUNT(*) FROM attendance_daily_summary").fetchone()[0]
+        student = conn.execute("SELECT COUNT(*) FROM attendance_student_summary").fetchone()[0]
+    return {"daily_rows": daily, "student_rows": student}
+
+def check_attendance_summaries(limit=20):
+    """So bảng tổng hợp với dữ liệu gốc (kể cả kho lưu trữ). Trả về các dòng lệch (rỗng nghĩa là khớp)."""
+    nonzero = " OR ".join(f"{c} <> 0" for c, _ in _STATUS_COUNTERS)
+    checks = {
+        "daily": (f"SELECT class_subject_id, date, session_count, {_SUMMARY_COUNTS} FROM attendance_daily_summary "
+                  f"WHERE session_count <> 0 OR {nonzero}", RAW_DAILY_SUMMARY_TEMPLATE, 7),
+        "student": (f"SELECT student_id, class_subject_id, {_SUMMARY_COUNTS} FROM attendance_student_summary "
+                    f"WHERE {nonzero}", RAW_STUDENT_SUMMARY_TEMPLATE, 6),
+    }
+    result = {}
+    with attached_archives() as (conn, archives):
+        for name, (stored, template, ncols) in checks.items():
+            # Có kho lưu trữ: cộng phần của DB chính và từng kho theo khóa (2 cột đầu) của bảng tổng hợp
+            raw, params = union_archives(template, (), archives)
+            if archives:
+                cols = [f"c{i}" for i in range(ncols)]
+                raw = (f"WITH u({', '.join(cols)}) AS ({raw}) "
+                       f"SELECT c0, c1, {', '.join(f'SUM({c})' for c in cols[2:])} FROM u GROUP BY c0, c1")
+            missing = conn.execute(f"SELECT * FROM ({raw}) EXCEPT SELECT * FROM ({stored}) LIMIT ?", (*params, limit)).fetchall()
+            extra = conn.execute(f"SELECT * FROM ({stored}) EXCEPT SELECT * FROM ({raw}) LIMIT ?", (*params, limit)).fetchall()
+            result[name] = {"expected": [tuple(r) for r in missing], "stored": [tuple(r) for r in extra]}
+    return result
+
+@cached
 def get_all_teachers():
-    conn = get_connection()
-    try:
+    with get_connection() as conn:
         cur = conn.execute("SELECT t.id, t.teacher_code, u.full_name FROM teachers t JOIN users u ON u.id = t.user_id")
         return rows_to_list(cur.fetchall())
-    finally: conn.close()
 
+@cached
 def get_all_classes():
-    conn = get_connection()
-    try:
+    with get_connection() as conn:
         cur = conn.execute("""
             SELECT c.*, u.full_name as teacher_name 
             FROM classes c 
@@ -391,20 +1668,26 @@ def get_all_classes():
             LEFT JOIN users u ON t.user_id = u.id
         """)
         return rows_to_list(cur.fetchall())
-    finally: conn.close()
 
+@retry_on_busy
 def create_class(code, name, teacher_id):
-    conn = get_connection()
-    try:
-        conn.execute("INSERT INTO classes (class_code, class_name, homeroom_teacher_id) VALUES (?, ?, ?)", (code, name, teacher_id))
-        conn.commit()
-        return True, ""
-    except Exception as e: return False, str(e)
-    finally: conn.close()
+    with get_connection() as conn:
+        try:
+            conn.execute("INSERT INTO classes (class_code, class_name, homeroom_teacher_id) VALUES (?, ?, ?)", (code, name, teacher_id))
+            conn.commit()
+            _cache.invalidate()
+            return True, ""
+        except Exception as e:
+            _rollback_busy(conn, e); return False, str(e)
 
+@retry_on_busy
 def delete_class(class_id):
-    conn = get_connection()
-    try:
+    with get_connection() as conn:
         conn.execute("DELETE FROM classes WHERE id = ?", (class_id,))
         conn.commit()
-    finally: conn.close()
+    _cache.invalidate()
+
+# === ĐO HIỆU NĂNG TRUY VẤN (ATTENDANCE_PROFILE=1, xem profiler.py) ===
+if os.environ.get("ATTENDANCE_PROFILE", "0") == "1":
+    import profiler
+    profiler.install()
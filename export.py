@@ -0,0 +1,188 @@
+# export.py
+# Xuất báo cáo / danh sách ra CSV hoặc XLSX theo kiểu streaming (fetchmany -> ghi ngay),
+# bộ nhớ không đổi dù có bao nhiêu dòng. XLSX tự viết bằng zipfile (chỉ dùng thư viện chuẩn).
+import csv
+import os
+import re
+import zipfile
+from contextlib import closing
+from xml.sax.saxutils import escape
+
+from database import attached_archives, school_report_query, stream_query, union_archives
+
+BATCH_SIZE = 2000
+XLSX_MAX_ROWS = 1048576  # giới hạn dòng mỗi sheet của Excel (kể cả dòng tiêu đề)
+
+class ExportCancelled(Exception):
+    """Người dùng hủy xuất file giữa chừng."""
+
+# --- NGUỒN DỮ LIỆU: tên -> (tiêu đề cột, hàm tạo (sql, params)) ---
+# Nguồn đọc dòng Attendance gốc nhận thêm `archives` (kho năm học đã ATTACH, xem database.attached_archives)
+def _session_records_query(session_id):
+    return """
+        SELECT s.student_code, u.full_name, ar.status, ar.note, ar.marked_at, ar.updated_at
+        FROM Attendance ar
+        JOIN students s ON s.id = ar.student_id
+        JOIN users u ON u.id = s.user_id
+        WHERE ar.session_id = ?
+        ORDER BY s.student_code
+    """, (session_id,)
+
+def _student_history_query(student_id, archives=()):
+    query, params = union_archives("""
+        SELECT s.date, sub.subject_name, s.session_code, a.status, a.marked_at, a.note
+        FROM {db}.Attendance a
+        JOIN {db}.attendance_sessions s ON a.session_id = s.id
+        JOIN class_subjects cs ON s.class_subject_id = cs.id
+        JOIN subjects sub ON cs.subject_id = sub.id
+        WHERE a.student_id = ? {until}
+    """, (student_id,), archives)
+    return query + " ORDER BY 1 DESC", params
+
+def _attendance_log_query(start_date=None, end_date=None, archives=()):
+    # Nhật ký điểm danh toàn trường theo khoảng ngày (có thể hàng triệu dòng)
+    query = """
+        SELECT s.date, c.class_code, sub.subject_code, st.student_code, u.full_name, a.status, a.marked_at
+        FROM {db}.attendance_sessions s
+        JOIN {db}.Attendance a ON a.session_id = s.id
+        JOIN class_subjects cs ON cs.id = s.class_subject_id
+        JOIN classes c ON c.id = cs.class_id
+        JOIN subjects sub ON sub.id = cs.subject_id
+        JOIN students st ON st.id = a.student_id
+        JOIN users u ON u.id = st.user_id
+        WHERE 1 = 1
+    """
+    params = []
+    if start_date: query += " AND s.date >= ?"; params.append(start_date)
+    if end_date: query += " AND s.date <= ?"; params.append(end_date)
+    return union_archives(query + " {until}", params, archives)
+
+SOURCES = {
+    "school_report": (("Lớp", "Tên Lớp", "Sĩ số", "Tổng buổi", "Đi học", "Vắng", "Muộn"), school_report_query),
+    "session_records": (("Mã SV", "Họ Tên", "Trạng Thái", "Ghi Chú", "Điểm danh lúc", "Cập nhật lúc"), _session_records_query),
+    "student_history": (("Ngày", "Môn Học", "Mã Buổi", "Trạng Thái", "Điểm danh lúc", "Ghi Chú"), _student_history_query),
+    "attendance_log": (("Ngày", "Lớp", "Môn", "Mã SV", "Họ Tên", "Trạng Thái", "Điểm danh lúc"), _attendance_log_query),
+}
+ARCHIVED_SOURCES = {"student_history", "attendance_log"}
+
+# --- GHI FILE ---
+def _tick(count, progress, cancel):
+    if count % BATCH_SIZE == 0:
+        if cancel is not None and cancel.is_set(): raise ExportCancelled()
+        if progress: progress(count)
+
+def write_csv(path, header, rows, progress=None, cancel=None):
+    """Ghi CSV (UTF-8 có BOM để Excel đọc đúng tiếng Việt). Trả về số dòng dữ liệu."""
+    count = 0
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(header)
+        for row in rows:
+            w.writerow(row)
+            count += 1
+            _tick(count, progress, cancel)
+    if progress: progress(count)
+    return count
+
+_ILLEGAL_XML = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+def _col_name(i):
+    name = ""
+    i += 1
+    while i:
+        i, r = divmod(i - 1, 26)
+        name = chr(65 + r) + name
+    return name
+
+def _cell(ref, value):
+    if value is None: return ""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<c r="{ref}"><v>{value}</v></c>'
+    text = escape(_ILLEGAL_XML.sub("", str(value)))
+    return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+def _row_xml(r, values, cols):
+    return f'<row r="{r}">' + "".join(_cell(f"{cols[i]}{r}", v) for i, v in enumerate(values)) + "</row>"
+
+_SHEET_HEAD = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+               '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+_SHEET_TAIL = "</sheetData></worksheet>"
+
+def write_xlsx(path, header, rows, sheet_name="Data", progress=None, cancel=None):
+    """Ghi XLSX tối giản (inline string, không sharedStrings) theo luồng; tự sang sheet mới khi quá giới hạn dòng."""
+    cols = [_col_name(i) for i in range(len(header))]
+    count, sheets = 0, 0
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        sheet, r, buf = None, 0, []
+        try:
+            for row in rows:
+                if sheet is None or r >= XLSX_MAX_ROWS:
+                    if sheet is not None: buf.append(_SHEET_TAIL); sheet.write("".join(buf).encode()); sheet.close()
+                    sheets += 1
+                    sheet = zf.open(f"xl/worksheets/sheet{sheets}.xml", "w", force_zip64=True)
+                    buf = [_SHEET_HEAD, _row_xml(1, header, cols)]; r = 1
+                r += 1
+                buf.append(_row_xml(r, row, cols))
+                count += 1
+                if count % BATCH_SIZE == 0:  # ghi theo lô: ít lần gọi nén hơn, bộ nhớ vẫn chặn trên
+                    sheet.write("".join(buf).encode()); buf = []
+                _tick(count, progress, cancel)
+            if sheet is None:  # không có dữ liệu: vẫn ghi một sheet chỉ có tiêu đề
+                sheets = 1
+                with zf.open("xl/worksheets/sheet1.xml", "w") as s:
+                    s.write((_SHEET_HEAD + _row_xml(1, header, cols) + _SHEET_TAIL).encode())
+            else:
+                buf.append(_SHEET_TAIL); sheet.write("".join(buf).encode())
+        finally:  # hủy/lỗi giữa chừng: đóng sheet trước khi ZipFile đóng, để ngoại lệ gốc không bị ValueError che mất
+            if sheet is not None: sheet.close()
+        _write_xlsx_parts(zf, sheet_name, sheets)
+    if progress: progress(count)
+    return count
+
+def _write_xlsx_parts(zf, sheet_name, sheets):
+    ns = "http://schemas.openxmlformats.org/"
+    overrides = "".join(f'<Override PartName="/xl/worksheets/sheet{i}.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                        for i in range(1, sheets + 1))
+    zf.writestr("[Content_Types].xml",
+        f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<Types xmlns="{ns}package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        f'{overrides}</Types>')
+    zf.writestr("_rels/.rels",
+        f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<Relationships xmlns="{ns}package/2006/relationships">'
+        f'<Relationship Id="rId1" Type="{ns}officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/></Relationships>')
+    names = [sheet_name[:31]] + [f"{sheet_name[:27]} ({i})" for i in range(2, sheets + 1)]
+    sheet_tags = "".join(f'<sheet name="{escape(n)}" sheetId="{i}" r:id="rId{i}"/>' for i, n in enumerate(names, 1))
+    zf.writestr("xl/workbook.xml",
+        f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<workbook xmlns="{ns}spreadsheetml/2006/main" '
+        f'xmlns:r="{ns}officeDocument/2006/relationships"><sheets>{sheet_tags}</sheets></workbook>')
+    rels = "".join(f'<Relationship Id="rId{i}" Type="{ns}officeDocument/2006/relationships/worksheet" Target="worksheets/sheet{i}.xml"/>'
+                   for i in range(1, sheets + 1))
+    zf.writestr("xl/_rels/workbook.xml.rels",
+        f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<Relationships xmlns="{ns}package/2006/relationships">{rels}</Relationships>')
+
+WRITERS = {"csv": write_csv, "xlsx": write_xlsx}
+
+def export(source, fmt, path, progress=None, cancel=None, **params):
+    """Xuất nguồn `source` ra file `path` định dạng `fmt` ('csv'/'xlsx'). Trả về số dòng đã ghi.
+
+    `progress(n)` được gọi sau mỗi lô; `cancel` là threading.Event để dừng giữa chừng.
+    """
+    if source not in SOURCES: raise ValueError(f"Nguồn xuất không hợp lệ: {source}")
+    if fmt not in WRITERS: raise ValueError(f"Định dạng không hỗ trợ: {fmt}")
+    header, build = SOURCES[source]
+    try:
+        if source not in ARCHIVED_SOURCES:
+            query, query_params = build(**params)
+            # đóng ngay trên luồng này: generator dở dang nằm trong traceback sẽ giữ kết nối mượn của worker
+            with closing(stream_query(query, query_params, BATCH_SIZE)) as rows:
+                return WRITERS[fmt](path, header, rows, progress=progress, cancel=cancel)
+        with attached_archives(params.get("start_date"), params.get("end_date")) as (_, archives):
+            query, query_params = build(archives=archives, **params)
+            # đóng cursor trước khi DETACH (kho còn cursor mở thì không DETACH được), kể cả khi hủy/lỗi ghi
+            with closing(stream_query(query, query_params, BATCH_SIZE)) as rows:
+                return WRITERS[fmt](path, header, rows, progress=progress, cancel=cancel)
+    except ExportCancelled:
+        if os.path.exists(path): os.remove(path)  # không để lại file dở dang
+        raise
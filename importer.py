@@ -0,0 +1,135 @@
+# importer.py
+# Nhập hàng loạt tài khoản từ CSV: đọc theo luồng, kiểm tra từng dòng, ghi theo lô
+# (mỗi lô một giao dịch, executemany). Dòng lỗi được báo lại, không làm hỏng cả lô.
+#
+# Cột CSV (dòng đầu là tiêu đề): username, full_name, email, role, class_code, gender, password
+#   - role mặc định STUDENT; class_code (chỉ với STUDENT) tạo luôn Enrollment
+#   - password bỏ trống -> DEFAULT_PASSWORD
+import csv
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import database as db
+from auth import hash_password, validate_email, validate_username
+
+CHUNK_SIZE = 500
+HASH_WORKERS = os.cpu_count() or 2  # hashlib nhả GIL khi băm: băm song song mật khẩu riêng của từng dòng
+DEFAULT_PASSWORD = "123456"
+ROLES = ("STUDENT", "TEACHER", "ADMIN")
+GENDERS = ("M", "F", "O")
+CODE_PREFIX = {"TEACHER": "GV", "STUDENT": "SV"}  # cùng quy ước mã với create_user_full
+
+def _validate(row, class_ids):
+    """Chuẩn hóa một dòng CSV; trả về (bản ghi, None) hoặc (None, thông báo lỗi)."""
+    rec = {k: (row.get(k) or "").strip() for k in ("username", "full_name", "email", "role", "class_code", "gender", "password")}
+    rec["role"] = rec["role"].upper() or "STUDENT"
+    rec["gender"] = rec["gender"].upper() or "M"
+    err = validate_username(rec["username"])
+    if err: return None, err
+    if not rec["full_name"]: return None, "Họ tên là bắt buộc."
+    if not validate_email(rec["email"]): return None, f"Email không hợp lệ: {rec['email']}"
+    if rec["role"] not in ROLES: return None, f"Vai trò không hợp lệ: {rec['role']}"
+    if rec["gender"] not in GENDERS: return None, f"Giới tính không hợp lệ: {rec['gender']}"
+    rec["class_id"] = None
+    if rec["class_code"]:
+        if rec["role"] != "STUDENT": return None, "Chỉ sinh viên mới có mã lớp."
+        rec["class_id"] = class_ids.get(rec["class_code"])
+        if rec["class_id"] is None: return None, f"Không có lớp {rec['class_code']}"
+    return rec, None
+
+def _existing(conn, query, values):
+    values = list(values)
+    if not values: return set()
+    return {r[0] for r in conn.execute(query.format(",".join("?" * len(values))), values)}
+
+def _next_id(conn, table):
+    # AUTOINCREMENT không dùng lại id: lấy max(sqlite_sequence, MAX(id)) khi đang giữ khóa ghi
+    seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,)).fetchone()
+    top = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+    return max(seq[0] if seq else 0, top) + 1
+
+@db.retry_on_busy
+def _insert_chunk(chunk, default_hash):
+    """Ghi một lô [(số dòng, bản ghi)] trong một giao dịch. Trả về (số tạo, [(dòng, lỗi)])."""
+    errors, today = [], db.get_vn_time()[:10]
+    with db.get_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        # Kiểm tra trùng với DB bằng một truy vấn IN cho cả lô, trong cùng giao dịch ghi
+        taken_users = _existing(conn, "SELECT username FROM users WHERE username IN ({})", (r["username"] for _, r in chunk))
+        taken_emails = _existing(conn, "SELECT email FROM users WHERE email IN ({})", (r["email"] for _, r in chunk))
+        user_id, student_id = _next_id(conn, "users"), _next_id(conn, "students")
+        planned = []
+        for line, r in chunk:
+            if r["username"] in taken_users: errors.append((line, f"Tên đăng nhập đã tồn tại: {r['username']}")); continue
+            if r["email"] in taken_emails: errors.append((line, f"Email đã tồn tại: {r['email']}")); continue
+            r["id"] = user_id; user_id += 1
+            r["code"] = f"{CODE_PREFIX[r['role']]}{r['id']:03d}" if r["role"] in CODE_PREFIX else None
+            planned.append((line, r))
+        codes = [r["code"] for _, r in planned if r["code"]]
+        taken_codes = (_existing(conn, "SELECT teacher_code FROM teachers WHERE teacher_code IN ({})", codes)
+                       | _existing(conn, "SELECT student_code FROM students WHERE student_code IN ({})", codes))
+        users, teachers, students, enrollments = [], [], [], []
+        for line, r in planned:
+            if r["code"] in taken_codes: errors.append((line, f"Mã đã tồn tại: {r['code']}")); continue
+            users.append((r["id"], r["username"], r.get("password_hash") or default_hash, r["full_name"], r["email"], r["role"]))
+            if r["role"] == "TEACHER": teachers.append((r["id"], r["code"]))
+            elif r["role"] == "STUDENT":
+                students.append((student_id, r["id"], r["code"], r["gender"], r["class_id"]))
+                if r["class_id"]: enrollments.append((student_id, r["class_id"], today))
+                student_id += 1
+        conn.executemany("INSERT INTO users (id, username, password_hash, full_name, email, role) VALUES (?,?,?,?,?,?)", users)
+        conn.executemany("INSERT INTO teachers (user_id, teacher_code) VALUES (?,?)", teachers)
+        conn.executemany("INSERT INTO students (id, user_id, student_code, gender, class_id) VALUES (?,?,?,?,?)", students)
+        conn.executemany("INSERT INTO Enrollment (student_id, class_id, enrollment_date, status) VALUES (?,?,?,'Active')", enrollments)
+        conn.commit()
+    return len(users), errors
+
+def import_users(path, default_password=DEFAULT_PASSWORD, chunk_size=CHUNK_SIZE, progress=None, cancel=None):
+    """Nhập tài khoản từ file CSV `path`.
+
+    Trả về dict: rows (số dòng dữ liệu), created, errors [(số dòng, thông báo)], cancelled.
+    `progress(rows_read, created)` được gọi sau mỗi lô; `cancel` (threading.Event) dừng trước lô kế tiếp
+    — các lô đã ghi vẫn giữ nguyên.
+    """
+    with db.get_connection() as conn:
+        class_ids = {r[0]: r[1] for r in conn.execute("SELECT class_code, id FROM classes")}
+    default_hash = hash_password(default_password)  # băm một lần cho mọi dòng không có mật khẩu riêng
+    result = {"rows": 0, "created": 0, "errors": [], "cancelled": False}
+    seen_users, seen_emails, chunk = set(), set(), []
+
+    def flush():
+        # Băm trước khi mở giao dịch để không giữ khóa ghi trong lúc chạy KDF
+        own = [r for _, r in chunk if r["password"]]
+        for r, pw_hash in zip(own, pool.map(hash_password, [r["password"] for r in own])): r["password_hash"] = pw_hash
+        created, errors = _insert_chunk(chunk, default_hash)
+        result["created"] += created; result["errors"] += errors
+        chunk.clear()
+        if progress: progress(result["rows"], result["created"])
+
+    with ThreadPoolExecutor(HASH_WORKERS) as pool, open(path, encoding="utf-8-sig", newline="") as f:
+        reader = csv.DictReader(f)
+        missing = {"username", "full_name", "email"} - set(reader.fieldnames or ())
+        if missing: raise ValueError(f"File CSV thiếu cột: {', '.join(sorted(missing))}")
+        for row in reader:
+            line = reader.line_num
+            result["rows"] += 1
+            rec, err = _validate(row, class_ids)
+            if rec and rec["username"] in seen_users: err = f"Trùng tên đăng nhập trong file: {rec['username']}"
+            elif rec and rec["email"] in seen_emails: err = f"Trùng email trong file: {rec['email']}"
+            if err: result["errors"].append((line, err)); continue
+            seen_users.add(rec["username"]); seen_emails.add(rec["email"])
+            chunk.append((line, rec))
+            if len(chunk) >= chunk_size:
+                flush()
+                if cancel is not None and cancel.is_set(): result["cancelled"] = True; break
+        if chunk and not result["cancelled"]: flush()
+    if result["created"]: db.invalidate_cache()
+    result["errors"].sort()
+    return result
+
+def write_errors(path, errors):
+    """Ghi danh sách lỗi ra CSV (dòng, lỗi) để người dùng sửa file gốc."""
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(("Dòng", "Lỗi"))
+        w.writerows(errors)
@@ -1,26 +1,79 @@
+# main.py
+# Chạy: python main.py [--startup-profile] [--budget-ms 800]
+# --startup-profile: in thời gian từng bước import/khởi tạo tới khi màn hình đăng nhập được vẽ xong rồi thoát,
+# mã thoát 1 nếu vượt ngân sách (ATTENDANCE_STARTUP_BUDGET_MS) — để giữ máy điểm danh khởi động nhanh.
+import time
+_IMPORTS = [("bắt đầu", time.perf_counter())]
+import argparse
+import os
+import sys
 import tkinter as tk
-from gui import LoginScreen
+_IMPORTS.append(("import tkinter", time.perf_counter()))
 import database
+import auth
+_IMPORTS.append(("import database, auth", time.perf_counter()))
+from gui import LoginScreen
+_IMPORTS.append(("import gui", time.perf_counter()))
+
+STARTUP_BUDGET_MS = float(os.environ.get("ATTENDANCE_STARTUP_BUDGET_MS", "800"))
+# Chỉ nên nạp sau khi đăng nhập; có mặt lúc màn hình đăng nhập hiện lên nghĩa là đã có import sớm trở lại.
+DEFERRED_MODULES = ("dashboards", "reports", "export", "importer", "analytics", "numpy",
+                    "tkinter.messagebox", "tkinter.simpledialog", "tkinter.filedialog")
+
+def print_startup_profile(marks, budget_ms):
+    """In thời gian từng bước từ các mốc (nhãn, perf_counter); trả về True nếu tổng nằm trong ngân sách."""
+    total = (marks[-1][1] - marks[0][1]) * 1000
+    print("Khởi động (ms):")
+    for (_, prev), (label, t) in zip(marks, marks[1:]):
+        print(f"  {label:32s} {(t - prev) * 1000:8.1f}")
+    print(f"  {'TỔNG (chưa tính khởi động Python)':32s} {total:8.1f}   ngân sách {budget_ms:.0f}"
+          + ("" if total <= budget_ms else "   VƯỢT NGÂN SÁCH"))
+    early = [m for m in DEFERRED_MODULES if m in sys.modules]
+    if early: print(f"  Nạp sớm (nên để sau đăng nhập): {', '.join(early)}")
+    return total <= budget_ms
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Hệ thống điểm danh sinh viên")
+    ap.add_argument("--startup-profile", action="store_true", help="in thời gian khởi động từng bước rồi thoát")
+    ap.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS, help="ngân sách khởi động cho --startup-profile")
+    a = ap.parse_args(argv)
+    marks = list(_IMPORTS) if a.startup_profile else None
+    def mark(label):
+        if marks is not None: marks.append((label, time.perf_counter()))
+
+    # Khởi tạo DB: schema đã mới thì chỉ đọc PRAGMA user_version, không chạy DDL
+    applied = database.init_db()
+    mark(f"init_db (migrate {applied})" if applied else "init_db (schema đã mới)")
+    auth.configure_from_settings(database.get_setting)  # thuật toán/chi phí băm mật khẩu đã hiệu chỉnh
+    mark("cấu hình băm mật khẩu")
+    database.start_session_closer()  # tự đóng buổi học quá giờ điểm danh (close_at)
+    mark("luồng tự đóng buổi học")
 
-def main():
-    # Khởi tạo DB
-    database.init_db()
-    
     # Tạo cửa sổ chính
     root = tk.Tk()
     root.title("Hệ Thống Điểm Danh Sinh Viên - Nhóm 11")
     root.geometry("1100x700")
     root.minsize(1000, 600)
     root.configure(bg="#f5f5f5")
-    
+    mark("tạo cửa sổ Tk")
+
     # Icon (nếu có)
     # root.iconbitmap("icon.ico")
-    
+
     # Mở màn hình đăng nhập
     LoginScreen(root)
-    
+    mark("dựng màn hình đăng nhập")
+
+    if marks is not None:
+        root.update()
+        mark("vẽ khung hình đầu tiên")
+        ok = print_startup_profile(marks, a.budget_ms)
+        root.destroy(); database.stop_session_closer()
+        return 0 if ok else 1
+
     # Chạy ứng dụng
     root.mainloop()
+    database.stop_session_closer()
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,187 @@
+# manage.py
+# Lệnh quản trị chạy không cần giao diện: python manage.py [--db FILE] <lệnh> [tham số]
+import argparse
+import json
+import os
+import sys
+
+import auth
+import database as db
+
+COMMANDS = {}
+
+def command(name, help_text, *arguments):
+    """Đăng ký một lệnh con; `arguments` là các cặp (args, kwargs) cho add_argument."""
+    def register(fn):
+        COMMANDS[name] = (fn, help_text, arguments)
+        return fn
+    return register
+
+@command("migrate", "Nâng cấp schema lên phiên bản mới nhất")
+def cmd_migrate(args):
+    applied = db.init_db()
+    print(f"Schema phiên bản {db.SCHEMA_VERSION}. Đã áp dụng: {applied or 'không có'}")
+
+@command("rebuild-summaries", "Tính lại bảng tổng hợp điểm danh từ dữ liệu gốc")
+def cmd_rebuild_summaries(args):
+    db.init_db()
+    print("Đã tính lại bảng tổng hợp:", db.rebuild_attendance_summaries())
+
+@command("check-summaries", "So bảng tổng hợp với dữ liệu gốc",
+         (("--limit",), {"type": int, "default": 20, "help": "số dòng lệch tối đa hiển thị"}))
+def cmd_check_summaries(args):
+    db.init_db()
+    result = db.check_attendance_summaries(limit=args.limit)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if any(v["expected"] or v["stored"] for v in result.values()):
+        print("LỆCH: chạy 'python manage.py rebuild-summaries' để sửa.")
+        return 1
+    print("OK: bảng tổng hợp khớp dữ liệu gốc.")
+
+@command("close-expired", "Đóng các buổi học đã quá giờ điểm danh (close_at) — chạy theo lịch, vd. cron mỗi phút",
+         (("--now",), {"help": "mốc thời gian 'YYYY-MM-DD HH:MM:SS' (mặc định giờ VN hiện tại)"}))
+def cmd_close_expired(args):
+    db.init_db()
+    print(f"Đã đóng {db.close_expired_sessions(args.now)} buổi học hết giờ.")
+
+@command("at-risk", "Liệt kê sinh viên có nguy cơ cấm thi (cần NumPy)",
+         (("--limit",), {"type": int, "default": 50, "help": "số dòng hiển thị"}),
+         (("--today",), {"help": "ngày tính xu hướng 'YYYY-MM-DD' (mặc định hôm nay)"}))
+def cmd_at_risk(args):
+    import analytics
+    db.init_db()
+    if not analytics.available(): print("Cần cài NumPy: pip install numpy"); return 1
+    rows, st = analytics.at_risk_students(args.today, args.limit)
+    print(f"{st['flagged']:,}/{st['students']:,} sinh viên cần chú ý ({st['breached']:,} vắng quá {100 * st['absence_limit']:.0f}% một môn), "
+          f"xu hướng {st['window'][0]} -> {st['window'][1]}; nạp {st['load_ms']:.0f} ms, tính {st['analyze_ms']:.0f} ms")
+    for r in rows:
+        print(f"  {r['student_code'] or '?':10s} {r['full_name'] or '':28s} {r['class_code'] or '':8s} {r['level']:20s} "
+              f"{r['worst_rate']:5.1f}% {r['worst_subject'] or '':6s} xu hướng {r['trend']:+5.1f}  {r['subjects']}")
+
+@command("alert-limits", "Xem/đổi ngưỡng cảnh báo vắng rồi đối chiếu lại toàn bộ cảnh báo",
+         (("--absence-limit",), {"type": float, "help": f"tỉ lệ vắng tối đa, 0-1 (mặc định {db.ALERT_DEFAULTS['absence_limit']})"}),
+         (("--warn-ratio",), {"type": float, "help": f"cảnh báo sớm khi đã dùng tỉ lệ này của hạn mức (mặc định {db.ALERT_DEFAULTS['absence_warn_ratio']})"}),
+         (("--term-sessions",), {"type": int, "help": f"số buổi dự kiến tối thiểu của một môn (mặc định {db.ALERT_DEFAULTS['term_sessions']})"}))
+def cmd_alert_limits(args):
+    db.init_db()
+    changes = {"absence_limit": args.absence_limit, "absence_warn_ratio": args.warn_ratio, "term_sessions": args.term_sessions}
+    changes = {k: v for k, v in changes.items() if v is not None}
+    if any(not 0 < changes.get(k, 0.5) <= 1 for k in ("absence_limit", "absence_warn_ratio")) or changes.get("term_sessions", 1) < 1:
+        print("Ngưỡng không hợp lệ: tỉ lệ trong (0, 1], số buổi >= 1"); return 1
+    for k, v in changes.items(): db.set_setting(k, v)
+    for k, default in db.ALERT_DEFAULTS.items(): print(f"  {k:20s} {db.get_setting(k, default)}")
+    print(f"{db.recheck_attendance_alerts():,} cảnh báo đang mở.")
+
+@command("archive", "Chuyển buổi học đã đóng của các năm học cũ sang file lưu trữ theo năm học (archive/)",
+         (("--before",), {"help": "lưu trữ buổi có ngày < 'YYYY-MM-DD' (mặc định: đầu năm học hiện tại)"}),
+         (("--batch",), {"type": int, "default": None, "help": "số buổi tối đa mỗi giao dịch"}),
+         (("--vacuum",), {"action": "store_true", "help": "VACUUM DB chính sau khi xong (chặn ghi trong lúc chạy)"}))
+def cmd_archive(args):
+    import archive
+    db.init_db()
+    kwargs = {"batch_sessions": args.batch} if args.batch else {}
+    done = {}
+    def progress(term, sessions, rows):
+        t = done.setdefault(term, [0, 0]); t[0] += sessions; t[1] += rows
+        print(f"  {term}: {t[0]:,} buổi, {t[1]:,} dòng điểm danh")
+    totals = archive.archive_before(args.before, progress=progress, **kwargs)
+    if not totals: print("Không có buổi nào cần lưu trữ."); return
+    print(f"Xong: {sum(t['sessions'] for t in totals.values()):,} buổi, {sum(t['rows'] for t in totals.values()):,} dòng "
+          f"chuyển sang {db.archive_dir()}")
+    if args.vacuum: archive.vacuum(); print("Đã VACUUM DB chính.")
+
+@command("archive-list", "Liệt kê các file lưu trữ năm học")
+def cmd_archive_list(args):
+    import archive
+    db.init_db()
+    terms = archive.list_archives()
+    if not terms: print("Chưa có dữ liệu lưu trữ."); return
+    for t in terms:
+        size = f"{t['size'] / 2**20:8.1f} MB" if t["size"] is not None else "   THIẾU FILE"
+        print(f"  {t['term']}  {t['first_date']} -> {t['archived_until']}  {t['sessions']:>7,} buổi "
+              f"{t['attendance_rows']:>11,} dòng  {size}  {t['path']}")
+    return 1 if any(t["size"] is None for t in terms) else 0
+
+@command("backup", "Sao lưu trực tuyến DB (kèm kho năm học) vào backups/, kiểm tra toàn vẹn và xoay vòng",
+         (("--dir",), {"help": "thư mục chứa các bản sao lưu (mặc định backups/ cạnh file DB)"}),
+         (("--keep",), {"type": int, "default": None, "help": "số bản mới nhất được giữ (mặc định 7)"}),
+         (("--pages",), {"type": int, "default": None, "help": "số trang mỗi bước chép (-1 = một bước)"}),
+         (("--sleep",), {"type": float, "default": None, "help": "giây nghỉ giữa các bước"}),
+         (("--no-verify",), {"action": "store_true", "help": "bỏ qua PRAGMA integrity_check"}))
+def cmd_backup(args):
+    import backup
+    db.init_db()
+    kwargs = {k: v for k, v in (("keep", args.keep), ("pages", args.pages), ("sleep_s", args.sleep)) if v is not None}
+    shown = {}
+    def progress(name, done, total):
+        pct = 100 * done // max(total, 1) // 10 * 10
+        if shown.get(name) != pct: shown[name] = pct; print(f"  {name}: {pct}% ({done:,}/{total:,} trang)")
+    r = backup.create_backup(args.dir, check=not args.no_verify, progress=progress, **kwargs)
+    print(f"Xong: {r['path']} ({r['files']} file, {r['bytes'] / 2**20:.1f} MB, {r['seconds']:.1f}s"
+          f"{'' if args.no_verify else ', integrity_check OK'})")
+
+@command("backup-list", "Liệt kê các bản sao lưu",
+         (("--dir",), {"help": "thư mục chứa các bản sao lưu"}))
+def cmd_backup_list(args):
+    import backup
+    backups = backup.list_backups(args.dir)
+    if not backups: print("Chưa có bản sao lưu nào."); return
+    for b in backups: print(f"  {b['name']}  {b['bytes'] / 2**20:8.1f} MB  {b['path']}")
+
+@command("restore", "Khôi phục DB (kèm kho năm học) từ một bản sao lưu — ghi đè dữ liệu hiện tại",
+         (("snapshot",), {"help": "thư mục bản sao lưu, hoặc tên của nó trong thư mục backups/"}),
+         (("--dir",), {"help": "thư mục chứa các bản sao lưu"}),
+         (("--no-verify",), {"action": "store_true", "help": "bỏ qua PRAGMA quick_check trước khi khôi phục"}))
+def cmd_restore(args):
+    import backup
+    path = args.snapshot if os.path.isdir(args.snapshot) else os.path.join(args.dir or backup.backup_dir(), args.snapshot)
+    n = backup.restore(path, check=not args.no_verify)
+    print(f"Đã khôi phục {n} file từ {path}.")
+
+@command("import-users","Nhập tài khoản hàng loạt từ file CSV",
+         (("csv_file",), {"help": "cột: username, full_name, email, role, class_code, gender, password"}),
+         (("--password",), {"default": None, "help": "mật khẩu mặc định cho dòng không có cột password"}),
+         (("--chunk-size",), {"type": int, "default": None, "help": "số dòng mỗi giao dịch"}),
+         (("--errors",), {"help": "ghi các dòng lỗi ra file CSV này"}))
+def cmd_import_users(args):
+    import importer
+    db.init_db()
+    auth.configure_from_settings(db.get_setting)
+    kwargs = {k: v for k, v in (("default_password", args.password), ("chunk_size", args.chunk_size)) if v}
+    result = importer.import_users(args.csv_file, progress=lambda rows, created: print(f"  đã đọc {rows:,} dòng, tạo {created:,}"), **kwargs)
+    print(f"Xong: {result['created']:,}/{result['rows']:,} tài khoản được tạo, {len(result['errors']):,} dòng lỗi.")
+    for line, err in result["errors"][:20]: print(f"  dòng {line}: {err}")
+    if len(result["errors"]) > 20: print(f"  ... và {len(result['errors']) - 20} lỗi khác")
+    if args.errors and result["errors"]:
+        importer.write_errors(args.errors, result["errors"]); print("Đã ghi danh sách lỗi ra", args.errors)
+    return 1 if result["errors"] else 0
+
+@command("calibrate-hash", "Đo máy hiện tại và chọn chi phí băm mật khẩu theo ngân sách thời gian",
+         (("--target-ms",), {"type": float, "default": 250, "help": "thời gian mục tiêu cho một lần băm/xác minh"}),
+         (("--algorithm",), {"choices": sorted(auth.HASHERS), "default": "pbkdf2_sha256"}),
+         (("--dry-run",), {"action": "store_true", "help": "chỉ đo, không lưu"}))
+def cmd_calibrate_hash(args):
+    db.init_db()
+    hasher, ms = auth.calibrate(args.target_ms, args.algorithm)
+    print(f"{hasher.algorithm} chi phí {hasher.cost}: {ms:.0f} ms mỗi lần băm (mục tiêu {args.target_ms:.0f} ms)")
+    if args.dry_run: return
+    db.set_setting("password_hasher", hasher.algorithm); db.set_setting("password_cost", hasher.cost)
+    print("Đã lưu. Mật khẩu cũ được băm lại theo chi phí mới khi người dùng đăng nhập.")
+
+def build_parser():
+    ap = argparse.ArgumentParser(description="Công cụ quản trị Hệ thống Điểm danh")
+    ap.add_argument("--db", help="đường dẫn file DB (mặc định attendance.db)")
+    sub = ap.add_subparsers(dest="command", required=True)
+    for name, (fn, help_text, arguments) in COMMANDS.items():
+        p = sub.add_parser(name, help=help_text)
+        for a, kw in arguments: p.add_argument(*a, **kw)
+        p.set_defaults(func=fn)
+    return ap
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.db: db.set_db_path(args.db)
+    return args.func(args) or 0
+
+if __name__ == "__main__":
+    sys.exit(main())
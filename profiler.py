@@ -0,0 +1,315 @@
+# profiler.py
+# Đo thời gian truy vấn của database.py: histogram theo hàm và theo câu SQL (kèm số dòng), nhật ký
+# truy vấn chậm có tham số + EXPLAIN QUERY PLAN. Bật bằng ATTENDANCE_PROFILE=1 (database.py tự gọi install()).
+#   ATTENDANCE_SLOW_MS      ngưỡng truy vấn chậm, mặc định 100 ms
+#   ATTENDANCE_SLOW_LOG     file nhận nhật ký truy vấn chậm (mỗi dòng một JSON); không đặt thì in ra stderr
+#   ATTENDANCE_PROFILE_OUT  file JSON ghi hồ sơ khi tiến trình thoát
+#
+# Dòng lệnh:
+#   python profiler.py run <script.py> [tham số...]   chạy script với profiler bật, in báo cáo khi xong
+#   python profiler.py report <hồ_sơ.json>            in báo cáo từ file đã lưu
+#   (thêm --sort total|mean|max|count|rows, --limit N, --out FILE)
+import argparse
+import atexit
+import bisect
+import functools
+import inspect
+import json
+import os
+import re
+import runpy
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+import database as db
+
+SLOW_MS = float(os.environ.get("ATTENDANCE_SLOW_MS", "100"))
+SLOW_LOG = os.environ.get("ATTENDANCE_SLOW_LOG")
+PROFILE_OUT = os.environ.get("ATTENDANCE_PROFILE_OUT")
+SLOW_KEEP = 200  # số truy vấn chậm giữ trong bộ nhớ
+BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 10000)
+PLAN_PREFIXES = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+# Hàm tiện ích / không chạm DB thì không bọc
+SKIP_FUNCTIONS = {"get_vn_time", "get_connection", "row_to_dict", "rows_to_list", "retry_on_busy", "cached",
+                  "set_db_path", "get_pool_stats", "get_cache_stats", "invalidate_cache", "close_all_connections",
+                  "get_checkin_writer", "close_checkin_writer", "get_schema_version"}
+
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SPACE = re.compile(r"\s+")
+
+@functools.lru_cache(maxsize=2048)
+def normalize_sql(sql):
+    """Gom các câu chỉ khác hằng số (vd. thời gian chèn bằng f-string) về cùng một khóa."""
+    return _SPACE.sub(" ", _LITERAL.sub("?", sql)).strip()
+
+class Histogram:
+    """Thống kê thời gian (ms) theo các ô BUCKETS_MS, kèm tổng số dòng."""
+    __slots__ = ("count", "total", "min", "max", "rows", "buckets")
+
+    def __init__(self):
+        self.count, self.total, self.min, self.max, self.rows = 0, 0.0, float("inf"), 0.0, 0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+
+    def add(self, ms, rows):
+        self.count += 1; self.total += ms; self.rows += rows
+        if ms < self.min: self.min = ms
+        if ms > self.max: self.max = ms
+        self.buckets[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+
+    def quantile(self, q):
+        """Ước lượng phân vị bằng cận trên của ô chứa nó (không vượt max)."""
+        target, seen = q * self.count, 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= target: return min(BUCKETS_MS[i] if i < len(BUCKETS_MS) else self.max, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {"count": self.count, "total_ms": round(self.total, 3), "mean_ms": round(self.total / self.count, 3) if self.count else 0.0,
+                "min_ms": round(self.min, 3) if self.count else 0.0, "p50_ms": round(self.quantile(0.5), 3), "p95_ms": round(self.quantile(0.95), 3),
+                "max_ms": round(self.max, 3), "rows": self.rows,
+                "buckets": {(f"<={b}" if i < len(BUCKETS_MS) else f">{BUCKETS_MS[-1]}"): n
+                            for i, (b, n) in enumerate(zip(BUCKETS_MS + (None,), self.buckets)) if n}}
+
+class Profile:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.functions, self.statements, self.callers = {}, {}, {}
+            self.slow = deque(maxlen=SLOW_KEEP)
+            self.started = time.time()
+
+    def record_function(self, name, ms, rows):
+        with self._lock:
+            hist = self.functions.get(name) or self.functions.setdefault(name, Histogram())
+            hist.add(ms, rows)
+
+    def record_sql(self, key, caller, ms, rows):
+        with self._lock:
+            hist = self.statements.get(key) or self.statements.setdefault(key, Histogram())
+            hist.add(ms, rows)
+            self.callers.setdefault(key, Counter())[caller] += 1
+
+    def record_slow(self, entry):
+        with self._lock: self.slow.append(entry)
+        line = json.dumps(entry, ensure_ascii=False, default=str)
+        if SLOW_LOG:
+            with open(SLOW_LOG, "a", encoding="utf-8") as f: f.write(line + "\n")
+        else: sys.stderr.write(f"[truy vấn chậm] {entry['ms']:.1f} ms {entry['caller']}: {entry['sql'][:200]}\n")
+
+    def snapshot(self):
+        with self._lock:
+            return {"started": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started)),
+                    "taken": time.strftime("%Y-%m-%d %H:%M:%S"), "slow_ms": SLOW_MS, "db_path": db.DB_PATH,
+                    "functions": {k: h.to_dict() for k, h in self.functions.items()},
+                    "sql": {k: dict(h.to_dict(), callers=dict(self.callers.get(k, {}))) for k, h in self.statements.items()},
+                    "slow": list(self.slow)}
+
+profile = Profile()
+
+def _caller():
+    """Hàm ngoài profiler.py đã gửi câu lệnh, dạng 'module.hàm'."""
+    f = sys._getframe(2)
+    while f is not None and f.f_code.co_filename == __file__: f = f.f_back
+    return f"{f.f_globals.get('__name__', '?')}.{f.f_code.co_name}" if f is not None else "?"
+
+def _count(result):
+    if isinstance(result, tuple) and result and isinstance(result[0], list): result = result[0]
+    return len(result) if isinstance(result, list) else 1 if isinstance(result, dict) else 0
+
+class ProfiledCursor(sqlite3.Cursor):
+    """Cursor cộng dồn thời gian execute + fetch của mỗi câu lệnh; ghi nhận khi đã đọc hết kết quả."""
+    _current = None  # [sql, tham số, caller, ms, số dòng]
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        caller, t0 = _caller(), time.perf_counter()
+        super().execute(sql, parameters)
+        self._begin(sql, parameters, caller, (time.perf_counter() - t0) * 1000)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        seq = seq_of_parameters if isinstance(seq_of_parameters, (list, tuple)) else list(seq_of_parameters)
+        caller, t0 = _caller(), time.perf_counter()
+        super().executemany(sql, seq)
+        self._begin(sql, seq[0] if seq else (), caller, (time.perf_counter() - t0) * 1000)
+        return self
+
+    def executescript(self, sql_script):
+        self._finish()
+        caller, t0 = _caller(), time.perf_counter()
+        super().executescript(sql_script)
+        self._begin(sql_script, (), caller, (time.perf_counter() - t0) * 1000)
+        return self
+
+    def _begin(self, sql, params, caller, ms):
+        self._current = [sql, params, caller, ms, 0]
+        if self.description is None: self._current[4] = max(self.rowcount, 0); self._finish()  # lệnh ghi: xong ngay
+
+    def _fetched(self, t0, rows):
+        if self._current is not None: self._current[3] += (time.perf_counter() - t0) * 1000; self._current[4] += rows
+
+    def _finish(self):
+        cur, self._current = self._current, None
+        if cur is None: return
+        sql, params, caller, ms, rows = cur
+        profile.record_sql(normalize_sql(sql), caller, ms, rows)
+        if ms >= SLOW_MS:
+            profile.record_slow({"time": time.strftime("%Y-%m-%d %H:%M:%S"), "ms": round(ms, 3), "rows": rows, "caller": caller,
+                                 "sql": _SPACE.sub(" ", sql).strip(), "params": _safe_params(params),
+                                 "plan": _explain(self.connection, sql, params)})
+
+    def fetchone(self):
+        t0 = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(t0, row is not None)
+        if row is None: self._finish()
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        t0 = time.perf_counter()
+        rows = super().fetchmany(size)
+        self._fetched(t0, len(rows))
+        if len(rows) < size: self._finish()
+        return rows
+
+    def fetchall(self):
+        t0 = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(t0, len(rows)); self._finish()
+        return rows
+
+    def __next__(self):
+        t0 = time.perf_counter()
+        try: row = super().__next__()
+        except StopIteration: self._fetched(t0, 0); self._finish(); raise
+        self._fetched(t0, 1)
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try: self._finish()
+        except Exception: pass
+
+class ProfiledConnection(db.PooledConnection):
+    """Kết nối của pool, mọi câu lệnh đi qua ProfiledCursor."""
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()): return self.cursor().execute(sql, parameters)
+    def executemany(self, sql, seq_of_parameters): return self.cursor().executemany(sql, seq_of_parameters)
+    def executescript(self, sql_script): return self.cursor().executescript(sql_script)
+
+def _safe_params(params):
+    if isinstance(params, dict): return {k: _short(v) for k, v in params.items()}
+    return [_short(v) for v in params] if isinstance(params, (list, tuple)) else _short(params)
+
+def _short(v):
+    return v[:200] if isinstance(v, str) else v if isinstance(v, (int, float, type(None))) else repr(v)[:200]
+
+def _explain(conn, sql, params):
+    """EXPLAIN QUERY PLAN bằng cursor thường (không đo lại chính nó); None nếu không áp dụng được."""
+    if not sql.lstrip().upper().startswith(PLAN_PREFIXES): return None
+    try: return [r[-1] for r in sqlite3.Cursor(conn).execute("EXPLAIN QUERY PLAN " + sql, params)]
+    except sqlite3.Error: return None
+
+# --- BẬT / TẮT ---
+_originals = {}
+
+def _timed(name, fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        t0, result = time.perf_counter(), None
+        try:
+            result = fn(*args, **kwargs)
+            return result
+        finally: profile.record_function(name, (time.perf_counter() - t0) * 1000, _count(result))
+    return wrapper
+
+def enabled(): return db.CONNECTION_FACTORY is ProfiledConnection
+
+def install():
+    """Bật đo: kết nối mới của pool dùng ProfiledConnection, các hàm công khai của database.py được bọc."""
+    if enabled(): return
+    db.CONNECTION_FACTORY = ProfiledConnection
+    db.close_all_connections()  # kết nối đang mở là loại cũ
+    for name, fn in list(vars(db).items()):
+        if (name.startswith("_") or name in SKIP_FUNCTIONS or not inspect.isfunction(fn)
+                or fn.__module__ != db.__name__ or inspect.isgeneratorfunction(fn)): continue
+        _originals[name] = fn
+        setattr(db, name, _timed(name, fn))
+    if PROFILE_OUT: atexit.register(dump, PROFILE_OUT)
+
+def uninstall():
+    if not enabled(): return
+    for name, fn in _originals.items(): setattr(db, name, fn)
+    _originals.clear()
+    db.CONNECTION_FACTORY = db.PooledConnection
+    db.close_all_connections()
+
+def snapshot(): return profile.snapshot()
+def reset(): profile.reset()
+
+def dump(path):
+    with open(path, "w", encoding="utf-8") as f: json.dump(snapshot(), f, ensure_ascii=False, indent=2, default=str)
+
+# --- BÁO CÁO ---
+SORT_KEYS = {"total": "total_ms", "mean": "mean_ms", "max": "max_ms", "count": "count", "rows": "rows"}
+
+def report(snap=None, sort="total", limit=20, out=sys.stdout):
+    """In bảng theo hàm, theo câu SQL và các truy vấn chậm gần nhất."""
+    snap = snap or snapshot()
+    key = SORT_KEYS[sort]
+    head = f"{'lần':>8s} {'tổng ms':>11s} {'tb ms':>9s} {'~p50':>8s} {'~p95':>8s} {'max ms':>9s} {'dòng':>10s}"
+    def line(s): return f"{s['count']:>8,} {s['total_ms']:>11.1f} {s['mean_ms']:>9.3f} {s['p50_ms']:>8} {s['p95_ms']:>8} {s['max_ms']:>9.2f} {s['rows']:>10,}"
+    print(f"Hồ sơ truy vấn từ {snap['started']} đến {snap['taken']} ({snap['db_path']})", file=out)
+    print(f"\n== Theo hàm (sắp theo {sort}) ==\n{'hàm':40s} {head}", file=out)
+    for name, s in sorted(snap["functions"].items(), key=lambda kv: -kv[1][key])[:limit]:
+        print(f"{name[:40]:40s} {line(s)}", file=out)
+    print(f"\n== Theo câu SQL (sắp theo {sort}) ==", file=out)
+    for sql, s in sorted(snap["sql"].items(), key=lambda kv: -kv[1][key])[:limit]:
+        callers = ", ".join(f"{c} x{n}" for c, n in sorted(s["callers"].items(), key=lambda kv: -kv[1])[:3])
+        print(f"{head}\n{line(s)}\n    {sql[:160]}\n    gọi từ: {callers}", file=out)
+    print(f"\n== Truy vấn chậm (>= {snap['slow_ms']} ms), {len(snap['slow'])} gần nhất ==", file=out)
+    for e in snap["slow"][-limit:]:
+        print(f"{e['time']}  {e['ms']:.1f} ms  {e['rows']} dòng  {e['caller']}\n    {e['sql'][:160]}\n    tham số: {e['params']}", file=out)
+        for step in e["plan"] or (): print(f"    | {step}", file=out)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Hồ sơ thời gian truy vấn của database.py")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    run = sub.add_parser("run", help="chạy một script Python với profiler bật rồi in báo cáo")
+    run.add_argument("script"); run.add_argument("args", nargs=argparse.REMAINDER)
+    rep = sub.add_parser("report", help="in báo cáo từ file hồ sơ JSON")
+    rep.add_argument("file")
+    for p in (run, rep):
+        p.add_argument("--sort", choices=SORT_KEYS, default="total")
+        p.add_argument("--limit", type=int, default=20)
+    run.add_argument("--out", help="ghi thêm hồ sơ ra file JSON")
+    a = ap.parse_args(argv)
+    if a.cmd == "report":
+        with open(a.file, encoding="utf-8") as f: report(json.load(f), a.sort, a.limit)
+        return
+    install()
+    sys.argv = [a.script] + a.args
+    sys.path.insert(0, os.path.dirname(os.path.abspath(a.script)))
+    try: runpy.run_path(a.script, run_name="__main__")
+    except SystemExit: pass
+    finally:
+        if a.out: dump(a.out)
+        report(sort=a.sort, limit=a.limit)
+
+if __name__ == "__main__":
+    import profiler  # dùng chung trạng thái với bản được database.py import
+    profiler.main()
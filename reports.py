@@ -0,0 +1,98 @@
+# reports.py
+# Báo cáo nhiều mức: mốc thời gian (ngày/tuần/tháng/tổng) x chiều (lớp, môn, giảng viên, lớp-môn, sinh viên).
+# Mỗi báo cáo là MỘT câu GROUP BY: lớp/môn/giảng viên đọc attendance_daily_summary,
+# chiều sinh viên đọc Attendance qua index (không truy vấn lặp theo từng mốc), cộng cả các kho lưu trữ
+# năm học giao với khoảng ngày (UNION ALL rồi mới GROUP BY).
+from database import attached_archives, get_connection, rows_to_list, union_archives
+
+# Định dạng strftime cho từng mốc thời gian (None = gộp cả khoảng)
+GRANULARITIES = {"day": "%Y-%m-%d", "week": "%Y-W%W", "month": "%Y-%m", "all": None}
+GRANULARITY_LABELS = {"all": "Tổng", "day": "Ngày", "week": "Tuần", "month": "Tháng"}
+
+# chiều -> (khóa nhóm, mã, tên)
+DIMENSIONS = {
+    "class": ("c.id", "c.class_code", "c.class_name"),
+    "subject": ("sub.id", "sub.subject_code", "sub.subject_name"),
+    "teacher": ("t.id", "t.teacher_code", "tu.full_name"),
+    "class_subject": ("cs.id", "c.class_code || ' - ' || sub.subject_code", "sub.subject_name"),
+    "student": ("st.id", "st.student_code", "su.full_name"),
+}
+DIMENSION_LABELS = {"class": "Lớp", "subject": "Môn học", "teacher": "Giảng viên",
+                    "class_subject": "Lớp - Môn", "student": "Sinh viên"}
+
+_CS_JOINS = """
+    JOIN class_subjects cs ON cs.id = {src}.class_subject_id
+    JOIN classes c ON c.id = cs.class_id
+    JOIN subjects sub ON sub.id = cs.subject_id
+    JOIN teachers t ON t.id = cs.teacher_id
+    JOIN users tu ON tu.id = t.user_id"""
+
+def attendance_rate(present, late, total):
+    """Tỷ lệ đi học (%): có mặt + đi muộn trên tổng lượt điểm danh."""
+    return round(100.0 * (present + late) / total, 1) if total else 0.0
+
+def rollup(granularity="month", dimension="class", start_date=None, end_date=None,
+           teacher_id=None, class_subject_id=None):
+    """Tổng hợp điểm danh theo (mốc thời gian, chiều) trong một lượt truy vấn.
+
+    Mỗi dòng: bucket, key, code, name, sessions, present, absent, excused, late, total, rate.
+    Với chiều sinh viên, `sessions` là số buổi sinh viên có bản ghi điểm danh.
+    """
+    if granularity not in GRANULARITIES: raise ValueError(f"Mốc thời gian không hợp lệ: {granularity}")
+    if dimension not in DIMENSIONS: raise ValueError(f"Chiều báo cáo không hợp lệ: {dimension}")
+    fmt = GRANULARITIES[granularity]
+    key, code, name = DIMENSIONS[dimension]
+
+    if dimension == "student":
+        date_col = "s.date"
+        source = """
+            FROM {db}.Attendance a
+            JOIN {db}.attendance_sessions s ON s.id = a.session_id
+            JOIN students st ON st.id = a.student_id
+            JOIN users su ON su.id = st.user_id""" + _CS_JOINS.format(src="s")
+        where = ["s.status = 'CLOSED'"]
+    else:
+        date_col = "d.date"
+        source = "FROM attendance_daily_summary d" + _CS_JOINS.format(src="d")
+        measures = """SUM(d.session_count) AS sessions,
+            SUM(d.present_count) AS present, SUM(d.absent_count) AS absent,
+            SUM(d.excused_count) AS excused, SUM(d.late_count) AS late"""
+        where = []
+
+    params = []
+    if start_date: where.append(f"{date_col} >= ?"); params.append(start_date)
+    if end_date: where.append(f"{date_col} <= ?"); params.append(end_date)
+    if teacher_id is not None: where.append("cs.teacher_id = ?"); params.append(teacher_id)
+    if class_subject_id is not None: where.append("cs.id = ?"); params.append(class_subject_id)
+    bucket = f"strftime('{fmt}', {date_col})" if fmt else "'*'"
+
+    if dimension == "student":
+        # Mỗi DB (chính + kho) cho dòng gốc đã lọc; gộp nhóm sau UNION ALL
+        rows_sql = f"""
+            SELECT {bucket} AS bucket, {key} AS key, {code} AS code, {name} AS name, a.status
+            {source}
+            WHERE {" AND ".join(where)} {{until}}"""
+        with attached_archives(start_date, end_date) as (conn, archives):
+            union, params = union_archives(rows_sql, params, archives)
+            rows = rows_to_list(conn.execute(f"""
+                SELECT bucket, key, code, name, COUNT(*) AS sessions,
+                    SUM(status = 'PRESENT') AS present, SUM(status = 'ABSENT') AS absent,
+                    SUM(status = 'ABSENT_EXCUSED') AS excused, SUM(status = 'LATE') AS late
+                FROM ({union})
+                GROUP BY 1, 2
+                ORDER BY 1, 3
+            """, params).fetchall())
+    else:
+        query = f"""
+            SELECT {bucket} AS bucket, {key} AS key, {code} AS code, {name} AS name, {measures}
+            {source}
+            {"WHERE " + " AND ".join(where) if where else ""}
+            GROUP BY 1, 2
+            ORDER BY 1, 3
+        """
+        with get_connection() as conn:
+            rows = rows_to_list(conn.execute(query, params).fetchall())
+    for r in rows:
+        r["total"] = r["present"] + r["absent"] + r["excused"] + r["late"]
+        r["rate"] = attendance_rate(r["present"], r["late"], r["total"])
+    return rows
@@ -1,4 +1,5 @@
 -- schema.sql
+-- Lưu ý: nguồn chuẩn của schema là database.MIGRATIONS (init_db() tự nâng cấp DB cũ).
 PRAGMA foreign_keys = ON;
 
 -- 1. USERS
@@ -133,7 +134,16 @@ CREATE TABLE IF NOT EXISTS Attendance (
     FOREIGN KEY (updated_by) REFERENCES teachers(id)
 );
 
--- 13. SEED DATA (ĐÃ MÃ HÓA PASSWORD)
+-- 13. INDEXES (khớp migration 2 trong database.MIGRATIONS)
+CREATE INDEX IF NOT EXISTS idx_attendance_student ON Attendance(student_id);
+CREATE INDEX IF NOT EXISTS idx_sessions_cs_status ON attendance_sessions(class_subject_id, status);
+CREATE INDEX IF NOT EXISTS idx_students_class ON students(class_id);
+CREATE INDEX IF NOT EXISTS idx_enrollment_student_class ON Enrollment(student_id, class_id);
+CREATE INDEX IF NOT EXISTS idx_class_subjects_teacher ON class_subjects(teacher_id);
+CREATE INDEX IF NOT EXISTS idx_password_resets_lookup ON password_resets(token, used, expires_at);
+PRAGMA user_version = 2;
+
+-- 14. SEED DATA (ĐÃ MÃ HÓA PASSWORD)
 INSERT INTO users (username, password_hash, full_name, email, role) VALUES
     ('admin',       '240be518fabd2724ddb6f04eeb1da5967448d7e831c08c8fa822809f74c720a9',     'Quản trị viên',        'admin@example.com',    'ADMIN'),
     ('t_giang',     '01a34a810b10e3092289f6608935c106579998495034c5464195b060d4b85771',   'Thầy Giảng',           'teacher@example.com',  'TEACHER'),
@@ -0,0 +1,197 @@
+# server.py
+# Dịch vụ điểm danh JSON qua HTTP (chỉ dùng thư viện chuẩn) để sinh viên tự điểm danh từ thiết bị riêng.
+# Chạy: python server.py [--host 0.0.0.0] [--port 8080] [--db attendance.db] [--group-commit]
+#
+#   POST /api/login     {"username", "password"}  -> {"token", "user": {...}}
+#   GET  /api/sessions  (Authorization: Bearer <token>) -> {"sessions": [...]}
+#   POST /api/checkin   {"session_id"} (Bearer)  -> {"ok": true, "session_id", "status"}
+#   GET  /api/health    -> {"ok": true, "schema_version"}
+#   GET  /api/admin/profile (Bearer, ADMIN) -> hồ sơ truy vấn khi chạy với ATTENDANCE_PROFILE=1 (xem profiler.py)
+import argparse
+import json
+import os
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import auth
+import database as db
+import profiler
+
+TOKEN_TTL = 8 * 3600
+MAX_BODY = 16 * 1024
+# Ghi điểm danh qua hàng đợi group commit (database.CheckinWriter) thay vì mỗi lượt một commit
+GROUP_COMMIT = os.environ.get("ATTENDANCE_GROUP_COMMIT", "0") == "1"
+CHECKIN_TIMEOUT = 30
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class TokenStore:
+    """Token đăng nhập giữ trong bộ nhớ tiến trình (mất khi khởi động lại dịch vụ).
+
+    TTL cố định nên dict (giữ thứ tự chèn) cũng xếp theo hạn: mỗi lần issue() dọn các token hết hạn ở đầu,
+    bộ nhớ chỉ tỉ lệ với số token còn hạn thay vì tăng theo mọi lượt đăng nhập.
+    """
+    def __init__(self, ttl=TOKEN_TTL):
+        self.ttl = ttl
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def issue(self, info):
+        token = secrets.token_urlsafe(24)
+        now = time.monotonic()
+        with self._lock:
+            self._purge_expired(now)
+            self._tokens[token] = (now + self.ttl, info)
+        return token
+
+    def _purge_expired(self, now):
+        expired = []
+        for token, (expires, _) in self._tokens.items():
+            if expires >= now: break
+            expired.append(token)
+        for token in expired: del self._tokens[token]
+
+    def __len__(self):
+        with self._lock: return len(self._tokens)
+
+    def lookup(self, token):
+        with self._lock:
+            item = self._tokens.get(token)
+            if item and item[0] < time.monotonic(): del self._tokens[token]; item = None
+        return item[1] if item else None
+
+tokens = TokenStore()
+
+# --- XỬ LÝ TỪNG ENDPOINT: (body, thông tin đăng nhập) -> dict kết quả ---
+def api_login(body, _user):
+    username, password = str(body.get("username", "")), str(body.get("password", ""))
+    u = db.get_user_by_username(username)
+    if not u or not auth.verify_password(password, u["password_hash"]): raise ApiError(401, "Sai tên đăng nhập hoặc mật khẩu")
+    if auth.needs_rehash(u["password_hash"]): db.update_password(u["id"], auth.hash_password(password))
+    student = db.get_student_by_user_id(u["id"]) if u["role"] == "STUDENT" else None
+    info = {"user_id": u["id"], "role": u["role"], "full_name": u["full_name"], "student_id": student["id"] if student else None}
+    return {"token": tokens.issue(info), "user": info}
+
+def _require_student(user):
+    if user is None: raise ApiError(401, "Chưa đăng nhập hoặc phiên đã hết hạn")
+    if user["student_id"] is None: raise ApiError(403, "Chỉ tài khoản sinh viên mới điểm danh được")
+    return user["student_id"]
+
+def api_sessions(_body, user):
+    sessions = db.get_open_sessions_for_student(_require_student(user))
+    return {"sessions": [{k: s[k] for k in ("id", "session_code", "date", "class_code", "subject_name")} for s in sessions]}
+
+def api_checkin(body, user):
+    student_id = _require_student(user)
+    try: session_id = int(body.get("session_id"))
+    except (TypeError, ValueError): raise ApiError(400, "Thiếu session_id")
+    # Chỉ cho điểm danh buổi đang mở của lớp mình (như danh sách trên giao diện sinh viên)
+    if session_id not in {s["id"] for s in db.get_open_sessions_for_student(student_id)}:
+        raise ApiError(403, "Buổi học không mở hoặc bạn không thuộc lớp này")
+    if GROUP_COMMIT: db.get_checkin_writer().submit(student_id, session_id, "PRESENT", None).result(CHECKIN_TIMEOUT)
+    else: db.student_mark_attendance(student_id, session_id, "PRESENT", None)
+    return {"ok": True, "session_id": session_id, "status": "PRESENT"}
+
+def api_profile(_body, user):
+    if user is None: raise ApiError(401, "Chưa đăng nhập hoặc phiên đã hết hạn")
+    if user["role"] != "ADMIN": raise ApiError(403, "Chỉ quản trị viên xem được hồ sơ truy vấn")
+    if not profiler.enabled(): raise ApiError(404, "Chưa bật đo truy vấn (ATTENDANCE_PROFILE=1)")
+    return profiler.snapshot()
+
+def api_health(_body, _user):
+    with db.get_connection() as conn: return {"ok": True, "schema_version": db.get_schema_version(conn)}
+
+ROUTES = {
+    ("POST", "/api/login"): api_login,
+    ("GET", "/api/sessions"): api_sessions,
+    ("POST", "/api/checkin"): api_checkin,
+    ("GET", "/api/health"): api_health,
+    ("GET", "/api/admin/profile"): api_profile,
+}
+
+class ApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # giữ kết nối: mỗi client dùng lại một luồng và một kết nối SQLite
+    disable_nagle_algorithm = True  # header và body ghi riêng: tránh chờ delayed-ACK ~40 ms mỗi phản hồi
+    quiet = False
+
+    def do_GET(self): self._dispatch("GET")
+    def do_POST(self): self._dispatch("POST")
+
+    def _dispatch(self, method):
+        self._body_read = False  # body chưa đọc thì phải đóng kết nối: byte còn lại sẽ bị hiểu là request kế tiếp
+        try:
+            handler = ROUTES.get((method, self.path.split("?", 1)[0]))
+            if handler is None: raise ApiError(404, "Không có endpoint này")
+            self._send(200, handler(self._read_body(), self._current_user()))
+        except ApiError as e: self._send(e.status, {"error": str(e)})
+        except db.DatabaseBusyError as e: self._send(503, {"error": str(e)}, {"Retry-After": "1"})
+        except Exception as e:
+            self.log_error("Lỗi xử lý %s %s: %r", method, self.path, e)
+            self._send(500, {"error": "Lỗi máy chủ"})
+
+    def _read_body(self):
+        if self.headers.get("Transfer-Encoding"): raise ApiError(411, "Cần Content-Length")
+        try: length = int(self.headers.get("Content-Length") or 0)
+        except ValueError: raise ApiError(400, "Content-Length không hợp lệ")
+        if length < 0: raise ApiError(400, "Content-Length không hợp lệ")
+        if length > MAX_BODY: raise ApiError(413, "Dữ liệu quá lớn")
+        raw = self.rfile.read(length) if length else b""
+        self._body_read = True
+        if not raw: return {}
+        try: body = json.loads(raw)
+        except ValueError: raise ApiError(400, "JSON không hợp lệ")
+        if not isinstance(body, dict): raise ApiError(400, "JSON phải là một object")
+        return body
+
+    def _current_user(self):
+        header = self.headers.get("Authorization", "")
+        return tokens.lookup(header[7:]) if header.startswith("Bearer ") else None
+
+    def _send(self, status, payload, headers=None):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items(): self.send_header(k, v)
+        if not self._body_read: self.send_header("Connection", "close")  # send_header đặt luôn close_connection
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, fmt, *args):
+        if not self.quiet: super().log_message(fmt, *args)
+
+class ApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # mặc định 5: cả lớp kết nối cùng lúc sẽ tràn hàng đợi accept
+
+def make_server(host="127.0.0.1", port=8080):
+    db.init_db()
+    auth.configure_from_settings(db.get_setting)
+    return ApiServer((host, port), ApiHandler)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Dịch vụ điểm danh JSON qua HTTP")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8080)
+    ap.add_argument("--db", help="đường dẫn file DB (mặc định attendance.db)")
+    ap.add_argument("--quiet", action="store_true", help="không ghi log từng request")
+    ap.add_argument("--group-commit", action="store_true", help="gom các lượt điểm danh vào chung giao dịch")
+    args = ap.parse_args(argv)
+    global GROUP_COMMIT
+    GROUP_COMMIT = GROUP_COMMIT or args.group_commit
+    if args.db: db.set_db_path(args.db)
+    ApiHandler.quiet = args.quiet
+    server = make_server(args.host, args.port)
+    print(f"Đang phục vụ tại http://{args.host}:{server.server_address[1]} (Ctrl+C để dừng)", flush=True)
+    db.start_session_closer()
+    try: server.serve_forever()
+    except KeyboardInterrupt: pass
+    finally: server.server_close(); db.stop_session_closer(); db.close_checkin_writer(); db.close_all_connections()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# tasks.py
+# Chạy truy vấn DB ở luồng nền để giao diện Tk không bị treo.
+# Worker (ThreadPoolExecutor) trả kết quả vào hàng đợi; luồng Tk rút hàng đợi bằng root.after
+# rồi gọi callback on_done / on_error — mọi callback đều chạy trên luồng Tk.
+import queue
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+WORKERS = 2
+POLL_MS = 30
+
+_executor = None
+_runners = weakref.WeakKeyDictionary()
+
+def _get_executor():
+    global _executor
+    if _executor is None: _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="db-task")
+    return _executor
+
+def show_error(exc):
+    from tkinter import messagebox  # nạp khi cần: màn hình đăng nhập mở nhanh hơn
+    messagebox.showerror("Lỗi", str(exc))
+
+class Task:
+    """Một lần gửi việc; `cancel()` bỏ callback (và bỏ hẳn việc nếu là truy vấn có key chưa chạy)."""
+    def __init__(self, key, group, on_done, on_error):
+        self.key, self.group = key, group
+        self.on_done, self.on_error = on_done, on_error
+        self.cancelled = False
+        self.future = None
+
+class TaskRunner:
+    """Bộ thực thi gắn với một cửa sổ gốc Tk.
+
+    - `key`: dành cho truy vấn đọc — lần gửi mới cùng key thay thế lần cũ (kết quả cũ bị bỏ,
+      việc chưa chạy thì hủy luôn).
+    - `group`: `cancel(group)` bỏ kết quả mọi việc trong nhóm, ví dụ khi người dùng chuyển màn hình.
+      Việc không có key (ghi dữ liệu) vẫn chạy đến cùng; lỗi của nó vẫn được báo.
+    """
+    def __init__(self, root):
+        self.root = root
+        self._results = queue.Queue()
+        self._latest = {}
+        self._groups = {}
+        self._pending = 0
+        self._polling = False
+        self._busy_listeners = []
+
+    # --- API dùng từ luồng Tk ---
+    def submit(self, fn, *args, on_done=None, on_error=None, key=None, group=None, **kwargs):
+        if key is not None and key in self._latest: self._cancel_task(self._latest[key])
+        task = Task(key, group, on_done, on_error)
+        if key is not None: self._latest[key] = task
+        if group is not None: self._groups.setdefault(group, set()).add(task)
+        self._set_pending(self._pending + 1)
+        task.future = _get_executor().submit(self._run, task, fn, args, kwargs)
+        self._schedule()
+        return task
+
+    def cancel(self, group=None, key=None):
+        """Bỏ các việc của `group` và/hoặc việc đang chờ của `key`."""
+        for task in list(self._groups.pop(group, ())) if group is not None else []: self._cancel_task(task)
+        if key is not None and key in self._latest: self._cancel_task(self._latest[key])
+
+    def on_busy(self, listener):
+        """Đăng ký `listener(busy: bool)`, gọi khi chuyển giữa rảnh và đang có việc."""
+        self._busy_listeners.append(listener)
+        listener(self._pending > 0)
+
+    @property
+    def busy(self): return self._pending > 0
+
+    # --- API an toàn từ mọi luồng ---
+    def post(self, fn, *args, **kwargs):
+        """Đưa một lời gọi về chạy trên luồng Tk (dùng cho báo tiến độ từ worker)."""
+        self._results.put((None, (fn, args, kwargs), None))
+
+    # --- nội bộ ---
+    def _run(self, task, fn, args, kwargs):
+        try: result, exc = fn(*args, **kwargs), None
+        except Exception as e: result, exc = None, e
+        self._results.put((task, result, exc))
+
+    def _cancel_task(self, task):
+        if task.cancelled: return
+        task.cancelled = True
+        self._forget(task)
+        # Chỉ hủy hẳn truy vấn đọc (có key) chưa chạy; việc ghi luôn được thực hiện
+        if task.key is not None and task.future is not None and task.future.cancel():
+            self._set_pending(self._pending - 1)
+
+    def _forget(self, task):
+        if task.key is not None and self._latest.get(task.key) is task: del self._latest[task.key]
+        if task.group is not None: self._groups.get(task.group, set()).discard(task)
+
+    def _set_pending(self, n):
+        was_busy, self._pending = self._pending > 0, n
+        if was_busy != (n > 0):
+            try: self.root.config(cursor="watch" if n else "")
+            except Exception: pass
+            for listener in list(self._busy_listeners):
+                try: listener(n > 0)
+                except Exception: self._busy_listeners.remove(listener)  # widget đã bị hủy
+
+    def _schedule(self):
+        if not self._polling:
+            self._polling = True
+            self.root.after(POLL_MS, self._drain)
+
+    def _drain(self):
+        self._polling = False
+        while True:
+            try: task, result, exc = self._results.get_nowait()
+            except queue.Empty: break
+            if task is None:
+                fn, args, kwargs = result
+                self._call(fn, *args, **kwargs); continue
+            self._set_pending(self._pending - 1)
+            if task.cancelled:
+                if exc is not None and task.key is None: self._call(show_error, exc)
+                continue
+            self._forget(task)
+            if exc is not None: self._call(task.on_error or show_error, exc)
+            elif task.on_done: self._call(task.on_done, result)
+        if self._pending > 0 or not self._results.empty(): self._schedule()
+
+    def _call(self, fn, *args, **kwargs):
+        try: fn(*args, **kwargs)
+        except Exception as e: show_error(e)
+
+def runner_for(root):
+    """TaskRunner dùng chung cho cửa sổ gốc `root` (tạo khi gọi lần đầu)."""
+    runner = _runners.get(root)
+    if runner is None: runner = _runners[root] = TaskRunner(root)
+    return runner
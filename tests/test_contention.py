@@ -0,0 +1,93 @@
+# tests/test_contention.py
+# Ghi khi DB đang bị khóa (WAL, nhiều luồng/tiến trình): hàm ghi phải tự thử lại, hết lượt thì báo
+# DatabaseBusyError — không được biến lỗi "database is locked" thành False/thông điệp lỗi khác.
+import os
+import sqlite3
+import sys
+import threading
+from datetime import date
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path: sys.path.insert(0, ROOT_DIR)
+
+import database as db
+import final_setup
+
+WRITERS, PER_WRITER = 60, 5
+
+@pytest.fixture
+def empty_db(tmp_path, monkeypatch):
+    old_path = db.DB_PATH
+    path = str(tmp_path / "attendance.db")
+    monkeypatch.setattr(db, "BUSY_TIMEOUT_MS", 20)
+    monkeypatch.setattr(db, "WRITE_RETRIES", 3)
+    db.set_db_path(path)
+    db.init_db()
+    try: yield path
+    finally: db.set_db_path(old_path)
+
+def lock_writes(path):
+    """Kết nối ngoài pool giữ khóa ghi (như một tiến trình khác đang ghi)."""
+    other = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    other.execute("BEGIN IMMEDIATE")
+    return other
+
+def password_of(user_id):
+    with db.get_connection() as conn:
+        return conn.execute("SELECT password_hash FROM users WHERE id = ?", (user_id,)).fetchone()[0]
+
+def test_writers_retry_until_lock_released(empty_db):
+    assert db.create_user_full("sv_busy", "h0", "Sinh viên bận", "sv_busy@uni.edu.vn", "STUDENT")[0]
+    user_id = db.get_user_by_username("sv_busy")["id"]
+    other = lock_writes(empty_db)
+    threading.Timer(0.05, other.rollback).start()
+    assert db.update_password(user_id, "h1") is True
+    assert password_of(user_id) == "h1"
+    other = lock_writes(empty_db)
+    threading.Timer(0.05, other.rollback).start()
+    assert db.create_class("L-BUSY", "Lớp bận", None) == (True, "")
+
+def test_writers_report_busy_instead_of_failure(empty_db):
+    assert db.create_user_full("gv_busy", "h0", "Giáo viên bận", "gv_busy@uni.edu.vn", "TEACHER")[0]
+    user_id = db.get_user_by_username("gv_busy")["id"]
+    token = db.request_password_reset("gv_busy@uni.edu.vn")
+    other = lock_writes(empty_db)
+    try:
+        with pytest.raises(db.DatabaseBusyError): db.update_password(user_id, "h1")
+        with pytest.raises(db.DatabaseBusyError): db.reset_password_with_token(token, "h1")
+        with pytest.raises(db.DatabaseBusyError): db.create_user_full("x", "h", "X", "x@uni.edu.vn", "STUDENT")
+        with pytest.raises(db.DatabaseBusyError): db.create_class("L-X", "Lớp X", None)
+        with db.get_connection() as conn: assert not conn.in_transaction
+    finally: other.rollback()
+    assert password_of(user_id) == "h0"
+    assert db.reset_password_with_token(token, "h2") is True and password_of(user_id) == "h2"
+    assert db.create_user_full("gv_busy", "h", "Trùng", "dup@uni.edu.vn", "TEACHER")[0] is False
+
+def test_concurrent_checkins_never_lock(tmp_path):
+    """Giờ cao điểm thu nhỏ (như benchmarks/contention.py, nhưng bằng luồng): mọi lượt phải được lưu."""
+    old_path = db.DB_PATH
+    path = str(tmp_path / "attendance.db")
+    db.set_db_path(path); db.init_db(); db.close_all_connections()
+    try:
+        final_setup.generate_dataset(path, classes=1, students_per_class=WRITERS * PER_WRITER, subjects_per_class=1,
+                                     sessions_per_subject=1, seed=3, start=date(2025, 9, 1), passwords=False, progress=None)
+        with db.get_connection() as conn:
+            session_id = conn.execute("SELECT id FROM attendance_sessions WHERE status = 'ACTIVE'").fetchone()[0]
+            student_ids = [r[0] for r in conn.execute("SELECT id FROM students ORDER BY id")]
+        barrier, errors = threading.Barrier(WRITERS), []
+        def writer(ids):
+            barrier.wait()
+            for sid in ids:
+                try: db.student_mark_attendance(sid, session_id, "PRESENT", "")
+                except sqlite3.Error as e: errors.append(e)
+        threads = [threading.Thread(target=writer, args=(student_ids[i::WRITERS],)) for i in range(WRITERS)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        assert not [e for e in errors if db._is_busy_error(e)], "có lỗi database is locked"
+        assert not errors
+        with db.get_connection() as conn:
+            stored = conn.execute("SELECT COUNT(*) FROM Attendance WHERE session_id = ?", (session_id,)).fetchone()[0]
+        assert stored == len(student_ids) == WRITERS * PER_WRITER
+    finally: db.set_db_path(old_path)
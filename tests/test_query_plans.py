@@ -0,0 +1,61 @@
+# tests/test_query_plans.py
+# Truy vấn nóng phải đi theo index (bản thu nhỏ của benchmarks/query_plans.py, chạy cùng bộ test):
+# mỗi hàm phải có bước SEARCH ... USING INDEX, Attendance chỉ được đọc qua index và không câu nào full-scan bảng.
+import os
+import re
+import sys
+from datetime import date
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path: sys.path.insert(0, ROOT_DIR)
+
+import database as db
+import final_setup
+
+HOT_QUERIES = [
+    ("get_student_history", (1,)),
+    ("get_open_sessions_for_student", (1,)),
+    ("get_attendance_records_for_session", (1,)),
+]
+
+@pytest.fixture(scope="module")
+def seeded_db(tmp_path_factory):
+    old_path = db.DB_PATH
+    path = str(tmp_path_factory.mktemp("plans") / "attendance.db")
+    db.set_db_path(path); db.init_db(); db.close_all_connections()
+    final_setup.generate_dataset(path, classes=2, students_per_class=8, subjects_per_class=2, sessions_per_subject=6,
+                                 seed=11, start=date(2025, 9, 1), passwords=False, progress=None)
+    try: yield path
+    finally: db.set_db_path(old_path)
+
+def capture_sql(fn, *args):
+    """Các câu SELECT mà hàm thật sự gửi xuống SQLite (bắt qua trace callback)."""
+    captured = []
+    with db.get_connection() as conn:
+        conn.set_trace_callback(captured.append)
+        try: fn(*args)
+        finally: conn.set_trace_callback(None)
+    return [s for s in captured if s.lstrip().upper().startswith("SELECT")]
+
+def query_plan(sql):
+    with db.get_connection() as conn:
+        return [r["detail"] for r in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+
+_SQL_WORDS = {"WHERE", "ON", "JOIN", "LEFT", "INNER", "CROSS", "GROUP", "ORDER", "LIMIT", "USING", "UNION", "SET"}
+
+def attendance_names(sql):
+    """Tên mà EXPLAIN QUERY PLAN dùng cho bảng Attendance trong câu SQL (tên bảng hoặc bí danh)."""
+    aliases = re.findall(r"\bAttendance\s+(?:AS\s+)?(\w+)", sql, re.IGNORECASE)
+    return {"Attendance"} | {a for a in aliases if a.upper() not in _SQL_WORDS}
+
+@pytest.mark.parametrize("name, args", HOT_QUERIES)
+def test_hot_query_uses_index(seeded_db, name, args):
+    plans = [(sql, query_plan(sql)) for sql in capture_sql(getattr(db, name), *args)]
+    assert plans
+    for sql, plan in plans:
+        assert not [d for d in plan if d.startswith("SCAN ") and not d.startswith("SCAN CONSTANT")], (sql, plan)
+        for table in attendance_names(sql):
+            assert all("INDEX" in d for d in plan if d.startswith(f"SEARCH {table} ")), (sql, plan)
+    assert any(re.match(r"SEARCH \w+ USING (COVERING )?INDEX ", d) for _, plan in plans for d in plan), plans
@@ -0,0 +1,30 @@
+# tests/test_server.py
+# Token đăng nhập của server.py: hết hạn thì không dùng được nữa và bị dọn khỏi bộ nhớ.
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path: sys.path.insert(0, ROOT_DIR)
+
+import server
+
+class FakeClock:
+    def __init__(self): self.now = 1000.0
+    def __call__(self): return self.now
+
+def test_expired_tokens_are_rejected_and_purged(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(server.time, "monotonic", clock)
+    store = server.TokenStore(ttl=60)
+    old = [store.issue({"user_id": i}) for i in range(100)]
+    assert store.lookup(old[0]) == {"user_id": 0}
+    clock.now += 30
+    recent = store.issue({"user_id": 100})
+    clock.now += 31  # 100 token đầu đã hết hạn, token cuối còn 29 giây
+    assert store.lookup(old[1]) is None
+    fresh = store.issue({"user_id": 101})
+    assert len(store) == 2
+    assert store.lookup(recent) == {"user_id": 100} and store.lookup(fresh) == {"user_id": 101}
+    clock.now += 61
+    store.issue({"user_id": 102})
+    assert len(store) == 1
@@ -0,0 +1,118 @@
+# tests/test_summaries.py
+# Hồi quy cho bảng tổng hợp và cảnh báo vắng (trigger): sau mỗi nhóm thao tác ghi — điểm danh, sửa, xóa,
+# đóng buổi, đổi ngưỡng, lưu trữ năm học — bảng tổng hợp phải khớp dữ liệu gốc và cảnh báo đang mở phải
+# đúng bằng trạng thái tính lại từ đầu. Chạy: python -m pytest tests/
+import os
+import sys
+from datetime import date
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path: sys.path.insert(0, ROOT_DIR)
+
+import archive
+import database as db
+import final_setup
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    old_path = db.DB_PATH
+    path = str(tmp_path / "attendance.db")
+    monkeypatch.setattr(db, "ARCHIVE_DIR", str(tmp_path / "archive"))
+    db.set_db_path(path)
+    db.init_db()
+    db.close_all_connections()
+    final_setup.generate_dataset(path, classes=2, students_per_class=8, subjects_per_class=2, sessions_per_subject=8,
+                                 seed=7, start=date(2024, 9, 2), passwords=False, progress=None)
+    try: yield path
+    finally: db.set_db_path(old_path)
+
+def query(sql, params=()):
+    with db.get_connection() as conn: return [tuple(r) for r in conn.execute(sql, params)]
+
+def expected_alerts():
+    """Cảnh báo đáng có theo định nghĩa ngưỡng, tính lại từ bảng tổng hợp (đã đối chiếu với dữ liệu gốc)."""
+    limit, ratio, term_sessions = query("SELECT absence_limit, warn_ratio, term_sessions FROM attendance_alert_limits")[0]
+    result = set()
+    for student_id, cs_id, present, absent, excused, late in query(
+            "SELECT student_id, class_subject_id, present_count, absent_count, excused_count, late_count FROM attendance_student_summary"):
+        absences, term = absent + excused, max(term_sessions, present + absent + excused + late)
+        if absences > limit * term: result.add((student_id, cs_id, "LIMIT"))
+        if absences > 0 and absences >= ratio * limit * term: result.add((student_id, cs_id, "WARN"))
+    return result
+
+def assert_consistent():
+    mismatches = db.check_attendance_summaries()
+    assert all(not rows for check in mismatches.values() for rows in check.values()), mismatches
+    open_alerts = set(query("SELECT student_id, class_subject_id, level FROM attendance_alerts WHERE resolved_at IS NULL"))
+    assert open_alerts == expected_alerts()
+
+def open_sessions():
+    return query("""SELECT s.id, cs.class_id FROM attendance_sessions s JOIN class_subjects cs ON cs.id = s.class_subject_id
+                    WHERE s.status = 'ACTIVE' ORDER BY s.id""")
+
+def students_of(class_id):
+    return [r[0] for r in query("SELECT id FROM students WHERE class_id = ? ORDER BY id", (class_id,))]
+
+def test_summaries_and_alerts_follow_every_write(dataset):
+    assert_consistent()
+    assert expected_alerts(), "bộ dữ liệu phải có sẵn vài cảnh báo để phép thử có ý nghĩa"
+
+    # Điểm danh mới: sinh viên tự điểm danh, giáo viên ghi hàng loạt, đánh vắng phần còn lại
+    for session_id, class_id in open_sessions():
+        students = students_of(class_id)
+        db.student_mark_attendance(students[0], session_id, "PRESENT", None)
+        db.bulk_upsert_attendance(session_id, [(students[1], "LATE", None), (students[2], "ABSENT_EXCUSED", "ốm")], None)
+        db.mark_remaining_attendance(session_id, class_id, "ABSENT", None)
+    assert_consistent()
+
+    # Sửa: vắng -> có mặt (cảnh báo có thể đóng), có mặt -> vắng (có thể mở)
+    for session_id, class_id in open_sessions():
+        students = students_of(class_id)
+        db.upsert_attendance_record(session_id, students[3], "PRESENT", "đến muộn, đã giải trình", None)
+        db.upsert_attendance_record(session_id, students[0], "ABSENT", None, None)
+    assert_consistent()
+
+    # Đổi ngưỡng rồi đối chiếu lại
+    db.set_setting("term_sessions", 4); db.set_setting("absence_limit", 0.3)
+    db.recheck_attendance_alerts()
+    assert_consistent()
+
+    # Đóng buổi, rồi sửa bản ghi của buổi đã đóng
+    sessions = open_sessions()
+    for session_id, _ in sessions: db.close_attendance_session(session_id)
+    assert_consistent()
+    session_id, class_id = sessions[0]
+    db.upsert_attendance_record(session_id, students_of(class_id)[4], "ABSENT", None, None)
+    assert_consistent()
+
+    # Xóa: một bản ghi điểm danh vắng, rồi cả sinh viên (Attendance và cảnh báo xóa theo)
+    with db.get_connection() as conn:
+        conn.execute("""DELETE FROM Attendance WHERE id = (SELECT a.id FROM Attendance a JOIN attendance_alerts al
+                        ON al.student_id = a.student_id AND al.resolved_at IS NULL WHERE a.status = 'ABSENT' LIMIT 1)""")
+        conn.commit()
+    assert_consistent()
+    student_id = students_of(class_id)[5]
+    with db.get_connection() as conn:
+        conn.execute("DELETE FROM Enrollment WHERE student_id = ?", (student_id,)); conn.commit()
+    db.delete_user(query("SELECT user_id FROM students WHERE id = ?", (student_id,))[0][0])
+    assert_consistent()
+
+    # Lưu trữ năm học: bảng tổng hợp giữ số liệu phần đã chuyển đi, cảnh báo không đổi
+    before = set(query("SELECT student_id, class_subject_id, level, raised_at FROM attendance_alerts WHERE resolved_at IS NULL"))
+    totals = archive.archive_before("2025-08-01", batch_sessions=5)
+    assert sum(t["sessions"] for t in totals.values()) > 0
+    assert query("SELECT COUNT(*) FROM attendance_sessions WHERE status = 'CLOSED'") == [(0,)]
+    assert_consistent()
+    assert set(query("SELECT student_id, class_subject_id, level, raised_at FROM attendance_alerts WHERE resolved_at IS NULL")) == before
+
+    # Sau lưu trữ: buổi mới vẫn cộng tiếp trên phần đã lưu trữ
+    cs_id, teacher_id, class_id = query("SELECT id, teacher_id, class_id FROM class_subjects ORDER BY id LIMIT 1")[0]
+    session_id = db.create_attendance_session(cs_id, "T-ARCH", "2025-09-08", teacher_id)
+    db.mark_remaining_attendance(session_id, class_id, "ABSENT", None)
+    db.close_attendance_session(session_id)
+    assert_consistent()
+
+    db.rebuild_attendance_summaries()
+    assert_consistent()
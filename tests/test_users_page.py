@@ -0,0 +1,59 @@
+# tests/test_users_page.py
+# Phân trang người dùng theo keyset (get_users_page) và get_all_users ghép từ các trang.
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path: sys.path.insert(0, ROOT_DIR)
+
+import database as db
+
+@pytest.fixture
+def users(tmp_path):
+    """11 người dùng mới: gv0..gv3 (TEACHER) và sv0..sv6 (STUDENT), xen kẽ id."""
+    old_path = db.DB_PATH
+    db.set_db_path(str(tmp_path / "attendance.db"))
+    db.init_db()
+    with db.get_connection() as conn:
+        conn.execute("DELETE FROM users"); conn.commit()
+    for i in range(11):
+        role, name = ("TEACHER", f"gv{i // 3}") if i % 3 == 0 else ("STUDENT", f"sv{i - i // 3 - 1}")
+        assert db.create_user_full(name, "h", name.upper(), f"{name}@uni.edu.vn", role)[0]
+    try: yield
+    finally: db.set_db_path(old_path)
+
+def walk(role=None, limit=4):
+    """Đi hết các trang như màn hình quản trị; trả về danh sách trang."""
+    pages, after_id = [], None
+    while True:
+        page = db.get_users_page(after_id, role, limit)
+        if not page: return pages
+        pages.append(page)
+        after_id = page[-1]["id"]
+
+def ids(rows): return [r["id"] for r in rows]
+
+def test_keyset_pages_cover_all_users_once(users):
+    pages = walk()
+    assert [len(p) for p in pages] == [4, 4, 3]
+    everyone = ids(db.get_all_users())
+    assert [i for p in pages for i in ids(p)] == everyone == sorted(everyone, reverse=True)
+    assert len(everyone) == 11
+    assert db.get_users_page(everyone[-1], None, 4) == []  # sau trang cuối: rỗng, dừng
+
+def test_role_filter_and_cursor(users):
+    students = walk("STUDENT", limit=3)
+    assert [len(p) for p in students] == [3, 3, 1]
+    assert {r["role"] for p in students for r in p} == {"STUDENT"}
+    cursor = students[0][-1]["id"]
+    assert all(i < cursor for i in ids(db.get_users_page(cursor, "STUDENT", 3)))
+    assert ids(db.get_users_page(cursor, "STUDENT", 3)) == ids(students[1])
+    assert [len(p) for p in walk("TEACHER", limit=2)] == [2, 2]  # trang cuối đầy: thêm một lượt rỗng rồi dừng
+
+def test_get_all_users_pages_through(users, monkeypatch):
+    monkeypatch.setattr(db, "USERS_PAGE_SIZE", 2)
+    assert len(db.get_all_users()) == 11
+    assert ids(db.get_all_users("TEACHER")) == ids(walk("TEACHER", limit=10)[0])  # 4 = 2 trang đầy
+    assert len(db.get_all_users("TEACHER")) == 4